@@ -0,0 +1,187 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+
+from db_helpers import fetch_all
+from garden_jobs import BLOCK_THRESHOLD
+
+TABLE = 'daily_stats'
+# The row increment_focus_time adds focus time to; it is not counted as a task
+FOCUS_TASK = 'Focus Session'
+CHUNK_SIZE = 500           # daily_stats rows per upsert
+DEFAULT_DAYS = 365
+MAX_DAYS = 730             # one read of at most this many rows
+ROLLING_WINDOWS = (7, 30, 90)
+WEEKS = 12                 # weekly buckets returned
+PERCENTILES = (50, 75, 90)
+
+
+def task_counts(row):
+    # (tasks_total, tasks_completed, focus_time) one task row adds to its day
+    focus_time = row.get('focus_time') or 0
+    if row.get('task_name') == FOCUS_TASK:
+        return 0, 0, focus_time
+    return 1, 1 if (row.get('tasks_completed') or 0) > 0 else 0, focus_time
+
+
+def change(old, new):
+    # Rollup delta for one task going from old to new (either may be None)
+    before = task_counts(old) if old else (0, 0, 0)
+    after = task_counts(new) if new else (0, 0, 0)
+    return tuple(a - b for a, b in zip(after, before))
+
+
+def add(client, user_id, deltas):
+    # deltas is {date: (tasks_total, tasks_completed, focus_time)}; all days are
+    # added atomically by the add_daily_stats function in one round trip
+    deltas = {day: d for day, d in deltas.items() if any(d)}
+    if not deltas:
+        return
+    days = sorted(deltas)
+    client.rpc('add_daily_stats', {
+        'p_user_ids': [user_id] * len(days),
+        'p_dates': days,
+        'p_total': [deltas[d][0] for d in days],
+        'p_completed': [deltas[d][1] for d in days],
+        'p_focus': [deltas[d][2] for d in days]
+    }).execute()
+
+
+def _rollup_rows(totals):
+    return [{'user_id': user_id, 'date': day, 'tasks_total': t, 'tasks_completed': c, 'focus_time': f}
+            for (user_id, day), (t, c, f) in sorted(totals.items())]
+
+
+def _sum(rows, key):
+    totals = defaultdict(lambda: [0, 0, 0])
+    for row in rows:
+        counts = totals[key(row)]
+        for i, value in enumerate(task_counts(row)):
+            counts[i] += value
+    return totals
+
+
+# Recomputes daily_stats from the tasks table, for setting the table up on an
+# existing database or repairing it: rollups for days with tasks in
+# [start, end] are rewritten and rollups of days that no longer have any are
+# zeroed. Run it while writes are quiet; a focus flush landing between the
+# scan and the upsert would be overwritten.
+def rebuild(client, start=None, end=None, chunk_size=CHUNK_SIZE):
+    def window(query):
+        if start:
+            query = query.gte('date', start.isoformat())
+        if end:
+            query = query.lte('date', end.isoformat())
+        return query
+
+    tasks = fetch_all(lambda: window(client.table('tasks')
+                                     .select('id, user_id, date, task_name, tasks_completed, focus_time')).order('id'))
+    existing = fetch_all(lambda: window(client.table(TABLE).select('user_id, date')).order('user_id').order('date'))
+    totals = _sum(tasks, lambda r: (r['user_id'], r['date']))
+    for row in existing:
+        totals.setdefault((row['user_id'], row['date']), [0, 0, 0])
+    rows = _rollup_rows(totals)
+    for i in range(0, len(rows), chunk_size):
+        client.table(TABLE).upsert(rows[i:i + chunk_size], on_conflict='user_id,date').execute()
+    return {'tasks': len(tasks), 'days': len(rows)}
+
+
+# ---- /api/analytics ----
+
+def _percentiles(values):
+    if not values.size:
+        return {f'p{p}': 0 for p in PERCENTILES}
+    return {f'p{p}': round(float(v), 1) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def _buckets(labels, total, done, focus, key):
+    # Sums per distinct label (labels sorted), as [{key, total, completed, focus_time}]
+    names, index = np.unique(labels, return_inverse=True)
+    sums = [np.bincount(index, weights=v, minlength=len(names)).astype(np.int64) for v in (total, done, focus)]
+    return [{key: str(name), 'total': int(t), 'completed': int(c), 'focus_time': int(f)}
+            for name, t, c, f in zip(names, *sums)]
+
+
+def _rate(done, total):
+    return round(float(done) / float(total), 4) if total else 0.0
+
+
+# Everything /api/analytics returns, from the user's daily_stats rows for the
+# `days` days ending today. Rows become dense per-day arrays, and totals,
+# rolling windows, streaks, weekly/monthly buckets and percentiles are array
+# operations over them. pending_focus ({date: seconds}) is focus time not
+# flushed yet.
+def summarize(rows, today, days=DEFAULT_DAYS, pending_focus=None):
+    first = today - timedelta(days=days - 1)
+    calendar = np.arange(np.datetime64(first), np.datetime64(today + timedelta(days=1)))
+    total = np.zeros(days, dtype=np.int64)
+    done = np.zeros(days, dtype=np.int64)
+    focus = np.zeros(days, dtype=np.int64)
+
+    if rows:
+        offsets = (np.array([r['date'] for r in rows], dtype='datetime64[D]') - calendar[0]).astype(np.int64)
+        inside = (offsets >= 0) & (offsets < days)
+        for column, values in (('tasks_total', total), ('tasks_completed', done), ('focus_time', focus)):
+            column_values = np.array([r.get(column) or 0 for r in rows], dtype=np.int64)
+            np.add.at(values, offsets[inside], column_values[inside])
+    for day, seconds in (pending_focus or {}).items():
+        offset = (date.fromisoformat(day) - first).days
+        if 0 <= offset < days:
+            focus[offset] += seconds
+
+    # A day counts toward a streak once a task is completed; today does not
+    # break the current streak before it is over
+    active = done > 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], active.astype(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    lengths = ends - starts
+    current = 0
+    if lengths.size and (ends[-1] == days or (ends[-1] == days - 1 and not active[-1])):
+        current = int(lengths[-1])
+    longest = int(lengths.max()) if lengths.size else 0
+    longest_end = str(calendar[ends[np.argmax(lengths)] - 1]) if lengths.size else None
+
+    # Rolling sums ending today and over the window just before it
+    def cumulative(values):
+        return np.concatenate(([0], np.cumsum(values)))
+    sums = {name: cumulative(values) for name, values in (('total', total), ('completed', done), ('focus_time', focus))}
+    rolling = {}
+    for window in ROLLING_WINDOWS:
+        if window > days:
+            continue
+        current_window = {name: int(s[days] - s[days - window]) for name, s in sums.items()}
+        previous = {name: int(s[max(days - window, 0)] - s[max(days - 2 * window, 0)]) for name, s in sums.items()}
+        current_window['completion_rate'] = _rate(current_window['completed'], current_window['total'])
+        previous['completion_rate'] = _rate(previous['completed'], previous['total'])
+        rolling[f'{window}d'] = {'current': current_window, 'previous': previous}
+
+    # ISO weeks (Monday first; 1970-01-01 was a Thursday) and calendar months
+    epoch_days = calendar.astype(np.int64)
+    week_starts = (epoch_days - (epoch_days + 3) % 7).astype('datetime64[D]')
+    weekly = _buckets(week_starts, total, done, focus, 'week')[-WEEKS:]
+    monthly = _buckets(calendar.astype('datetime64[M]'), total, done, focus, 'month')
+
+    worked = total > 0
+    return {
+        'from': first.isoformat(),
+        'to': today.isoformat(),
+        'totals': {
+            'tasks': int(total.sum()),
+            'completed': int(done.sum()),
+            'completion_rate': _rate(done.sum(), total.sum()),
+            'focus_time': int(focus.sum()),
+            'active_days': int(active.sum()),
+            'goal_days': int((worked & (done >= BLOCK_THRESHOLD * total)).sum())
+        },
+        'streaks': {'current': current, 'longest': longest, 'longest_end': longest_end},
+        'rolling': rolling,
+        'daily': [{'date': str(d), 'total': int(t), 'completed': int(c), 'focus_time': int(f)}
+                  for d, t, c, f in zip(calendar[-7:], total[-7:], done[-7:], focus[-7:])],
+        'weekly': weekly,
+        'monthly': monthly,
+        'percentiles': {
+            'completed_per_day': _percentiles(done[worked]),
+            'focus_time_per_day': _percentiles(focus[focus > 0])
+        }
+    }
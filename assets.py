@@ -0,0 +1,374 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = 'manifest.json'
+SPRITE_DIR = 'sprites'
+# Logical names of the minified assets, relative to the static folder.
+# css/sprites.css is not minified but generated from the sprites.
+SCRIPTS = ('js/app.js',)
+STYLESHEETS = ('css/style.css',)
+SPRITE_CSS = 'css/sprites.css'
+
+# Precompressed variants, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg')
+# Transparent pixels between packed sprites so scaled regions do not bleed
+ATLAS_GUTTER = 2
+
+
+# ---- minifiers ----
+
+# Characters after which a '/' starts a regex literal rather than a division
+_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw', 'yield', 'await')
+# Whitespace next to these is never needed
+_JS_TIGHT = set('{}()[];,:=')
+_JS_TOKEN = re.compile(r'[\w$]+|.')
+
+
+def _regex_allowed(out):
+    text = ''.join(out[-3:]).rstrip()
+    if not text:
+        return True
+    if text[-1] in _REGEX_AFTER:
+        return True
+    word = re.search(r'[A-Za-z_$][\w$]*$', text)
+    return word is not None and word.group() in _REGEX_KEYWORDS
+
+
+def minify_js(source):
+    # Conservative minifier: drops comments, indentation and blank lines and
+    # squeezes spaces, copying strings, template literals and regex literals
+    # untouched. Line breaks are kept wherever automatic semicolon insertion
+    # could depend on them.
+    out = []
+    templates = []  # brace depth at each open `${`
+    braces = 0
+    i, n = 0, len(source)
+    pending = ''    # whitespace seen since the last token: '', ' ' or '\n'
+
+    def emit(token):
+        nonlocal pending
+        if pending and out:
+            prev = out[-1][-1]
+            if pending == '\n':
+                if prev not in '{;,':
+                    out.append('\n')
+            elif prev not in _JS_TIGHT and token[0] not in _JS_TIGHT:
+                out.append(' ')
+        pending = ''
+        out.append(token)
+
+    def template_chunk(start):
+        # Copy template text from start up to and including '`' or '${'
+        j = start
+        while j < n:
+            c = source[j]
+            if c == '\\':
+                j += 2
+            elif c == '`':
+                return j + 1, False
+            elif c == '$' and source.startswith('${', j):
+                return j + 2, True
+            else:
+                j += 1
+        return n, False
+
+    while i < n:
+        c = source[i]
+        if c in ' \t\r':
+            if pending != '\n':
+                pending = ' '
+            i += 1
+        elif c == '\n':
+            pending = '\n'
+            i += 1
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end < 0 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            if pending != '\n':
+                pending = ' '
+        elif c in '\'"':
+            j = i + 1
+            while j < n and source[j] != c and source[j] != '\n':
+                j += 2 if source[j] == '\\' else 1
+            emit(source[i:j + 1])
+            i = j + 1
+        elif c == '`':
+            end, opened = template_chunk(i + 1)
+            emit(source[i:end])
+            if opened:
+                templates.append(braces)
+            i = end
+        elif c == '}' and templates and braces == templates[-1]:
+            templates.pop()
+            end, opened = template_chunk(i + 1)
+            pending = ''
+            out.append(source[i:end])
+            if opened:
+                templates.append(braces)
+            i = end
+        elif c == '/' and _regex_allowed(out):
+            j = i + 1
+            in_class = False
+            while j < n and source[j] != '\n':
+                if source[j] == '\\':
+                    j += 2
+                    continue
+                if source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                elif source[j] == '/' and not in_class:
+                    break
+                j += 1
+            emit(source[i:j + 1])
+            i = j + 1
+        else:
+            match = _JS_TOKEN.match(source, i)
+            token = match.group()
+            if token == '{':
+                braces += 1
+            elif token == '}':
+                braces -= 1
+            emit(token)
+            i = match.end()
+    return ''.join(out) + '\n'
+
+
+_CSS_STRINGS_AND_COMMENTS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+
+
+def minify_css(source):
+    # Comments dropped, whitespace collapsed and removed around { } ; , >
+    # and after ':'; quoted strings are left alone
+    parts = _CSS_STRINGS_AND_COMMENTS.split(source)
+    out = []
+    # split() yields text, string, text, ...; comments come back as None
+    for index, part in enumerate(parts):
+        if part is None:
+            continue
+        if index % 2:
+            out.append(part)
+            continue
+        part = re.sub(r'\s+', ' ', part)
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+        part = re.sub(r':\s+', ':', part)
+        out.append(part)
+    css = ''.join(out).replace(';}', '}')
+    return css.strip() + '\n'
+
+
+# ---- sprites ----
+
+def png_size(path):
+    # (width, height) from the IHDR chunk
+    with open(path, 'rb') as f:
+        header = f.read(24)
+    if header[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError(f'{path} is not a PNG')
+    return int.from_bytes(header[16:20], 'big'), int.from_bytes(header[20:24], 'big')
+
+
+def pack(sizes, gutter=ATLAS_GUTTER):
+    # Shelf packing, tallest first, into a roughly square sheet.
+    # Returns {name: (x, y, w, h)} and the sheet (width, height).
+    area = sum((w + gutter) * (h + gutter) for w, h in sizes.values())
+    width = max(max(w for w, _ in sizes.values()), int(area ** 0.5))
+    regions = {}
+    x = y = shelf = sheet_width = 0
+    for name, (w, h) in sorted(sizes.items(), key=lambda item: (-item[1][1], item[0])):
+        if x and x + w > width:
+            x, y, shelf = 0, y + shelf + gutter, 0
+        regions[name] = (x, y, w, h)
+        sheet_width = max(sheet_width, x + w)
+        x += w + gutter
+        shelf = max(shelf, h)
+    return regions, (sheet_width, y + shelf)
+
+
+def _percent(value):
+    return f'{round(value, 4):g}%'
+
+
+def sprite_css(sprites, atlas_url=None, atlas_size=None):
+    # Rules drawing .sprite[data-sprite=name] elements. sprites is
+    # [(name, url, (x, y, w, h))]; without an atlas each url is a whole image,
+    # with one every sprite is the (x, y, w, h) region of atlas_url.
+    # Elements get the sprite's aspect ratio, so setting a width or a height
+    # is enough.
+    rules = ['.sprite{display:block;background-repeat:no-repeat}']
+    if atlas_url:
+        rules.append(f'.sprite{{background-image:url({atlas_url})}}')
+    for name, url, (x, y, w, h) in sprites:
+        declarations = [f'aspect-ratio:{w}/{h}']
+        if atlas_url:
+            sheet_w, sheet_h = atlas_size
+            declarations.append(f'background-size:{_percent(sheet_w / w * 100)} {_percent(sheet_h / h * 100)}')
+            declarations.append('background-position:' +
+                                f'{_percent(x / (sheet_w - w) * 100 if sheet_w > w else 0)} '
+                                f'{_percent(y / (sheet_h - h) * 100 if sheet_h > h else 0)}')
+        else:
+            declarations.append(f'background-image:url({url})')
+            declarations.append('background-size:100% 100%')
+        rules.append(f'.sprite[data-sprite="{name}"]{{{";".join(declarations)}}}')
+    return '\n'.join(rules) + '\n'
+
+
+def _sprite_files(static_dir):
+    directory = os.path.join(static_dir, SPRITE_DIR)
+    return sorted(f for f in os.listdir(directory) if f.endswith('.png'))
+
+
+def unbuilt_sprite_css(static_dir):
+    # The css/sprites.css served before a build: one image per sprite
+    sprites = []
+    for filename in _sprite_files(static_dir):
+        w, h = png_size(os.path.join(static_dir, SPRITE_DIR, filename))
+        sprites.append((filename[:-4], f'../{SPRITE_DIR}/{filename}', (0, 0, w, h)))
+    return sprite_css(sprites)
+
+
+# ---- build ----
+
+def fingerprint(logical, data):
+    # css/style.css -> style.<hash>.css
+    stem, ext = os.path.splitext(os.path.basename(logical))
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _compress(data):
+    # {suffix: bytes} for the encodings that actually make the file smaller
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {suffix: blob for suffix, blob in variants.items() if len(blob) < len(data)}
+
+
+def _emit(out_dir, logical, data, manifest, report):
+    filename = fingerprint(logical, data)
+    with open(os.path.join(out_dir, filename), 'wb') as f:
+        f.write(data)
+    sizes = {'': len(data)}
+    if filename.endswith(COMPRESSIBLE):
+        for suffix, blob in _compress(data).items():
+            with open(os.path.join(out_dir, filename + suffix), 'wb') as f:
+                f.write(blob)
+            sizes[suffix] = len(blob)
+    manifest[logical] = filename
+    report.append((logical, filename, sizes))
+    return filename
+
+
+def _build_sprites(static_dir, out_dir, manifest, report):
+    files = _sprite_files(static_dir)
+    names = [f[:-4] for f in files]
+    if Image is None:
+        # No Pillow: fingerprint the sprites one by one
+        sprites = []
+        for name, filename in zip(names, files):
+            path = os.path.join(static_dir, SPRITE_DIR, filename)
+            with open(path, 'rb') as f:
+                hashed = _emit(out_dir, f'{SPRITE_DIR}/{filename}', f.read(), manifest, report)
+            sprites.append((name, hashed, (0, 0) + png_size(path)))
+        return sprite_css(sprites)
+
+    images = {name: Image.open(os.path.join(static_dir, SPRITE_DIR, filename)).convert('RGBA')
+              for name, filename in zip(names, files)}
+    regions, size = pack({name: image.size for name, image in images.items()})
+    sheet = Image.new('RGBA', size, (0, 0, 0, 0))
+    for name, image in images.items():
+        sheet.paste(image, regions[name][:2])
+    buffer = io.BytesIO()
+    sheet.save(buffer, format='PNG', optimize=True)
+    atlas = _emit(out_dir, f'{SPRITE_DIR}/atlas.png', buffer.getvalue(), manifest, report)
+    return sprite_css([(name, None, regions[name]) for name in names], atlas_url=atlas, atlas_size=size)
+
+
+def build(static_dir, out_dir):
+    # Writes minified, fingerprinted and precompressed assets plus the
+    # manifest into out_dir and returns [(logical name, file, {suffix: bytes})].
+    # Files from earlier builds are kept so pages rendered before a deploy
+    # still load theirs.
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    report = []
+    for logical in SCRIPTS:
+        with open(os.path.join(static_dir, logical), encoding='utf-8') as f:
+            _emit(out_dir, logical, minify_js(f.read()).encode('utf-8'), manifest, report)
+    for logical in STYLESHEETS:
+        with open(os.path.join(static_dir, logical), encoding='utf-8') as f:
+            _emit(out_dir, logical, minify_css(f.read()).encode('utf-8'), manifest, report)
+    css = _build_sprites(static_dir, out_dir, manifest, report)
+    _emit(out_dir, SPRITE_CSS, css.encode('utf-8'), manifest, report)
+    # Written last so a running server never sees names whose files are missing
+    tmp = os.path.join(out_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return report
+
+
+# Lookup side of the build, loaded once at startup: logical name ->
+# fingerprinted file, and for every built file the precompressed variants
+# on disk, so serving an asset never stats a path.
+class AssetManifest:
+    def __init__(self, directory):
+        self.directory = directory
+        self.load()
+
+    def load(self):
+        self._files = {}
+        self._variants = {}
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                self._files = json.load(f)
+            existing = set(os.listdir(self.directory))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Asset manifest error: {e}")
+            self._files = {}
+            return
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        for filename in existing:
+            if filename == MANIFEST or filename.endswith(suffixes + ('.tmp',)):
+                continue
+            self._variants[filename] = [(encoding, filename + suffix) for encoding, suffix in ENCODINGS
+                                        if filename + suffix in existing]
+
+    def __bool__(self):
+        return bool(self._files)
+
+    def get(self, logical):
+        # Fingerprinted file name, or None before a build
+        return self._files.get(logical)
+
+    def pick(self, filename, quality):
+        # (file to send, Content-Encoding or None) for the best encoding the
+        # client accepts; quality(encoding) is its Accept-Encoding q-value.
+        # None if filename was not built.
+        variants = self._variants.get(filename)
+        if variants is None:
+            return None
+        for encoding, variant in variants:
+            if quality(encoding) > 0:
+                return variant, encoding
+        return filename, None
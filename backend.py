@@ -1,21 +1,156 @@
-from flask import Flask, render_template, send_from_directory, abort, request, jsonify, session
+from flask import Flask, render_template, send_from_directory, abort, request, jsonify, session, Response, stream_with_context, make_response, url_for
+import click
 import os
-from supabase import create_client, Client
+import mimetypes
+import json
+import time
 from functools import wraps
-from datetime import date
+from datetime import date, timedelta
+import storage
+from leaderboard import Leaderboard
+from user_directory import UserDirectory
+from friend_index import FriendIndex
+from username_index import UsernameIndex
+from chat_hub import ChatHub
+from loader import request_loader
+from group_acl import GroupACLCache
+import garden_jobs
+import analytics
+import exports
+import imports
+import sync
+import csv
+from focus_buffer import FocusBuffer
+from versions import VersionStore
+from fanout import FanOut, DeadlineExceeded
+from metrics import Metrics
+from singleflight import SingleFlight
+from resilience import CircuitBreaker, ResilientClient
+import profiler
+from assets import AssetManifest, build as build_assets
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.secret_key = 'your-secret-key-change-in-production'
 
-# Initialize Supabase
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_KEY')
+# Request latency, status and per-query metrics, served at /metrics
+metrics = Metrics(slow_request_ms=float(os.getenv('SLOW_REQUEST_MS', '1000')))
+metrics.init_app(app)
 
+# Opt-in sampling profiler; writes collapsed stacks to PROFILE_DIR
+request_profiler = profiler.RequestProfiler(
+    directory=os.getenv('PROFILE_DIR', 'profiles'),
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+    token=os.getenv('PROFILE_TOKEN') or None,
+    interval=float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000,
+    max_concurrent=int(os.getenv('PROFILE_MAX_CONCURRENT', '2'))
+)
+request_profiler.init_app(app)
+
+# Identical selects running at the same time share one database query; with
+# SINGLE_FLIGHT_TTL_MS > 0 results also answer repeats for that long
+single_flight = SingleFlight(
+    ttl=float(os.getenv('SINGLE_FLIGHT_TTL_MS', '0')) / 1000,
+    enabled=os.getenv('SINGLE_FLIGHT', '1') != '0'
+)
+
+# Opens after STORAGE_BREAKER_FAILURES outage errors in a row; calls then fail
+# fast for STORAGE_BREAKER_RESET seconds instead of tying up worker threads
+breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('STORAGE_BREAKER_FAILURES', '5')),
+    reset_timeout=float(os.getenv('STORAGE_BREAKER_RESET', '30'))
+)
+
+def connect(client):
+    # The client the routes use. Metrics sit innermost so retries and hedged
+    # reads count as round trips; single-flight sits outermost so coalesced
+    # readers share one guarded call.
+    hedge_ms = float(os.getenv('STORAGE_HEDGE_MS', '0'))
+    return single_flight.wrap(ResilientClient(
+        metrics.instrument(client), breaker,
+        retries=int(os.getenv('STORAGE_RETRIES', '2')),
+        backoff=float(os.getenv('STORAGE_RETRY_BACKOFF_MS', '50')) / 1000,
+        hedge_after=hedge_ms / 1000 if hedge_ms > 0 else None,
+        timeout=float(os.getenv('STORAGE_TIMEOUT', '10'))
+    ))
+
+# Initialize storage (Supabase by default, SQLite with STORAGE_BACKEND=sqlite);
+# every execute() that reaches the database is timed by metrics
 try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    db = connect(storage.create_client())
 except Exception as e:
-    print(f"Supabase not configured yet: {e}")
-    supabase = None
+    print(f"Storage not configured yet: {e}")
+    db = None
+
+# Garden changes written by other processes (the evaluate-gardens job, other
+# workers) reach this one through the directory refresh
+def _on_gardens_changed(user_ids):
+    versions.bump('garden', *user_ids)
+
+# Username, blocks, is_dead and avatar per user, patched by the signup/garden/profile
+# routes and refreshed from updated_at; the leaderboard ranks users from it
+user_directory = UserDirectory(
+    refresh_interval=float(os.getenv('USER_DIRECTORY_REFRESH', '5')),
+    max_age=int(os.getenv('USER_DIRECTORY_MAX_AGE', '3600')),
+    on_gardens_changed=_on_gardens_changed
+)
+leaderboard = Leaderboard(user_directory)
+
+# Adjacency sets over the friends table, kept current by the friend routes
+friend_index = FriendIndex(max_age=int(os.getenv('FRIEND_INDEX_MAX_AGE', '300')))
+
+# Sorted usernames for /api/users/search and add-friend lookups, patched by signup
+username_index = UsernameIndex(max_age=int(os.getenv('USERNAME_INDEX_MAX_AGE', '300')))
+
+# Several workers (WEB_CONCURRENCY, as gunicorn reads it) each keep their own
+# caches; the ones that cannot see the others' writes check back more often
+WORKERS = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# Recent messages per group, pushed to stream readers by send_group_message.
+# Other workers' messages are read from the database every CHAT_SYNC_INTERVAL
+# seconds (0: never, the default with a single worker)
+chat_hub = ChatHub(
+    buffer_size=int(os.getenv('CHAT_BUFFER_SIZE', '200')),
+    sync_interval=float(os.getenv('CHAT_SYNC_INTERVAL', '0' if WORKERS <= 1 else '1')) or None
+)
+CHAT_STREAM_TIMEOUT = int(os.getenv('CHAT_STREAM_TIMEOUT', '300'))
+CHAT_KEEPALIVE = 15
+
+# Owner and member ids per group for the membership/ownership checks
+group_acl = GroupACLCache(
+    ttl=int(os.getenv('GROUP_ACL_TTL', '60')),
+    max_size=int(os.getenv('GROUP_ACL_MAX_SIZE', '10000'))
+)
+
+# A focus flush can create the day's Focus Session row, so tags built
+# before it are stale for the users it wrote
+def _on_focus_flushed(user_ids):
+    versions.bump('tasks', *user_ids)
+    versions.bump('garden', *user_ids)
+
+# Focus time deltas summed in memory and flushed as atomic increments
+focus_buffer = FocusBuffer(
+    flush_interval=float(os.getenv('FOCUS_FLUSH_INTERVAL', '5')),
+    max_keys=int(os.getenv('FOCUS_FLUSH_MAX_KEYS', '1000')),
+    on_flush=_on_focus_flushed
+)
+
+# Bounded pool for running a handler's independent queries concurrently
+fanout = FanOut(
+    max_workers=int(os.getenv('ASYNC_MAX_WORKERS', '8')),
+    timeout=float(os.getenv('REQUEST_DEADLINE', '5')),
+    enabled=os.getenv('ASYNC_QUERIES', '1') == '1'
+)
+
+# Version counters behind the ETags of the read endpoints. They are per
+# process, so with several workers (WEB_CONCURRENCY, as gunicorn reads it)
+# tags roll over quickly to pick up other users' writes; a user's own writes
+# are covered by the session write counter (count_session_writes).
+versions = VersionStore(max_age=int(os.getenv('ETAG_MAX_AGE', '300' if WORKERS <= 1 else '10')))
+
+# Fingerprinted, precompressed assets written by `flask build-assets`; read once here
+ASSETS_DIR = os.getenv('ASSETS_DIR') or os.path.join(app.static_folder, 'dist')
+ASSET_MAX_AGE = 31536000
+assets = AssetManifest(ASSETS_DIR)
 
 # Auth decorator
 def login_required(f):
@@ -27,21 +162,120 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Operator-only routes: ADMIN_USER_IDS is a comma-separated list of user ids
+ADMIN_USER_IDS = {int(i) for i in os.getenv('ADMIN_USER_IDS', '').split(',') if i.strip()}
+
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'error': 'Unauthorized'}), 401
+        if user_id not in ADMIN_USER_IDS:
+            return jsonify({'error': 'Forbidden'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+# While the storage circuit is open, writes are refused up front. Reads still
+# run: many are answered from the in-memory caches or with a 304, and the rest
+# fail fast without waiting on the database. Buffered writes only touch memory
+# and reach the database on a later flush, so they are still accepted.
+BUFFERED_WRITES = {'/api/update-focus'}
+
+@app.before_request
+def reject_writes_while_storage_down():
+    if request.method != 'GET' and request.path.startswith('/api/') and request.path not in BUFFERED_WRITES \
+            and breaker.is_open():
+        response = jsonify({'success': False, 'error': 'Database unavailable, try again shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(breaker.retry_after()) + 1)
+        return response
+
+# Every successful write counts in the user's session cookie, which reaches
+# whichever worker serves the next request. Tags include the count, so a tag
+# issued by a worker that never saw the write stops matching right away.
+@app.after_request
+def count_session_writes(response):
+    if request.method != 'GET' and request.path.startswith('/api/') and response.status_code < 400 \
+            and session.get('user_id'):
+        session['writes'] = session.get('writes', 0) + 1
+    return response
+
+# Conditional GET decorator. keys(user_id, **view_args) lists the (entity, id)
+# versions the response is built from; a matching If-None-Match gets a 304
+# before the handler (and the database) is touched. Only 200s are tagged, so
+# handlers answer failed reads (empty fallback bodies included) with a 5xx
+# that the browser will not revalidate later.
+def conditional(keys):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user_id = session.get('user_id')
+            tag = versions.etag(keys(user_id, **kwargs), user_id, session.get('writes', 0), request.full_path)
+            if request.if_none_match.contains_weak(tag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+def _on_tasks_changed(user_id):
+    versions.bump('tasks', user_id)
+
+# The page to serve at /, found once at startup: templates/index.html, then
+# static/index.html, then index.html in the project root
+def _resolve_index():
+    if os.path.exists(os.path.join(app.template_folder or 'templates', 'index.html')):
+        return 'template', None
+    for directory in (app.static_folder, os.path.dirname(__file__)):
+        if directory and os.path.exists(os.path.join(directory, 'index.html')):
+            return 'file', directory
+    return None, None
+
+INDEX_PAGE = _resolve_index()
+
 @app.route('/')
 def index():
-    # 1) templates/index.html
-    tpl = os.path.join(app.template_folder or 'templates', 'index.html')
-    if os.path.exists(tpl):
-        return render_template('index.html')
-    # 2) static/index.html
-    static_html = os.path.join(app.static_folder or 'static', 'index.html')
-    if os.path.exists(static_html):
-        return send_from_directory(app.static_folder, 'index.html')
-    # 3) project root index.html
-    root_html = os.path.join(os.path.dirname(__file__), 'index.html')
-    if os.path.exists(root_html):
-        return send_from_directory(os.path.dirname(__file__), 'index.html')
-    return abort(404)
+    kind, directory = INDEX_PAGE
+    if kind == 'template':
+        response = make_response(render_template('index.html'))
+    elif kind == 'file':
+        response = send_from_directory(directory, 'index.html')
+    else:
+        return abort(404)
+    # The page names the current asset fingerprints, so it is always revalidated
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Built asset URL when the manifest has one, the plain static file otherwise
+@app.template_global()
+def asset_url(name):
+    built = assets.get(name)
+    if built:
+        return url_for('built_asset', filename=built)
+    return url_for('static', filename=name)
+
+# Fingerprinted files never change, so they are cached for a year; the
+# br/gzip variant is chosen from Accept-Encoding without touching the disk
+@app.route('/assets/<path:filename>')
+def built_asset(filename):
+    variant = assets.pick(filename, lambda encoding: request.accept_encodings[encoding])
+    if variant is None:
+        return abort(404)
+    name, encoding = variant
+    response = send_from_directory(ASSETS_DIR, name, mimetype=mimetypes.guess_type(filename)[0],
+                                   max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 # Auth Routes
 @app.route('/api/signup', methods=['POST'])
@@ -58,12 +292,12 @@ def signup():
             return jsonify({'error': 'Password must be at least 6 characters'}), 400
         
         # Check if user already exists
-        existing = supabase.table('users').select('id').eq('username', username).execute()
+        existing = db.table('users').select('id').eq('username', username).execute()
         if existing.data and len(existing.data) > 0:
             return jsonify({'error': 'Username already exists'}), 400
         
         # Store user in users table
-        user_data = supabase.table('users').insert({'username': username, 'password_hash': password}).execute()
+        user_data = db.table('users').insert({'username': username, 'password_hash': password}).execute()
         
         if not user_data.data or len(user_data.data) == 0:
             return jsonify({'error': 'Failed to create user'}), 500
@@ -71,6 +305,8 @@ def signup():
         user_id = user_data.data[0]['id']
         session['user_id'] = user_id
         session['username'] = username
+        user_directory.add_user(user_id, username)
+        username_index.add_user(user_id, username)
         
         return jsonify({'success': True, 'user_id': user_id})
     except Exception as e:
@@ -87,7 +323,7 @@ def login():
         if not username or not password:
             return jsonify({'error': 'Username and password required'}), 400
         
-        user_data = supabase.table('users').select('id, username, password_hash').eq('username', username).execute()
+        user_data = db.table('users').select('id, username, password_hash').eq('username', username).execute()
         
         if not user_data.data:
             return jsonify({'error': 'User not found'}), 401
@@ -116,25 +352,148 @@ def logout():
 def get_user():
     return jsonify({'user_id': session.get('user_id'), 'username': session.get('username')})
 
+# Columns the dashboard may project with ?fields=
+TASK_FIELDS = ('id', 'date', 'task_name', 'tasks_completed', 'focus_time', 'timestamp')
+DASHBOARD_MAX_LIMIT = 1000
+
+def _parse_date_arg(name):
+    value = request.args.get(name)
+    if value:
+        date.fromisoformat(value)  # raises ValueError on bad input
+    return value
+
+def _task_query(user_id, columns, date_from, date_to):
+    query = db.table('tasks').select(columns).eq('user_id', user_id)
+    if date_from:
+        query = query.gte('date', date_from)
+    if date_to:
+        query = query.lte('date', date_to)
+    return query
+
+def _task_page(user_id, columns, date_from, date_to, cursor, limit):
+    # Keyset page ordered by (date, id) descending. A cursor (date, id) is
+    # the last row of the previous page; the rest of its date is read first,
+    # then earlier dates, so each page costs at most two indexed queries.
+    rows = []
+    if cursor:
+        cursor_date, cursor_id = cursor
+        rows = _task_query(user_id, columns, date_from, date_to).eq('date', cursor_date).lt('id', cursor_id) \
+            .order('id', desc=True).limit(limit + 1).execute().data or []
+    if len(rows) <= limit:
+        query = _task_query(user_id, columns, date_from, date_to)
+        if cursor:
+            query = query.lt('date', cursor[0])
+        rows += query.order('date', desc=True).order('id', desc=True).limit(limit + 1 - len(rows)).execute().data or []
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1]['date']}:{rows[-1]['id']}"
+    return rows, next_cursor
+
+def _daily_summary(rows, pending_focus=None):
+    # [{date, total, completed, focus_time}] in date order, for the chart.
+    # Counted like the daily_stats rollups, so the Focus Session row adds
+    # only its focus time. pending_focus ({date: seconds}) adds focus time
+    # not yet flushed.
+    days = {}
+    for t in rows:
+        day = days.setdefault(t['date'], {'date': t['date'], 'total': 0, 'completed': 0, 'focus_time': 0})
+        total, completed, focus_time = analytics.task_counts(t)
+        day['total'] += total
+        day['completed'] += completed
+        day['focus_time'] += focus_time
+    for d, seconds in (pending_focus or {}).items():
+        day = days.setdefault(d, {'date': d, 'total': 0, 'completed': 0, 'focus_time': 0})
+        day['focus_time'] += seconds
+    return [days[d] for d in sorted(days)]
+
+def _with_pending_focus(task, pending_focus):
+    if task.get('task_name') != 'Focus Session' or 'focus_time' not in task:
+        return task
+    seconds = pending_focus.get(task['date'])
+    if not seconds:
+        return task
+    return dict(task, focus_time=(task['focus_time'] or 0) + seconds)
+
+def _dashboard_args():
+    # (date_from, date_to, columns, limit, cursor) from the query string; ValueError on bad input
+    try:
+        date_from = _parse_date_arg('from')
+        date_to = _parse_date_arg('to')
+        cursor = request.args.get('cursor')
+        if cursor:
+            cursor_date, cursor_id = cursor.rsplit(':', 1)
+            date.fromisoformat(cursor_date)
+            cursor = (cursor_date, int(cursor_id))
+    except ValueError:
+        raise ValueError('Invalid date range or cursor')
+    
+    columns = '*'
+    fields = request.args.get('fields')
+    if fields:
+        # id and date are always needed for the keyset cursor
+        wanted = {f.strip() for f in fields.split(',')} | {'id', 'date'}
+        if not wanted <= set(TASK_FIELDS):
+            raise ValueError('Unknown field')
+        columns = ', '.join(f for f in TASK_FIELDS if f in wanted)
+    
+    limit = request.args.get('limit', type=int)
+    return date_from, date_to, columns, limit, cursor
+
+def _dashboard_payload(user_id, date_from, date_to, columns='*', limit=None, cursor=None):
+    if limit is None and not cursor:
+        # Whole window in one response
+        data = _task_query(user_id, columns, date_from, date_to).order('date', desc=True).order('id', desc=True).execute()
+        tasks = data.data or []
+        next_cursor = None
+    else:
+        limit = min(max(limit or DASHBOARD_MAX_LIMIT, 1), DASHBOARD_MAX_LIMIT)
+        tasks, next_cursor = _task_page(user_id, columns, date_from, date_to, cursor, limit)
+    
+    pending_focus = focus_buffer.pending(user_id, date_from, date_to)
+    payload = {'tasks': tasks, 'next_cursor': next_cursor}
+    if not cursor:
+        # Per-day totals for the whole window, sent with the first page
+        if next_cursor is None and columns == '*':
+            summary_rows = tasks
+        else:
+            summary_rows = _task_query(user_id, 'date, task_name, tasks_completed, focus_time', date_from,
+                                       date_to).execute().data or []
+        payload['summary'] = _daily_summary(summary_rows, pending_focus)
+    # Buffered focus time shows up before it is flushed
+    if pending_focus:
+        payload['tasks'] = [_with_pending_focus(t, pending_focus) for t in tasks]
+    return payload
+
 # API Routes for Tab Data
 @app.route('/api/dashboard', methods=['GET'])
+@conditional(lambda user_id: [('tasks', user_id)])
 def get_dashboard():
     try:
         user_id = session.get('user_id')
-        if not user_id or not supabase:
+        if not user_id:
             return jsonify({'tasks': []}), 200
-        data = supabase.table('tasks').select('*').eq('user_id', user_id).order('date', desc=True).execute()
-        return jsonify({'tasks': data.data or []})
+        if not db:
+            return jsonify({'tasks': [], 'error': 'Database not configured'}), 500
+        
+        try:
+            args = _dashboard_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(_dashboard_payload(user_id, *args))
     except Exception as e:
-        return jsonify({'tasks': []}), 200
+        print(f"Dashboard error: {e}")
+        return jsonify({'tasks': [], 'error': str(e)}), 500
 
 @app.route('/api/garden', methods=['GET'])
 def get_garden():
     try:
         user_id = session.get('user_id')
-        if not user_id or not supabase:
+        if not user_id or not db:
             return jsonify({'plants': []}), 200
-        data = supabase.table('garden').select('*').eq('user_id', user_id).execute()
+        data = db.table('garden').select('*').eq('user_id', user_id).execute()
         return jsonify({'plants': data.data or []})
     except Exception as e:
         return jsonify({'plants': []}), 200
@@ -143,34 +502,37 @@ def get_garden():
 def get_groups():
     try:
         user_id = session.get('user_id')
-        if not user_id or not supabase:
+        if not user_id or not db:
             return jsonify({'groups': []}), 200
-        data = supabase.table('groups').select('*').eq('user_id', user_id).execute()
+        data = db.table('groups').select('*').eq('user_id', user_id).execute()
         return jsonify({'groups': data.data or []})
     except Exception as e:
         return jsonify({'groups': []}), 200
 
+def _garden_state_payload(state):
+    return {
+        'block_count': state.get('block_count', 0),
+        'is_dead': state.get('is_dead', False),
+        'last_activity': state.get('last_activity')
+    }
+
 @app.route('/api/garden-state', methods=['GET'])
 @login_required
+@conditional(lambda user_id: [('garden', user_id)])
 def get_garden_state():
     try:
-        if not supabase:
+        if not db:
             return jsonify({'block_count': 0, 'is_dead': False}), 500
         user_id = session.get('user_id')
         
         # Try to get existing garden state
-        result = supabase.table('garden_state').select('*').eq('user_id', user_id).execute()
+        result = db.table('garden_state').select('*').eq('user_id', user_id).execute()
         
         if result.data and len(result.data) > 0:
-            state = result.data[0]
-            return jsonify({
-                'block_count': state.get('block_count', 0),
-                'is_dead': state.get('is_dead', False),
-                'last_activity': state.get('last_activity')
-            })
+            return jsonify(_garden_state_payload(result.data[0]))
         else:
             # Create initial garden state
-            supabase.table('garden_state').insert({
+            db.table('garden_state').insert({
                 'user_id': user_id,
                 'block_count': 0,
                 'is_dead': False,
@@ -179,74 +541,90 @@ def get_garden_state():
             return jsonify({'block_count': 0, 'is_dead': False, 'last_activity': str(date.today())})
     except Exception as e:
         print(f"Garden state error: {e}")
-        return jsonify({'block_count': 0, 'is_dead': False}), 200
+        return jsonify({'block_count': 0, 'is_dead': False, 'error': str(e)}), 500
+
+def _update_garden(user_id):
+    # Grow or kill the garden from today's tasks. Returns (response payload,
+    # garden state after the update).
+    today = str(date.today())
+    
+    # Get current garden state (initialize if doesn't exist)
+    state_result = db.table('garden_state').select('*').eq('user_id', user_id).execute()
+    current_state = state_result.data[0] if state_result.data else None
+    
+    if not current_state:
+        # Initialize garden state
+        state = {
+            'user_id': user_id,
+            'block_count': 0,
+            'is_dead': False,
+            'last_activity': today,
+            'last_block_award_date': None
+        }
+        db.table('garden_state').insert(state).execute()
+        versions.bump('garden', user_id)
+        return {'success': True, 'days_inactive': 0}, state
+    
+    # Get today's tasks
+    tasks = db.table('tasks').select('tasks_completed').eq('user_id', user_id).eq('date', today).execute()
+    total_tasks = len(tasks.data) if tasks.data else 0
+    completed_tasks = len([t for t in (tasks.data or []) if t.get('tasks_completed', 0) > 0])
+    completion_pct = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+    
+    # Check if garden died (no activity for 3+ days)
+    last_activity = current_state.get('last_activity')
+    days_inactive = 0
+    
+    if last_activity:
+        try:
+            days_inactive = (date.today() - date.fromisoformat(last_activity)).days
+        except Exception:
+            days_inactive = 0
+    
+    if days_inactive >= 3 and current_state['block_count'] > 0:
+        # Garden dies after 3 days of inactivity (the nightly job usually got here first)
+        if not current_state.get('is_dead'):
+            db.table('garden_state').update({'is_dead': True}).eq('user_id', user_id).execute()
+            user_directory.set_garden(user_id, is_dead=True)
+            versions.bump('garden', user_id)
+        return {'success': True, 'died': True, 'days_inactive': days_inactive}, dict(current_state, is_dead=True)
+    
+    # Update garden based on task completion
+    new_block_count = current_state['block_count']
+    last_block_award_date = current_state.get('last_block_award_date')
+    
+    # Only award one block per day (check if we already awarded today)
+    if completion_pct >= 60 and last_block_award_date != today:
+        # Add a new block (only once per day)
+        new_block_count += 1
+        last_block_award_date = today
+    # If 40-50%, keep blocks (no change)
+    # If < 40%, also keep blocks on that day
+    
+    # Update state (repeat visits on the same day are read-only)
+    state = current_state
+    if new_block_count != current_state['block_count'] or last_activity != today or current_state.get('is_dead'):
+        changes = {
+            'block_count': new_block_count,
+            'last_activity': today,
+            'last_block_award_date': last_block_award_date,
+            'is_dead': False
+        }
+        db.table('garden_state').update(changes).eq('user_id', user_id).execute()
+        user_directory.set_garden(user_id, new_block_count, False)
+        versions.bump('garden', user_id)
+        state = dict(current_state, **changes)
+    
+    return {'success': True, 'block_count': new_block_count, 'days_inactive': days_inactive}, state
 
 @app.route('/api/update-garden', methods=['POST'])
 @login_required
 def update_garden():
     try:
-        if not supabase:
+        if not db:
             return jsonify({'success': False}), 500
-        user_id = session.get('user_id')
-        today = str(date.today())
-        
-        # Get current garden state (initialize if doesn't exist)
-        state_result = supabase.table('garden_state').select('*').eq('user_id', user_id).execute()
-        current_state = state_result.data[0] if state_result.data else None
-        
-        if not current_state:
-            # Initialize garden state
-            supabase.table('garden_state').insert({
-                'user_id': user_id,
-                'block_count': 0,
-                'is_dead': False,
-                'last_activity': today,
-                'last_block_award_date': None
-            }).execute()
-            return jsonify({'success': True, 'days_inactive': 0})
-        
-        # Get today's tasks
-        tasks = supabase.table('tasks').select('*').eq('user_id', user_id).eq('date', today).execute()
-        total_tasks = len(tasks.data) if tasks.data else 0
-        completed_tasks = len([t for t in (tasks.data or []) if t.get('tasks_completed', 0) > 0])
-        completion_pct = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-        
-        # Check if garden died (no activity for 3+ days)
-        last_activity = current_state.get('last_activity')
-        days_inactive = 0
-        
-        if last_activity:
-            try:
-                days_inactive = (date.today() - date.fromisoformat(last_activity)).days
-            except Exception:
-                days_inactive = 0
-        
-        if days_inactive >= 3 and current_state['block_count'] > 0:
-            # Garden dies after 3 days of inactivity
-            supabase.table('garden_state').update({'is_dead': True}).eq('user_id', user_id).execute()
-            return jsonify({'success': True, 'died': True, 'days_inactive': days_inactive})
-        
-        # Update garden based on task completion
-        new_block_count = current_state['block_count']
-        last_block_award_date = current_state.get('last_block_award_date')
-        
-        # Only award one block per day (check if we already awarded today)
-        if completion_pct >= 60 and last_block_award_date != today:
-            # Add a new block (only once per day)
-            new_block_count += 1
-            last_block_award_date = today
-        # If 40-50%, keep blocks (no change)
-        # If < 40%, also keep blocks on that day
-        
-        # Update state
-        supabase.table('garden_state').update({
-            'block_count': new_block_count,
-            'last_activity': today,
-            'last_block_award_date': last_block_award_date,
-            'is_dead': False
-        }).eq('user_id', user_id).execute()
-        
-        return jsonify({'success': True, 'block_count': new_block_count, 'days_inactive': days_inactive})
+        payload, _ = _update_garden(session.get('user_id'))
+        return jsonify(payload)
     except Exception as e:
         print(f"Garden update error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -255,18 +633,20 @@ def update_garden():
 @login_required
 def replant_garden():
     try:
-        if not supabase:
+        if not db:
             return jsonify({'success': False}), 500
         user_id = session.get('user_id')
         today = str(date.today())
         
         # Reset garden state
-        supabase.table('garden_state').update({
+        db.table('garden_state').update({
             'block_count': 0,
             'is_dead': False,
             'last_activity': today,
             'last_block_award_date': None
         }).eq('user_id', user_id).execute()
+        user_directory.set_garden(user_id, 0, False)
+        versions.bump('garden', user_id)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -275,16 +655,16 @@ def replant_garden():
 
 @app.route('/api/user-garden/<int:user_id>', methods=['GET'])
 @login_required
+@conditional(lambda viewer_id, user_id: [('garden', user_id)])
 def get_user_garden(user_id):
     try:
-        if not supabase:
+        if not db:
             return jsonify({'success': False, 'error': 'Database error'}), 500
         
         # Fetch the user's garden state
-        result = supabase.table('garden_state').select('*').eq('user_id', user_id).execute()
+        garden_state = request_loader(db, fanout).get('garden_state', user_id)
         
-        if result.data and len(result.data) > 0:
-            garden_state = result.data[0]
+        if garden_state:
             return jsonify({
                 'success': True,
                 'garden_state': {
@@ -313,7 +693,7 @@ def save_data():
         user_id = session.get('user_id')
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
-        if not supabase:
+        if not db:
             return jsonify({'success': False, 'error': 'Database not configured'}), 500
         
         payload = request.json
@@ -327,18 +707,24 @@ def save_data():
             task_name = data.get('task_name')
             
             # Check if task already exists
-            existing = supabase.table('tasks').select('id').eq('user_id', user_id).eq('date', date).eq('task_name', task_name).execute()
+            existing = db.table('tasks').select('id, task_name, tasks_completed, focus_time') \
+                .eq('user_id', user_id).eq('date', date).eq('task_name', task_name).execute()
             
             if existing.data and len(existing.data) > 0:
                 # Update existing task - only update the tasks_completed field
                 task_id = existing.data[0]['id']
-                supabase.table('tasks').update({'tasks_completed': data.get('tasks_completed')}).eq('id', task_id).execute()
+                db.table('tasks').update({'tasks_completed': data.get('tasks_completed')}).eq('id', task_id).execute()
+                change = analytics.change(existing.data[0], dict(existing.data[0], tasks_completed=data.get('tasks_completed')))
             else:
                 # Insert new task
-                supabase.table(table).insert(data).execute()
+                db.table(table).insert(data).execute()
+                change = analytics.change(None, data)
+            analytics.add(db, user_id, {date: change})
         else:
             # For other tables, just insert
-            supabase.table(table).insert(data).execute()
+            db.table(table).insert(data).execute()
+        if table == 'tasks':
+            _on_tasks_changed(user_id)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -349,7 +735,7 @@ def save_data():
 @login_required
 def delete_task():
     try:
-        if not supabase:
+        if not db:
             return jsonify({'success': False, 'error': 'Database not configured'}), 500
         user_id = session.get('user_id')
         payload = request.json
@@ -357,35 +743,336 @@ def delete_task():
         task_name = payload.get('task_name')
         
         # Delete task by date and task_name
-        supabase.table('tasks').delete().eq('user_id', user_id).eq('date', date).eq('task_name', task_name).execute()
+        deleted = db.table('tasks').delete().eq('user_id', user_id).eq('date', date).eq('task_name', task_name).execute()
+        for row in deleted.data or []:
+            analytics.add(db, user_id, {date: analytics.change(row, None)})
+        _on_tasks_changed(user_id)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+TASK_BATCH_MAX_OPS = 500
+
+def _collapse_task_ops(ops):
+    # Fold the ordered ops into the final state of each (date, task_name):
+    # ('upsert', tasks_completed) or ('delete', None). Raises ValueError.
+    final = {}
+    for op in ops:
+        kind = op.get('op')
+        day = op.get('date')
+        task_name = op.get('task_name')
+        date.fromisoformat(day)
+        if not isinstance(task_name, str) or not task_name.strip():
+            raise ValueError('task_name required')
+        key = (day, task_name)
+        if kind == 'add':
+            final[key] = ('upsert', 1 if op.get('tasks_completed') else 0)
+        elif kind == 'toggle':
+            if 'tasks_completed' not in op:
+                raise ValueError('toggle needs tasks_completed')
+            final[key] = ('upsert', 1 if op.get('tasks_completed') else 0)
+        elif kind == 'delete':
+            final[key] = ('delete', None)
+        else:
+            raise ValueError(f"Unknown op: {kind}")
+    return final
+
+@app.route('/api/tasks/batch', methods=['POST'])
+@login_required
+def batch_tasks():
+    try:
+        if not db:
+            return jsonify({'success': False, 'error': 'Database not configured'}), 500
+        user_id = session.get('user_id')
+        ops = (request.json or {}).get('ops')
+        if not isinstance(ops, list) or not ops:
+            return jsonify({'success': False, 'message': 'ops required'}), 400
+        if len(ops) > TASK_BATCH_MAX_OPS:
+            return jsonify({'success': False, 'message': f'At most {TASK_BATCH_MAX_OPS} ops per batch'}), 400
+
+        try:
+            final = _collapse_task_ops(ops)
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({'success': False, 'message': f'Invalid op: {e}'}), 400
+
+        return jsonify({
+            'success': True,
+            'applied': len(final),
+            'summary': _apply_task_ops(user_id, final)
+        })
+    except Exception as e:
+        print(f"Batch tasks error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def _apply_task_ops(user_id, final, rows=None):
+    # Writes collapsed ops with one upsert for every added/toggled task and one
+    # delete per affected day, adds their deltas to the rollups and returns
+    # the days' chart summaries. rows are the task rows of those days read
+    # before the write (read here when not given). Upserts never touch
+    # focus_time, so focus flushes landing meanwhile are not counted twice.
+    days = sorted({day for day, _ in final})
+    if rows is None:
+        rows = db.table('tasks').select('date, task_name, tasks_completed, focus_time') \
+            .eq('user_id', user_id).in_('date', days).execute().data or []
+    current = {(r['date'], r['task_name']): r for r in rows}
+    upserts = []
+    deletes = {}
+    deltas = {}
+
+    def count(day, delta):
+        deltas[day] = tuple(a + b for a, b in zip(deltas.get(day, (0, 0, 0)), delta))
+
+    for (day, task_name), (action, completed) in final.items():
+        if action == 'upsert':
+            upserts.append({'user_id': user_id, 'date': day, 'task_name': task_name, 'tasks_completed': completed})
+            old = current.get((day, task_name))
+            new = dict(old or {'focus_time': 0}, date=day, task_name=task_name, tasks_completed=completed)
+            count(day, analytics.change(old, new))
+            current[(day, task_name)] = new
+        else:
+            deletes.setdefault(day, []).append(task_name)
+            current.pop((day, task_name), None)
+    if upserts:
+        db.table('tasks').upsert(upserts, on_conflict='user_id,date,task_name').execute()
+    for day, names in deletes.items():
+        deleted = db.table('tasks').delete().eq('user_id', user_id).eq('date', day).in_('task_name', names).execute()
+        for row in deleted.data or []:
+            count(day, analytics.change(row, None))
+    analytics.add(db, user_id, deltas)
+    _on_tasks_changed(user_id)
+
+    pending_focus = focus_buffer.pending(user_id, days[0], days[-1])
+    summary = {d['date']: d for d in _daily_summary(list(current.values()), pending_focus)}
+    return [summary.get(d, {'date': d, 'total': 0, 'completed': 0, 'focus_time': 0}) for d in days]
+
+# ======== SYNC ========
+def _sync_page(user_id, since, limit):
+    # {changes, rev, more, reset} after revision `since`. A client behind the
+    # pruned tombstones gets reset with the first page of a full resync.
+    if since > 0:
+        rows, tombstones, pruned = fanout.run(
+            lambda: sync.changed(db, user_id, since, limit),
+            lambda: sync.deleted(db, user_id, since, limit),
+            lambda: sync.horizon(db, user_id)
+        )
+        if since >= pruned:
+            changes, rev, more = sync.merge(rows, tombstones, since, limit)
+            return {'changes': changes, 'rev': rev, 'more': more, 'reset': False}
+    changes, rev, more = sync.merge(sync.changed(db, user_id, 0, limit), [], 0, limit)
+    return {'changes': changes, 'rev': rev, 'more': more, 'reset': since > 0}
+
+# Tasks changed or deleted after ?since=<rev> (0 or missing: every task), in
+# revision order, ?limit= per page. Keep the returned rev and ask again with
+# it while more is true; on reset drop the local store first.
+@app.route('/api/sync', methods=['GET'])
+@login_required
+@conditional(lambda user_id: [('tasks', user_id)])
+def get_sync():
+    try:
+        if not db:
+            return jsonify({'success': False, 'error': 'Database not configured'}), 500
+        since = max(request.args.get('since', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', sync.PAGE_SIZE, type=int), 1), sync.MAX_PAGE)
+        return jsonify(_sync_page(session.get('user_id'), since, limit))
+    except DeadlineExceeded:
+        return jsonify({'success': False, 'error': 'Request timed out'}), 504
+    except Exception as e:
+        print(f"Sync error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Pushes a batch of todo ops ({base_rev, ops}, ops as for /api/tasks/batch)
+# made on top of revision base_rev. Ops on tasks changed elsewhere since then
+# are rejected as conflicts and the server's version wins. The response carries
+# the first page of changes after base_rev (the client's own included), so
+# one request both saves and catches up.
+@app.route('/api/sync', methods=['POST'])
+@login_required
+def push_sync():
+    try:
+        if not db:
+            return jsonify({'success': False, 'error': 'Database not configured'}), 500
+        user_id = session.get('user_id')
+        payload = request.get_json(silent=True) or {}
+        ops = payload.get('ops') or []
+        base_rev = payload.get('base_rev', 0)
+        if not isinstance(ops, list) or not isinstance(base_rev, int) or base_rev < 0:
+            return jsonify({'success': False, 'message': 'base_rev and a list of ops required'}), 400
+        if len(ops) > TASK_BATCH_MAX_OPS:
+            return jsonify({'success': False, 'message': f'At most {TASK_BATCH_MAX_OPS} ops per batch'}), 400
+        try:
+            final = _collapse_task_ops(ops)
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({'success': False, 'message': f'Invalid op: {e}'}), 400
+
+        conflicts, summary = [], []
+        if final:
+            days = sorted({day for day, _ in final})
+            rows = db.table('tasks').select(sync.COLUMNS).eq('user_id', user_id).in_('date', days).execute().data or []
+            current = {(r['date'], r['task_name']): r for r in rows if (r['date'], r['task_name']) in final}
+            added = sync.first_added(ops)
+            # Only toggles of tasks the server doesn't have need the delete log
+            missing = sorted({key[0] for key, (action, _) in final.items()
+                              if action == 'upsert' and key not in current and key not in added})
+            removed = set()
+            if missing:
+                removed = {(t['date'], t['task_name']) for t in db.table(sync.TOMBSTONES).select('date, task_name')
+                           .eq('user_id', user_id).gt('rev', base_rev).in_('date', missing).execute().data or []}
+            final, conflicts = sync.check(final, added, current, removed, base_rev)
+            if final:
+                summary = _apply_task_ops(user_id, final, rows)
+        page = _sync_page(user_id, base_rev, sync.PAGE_SIZE)
+        return jsonify(dict(page, success=True, applied=len(final), conflicts=conflicts, summary=summary))
+    except DeadlineExceeded:
+        return jsonify({'success': False, 'error': 'Request timed out'}), 504
+    except Exception as e:
+        print(f"Sync push error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/update-focus', methods=['POST'])
 @login_required
 def update_focus():
     try:
-        if not supabase:
+        if not db:
             return jsonify({'success': False, 'error': 'Database not configured'}), 500
         user_id = session.get('user_id')
         payload = request.json
-        date = payload.get('date')
+        day = payload.get('date')
         focus_time = payload.get('focus_time')
         
-        # Check if focus session exists for today
-        result = supabase.table('tasks').select('id, focus_time').eq('user_id', user_id).eq('date', date).eq('task_name', 'Focus Session').execute()
-        
-        if result.data and len(result.data) > 0:
-            # Update existing focus session by adding time
-            existing_focus = result.data[0]['focus_time'] or 0
-            new_focus = existing_focus + focus_time
-            task_id = result.data[0]['id']
-            supabase.table('tasks').update({'focus_time': new_focus}).eq('id', task_id).execute()
-            return jsonify({'success': True, 'updated': True})
-        else:
-            return jsonify({'success': False, 'message': 'No existing session'})
+        try:
+            date.fromisoformat(day)
+            focus_time = int(focus_time)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'date and focus_time required'}), 400
+        if focus_time <= 0:
+            return jsonify({'success': False, 'message': 'focus_time must be positive'}), 400
+        
+        # Buffered and added to the day's Focus Session row (created if missing) on the next flush
+        focus_buffer.add(user_id, day, focus_time, db)
+        _on_tasks_changed(user_id)
+        return jsonify({'success': True, 'updated': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ======== EXPORTS ========
+MESSAGE_FIELDS = ('id', 'group_id', 'user_id', 'username', 'message', 'created_at')
+
+def _export_response(build_query, columns, name):
+    # ?format=ndjson (default) or csv, ?after_id= to resume; gzip when accepted
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in exports.FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(exports.FORMATS)}"}), 400
+    after_id = request.args.get('after_id', type=int)
+    gzip = request.accept_encodings['gzip'] > 0
+    body = exports.stream(build_query, columns, fmt, gzip=gzip, after_id=after_id)
+    response = Response(stream_with_context(body), mimetype=exports.FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{name}.{fmt}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'
+    })
+    if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+# Every task row of the user (Focus Session rows carry the focus history),
+# optionally limited to ?from=&to=YYYY-MM-DD
+@app.route('/api/export/tasks', methods=['GET'])
+@login_required
+def export_tasks():
+    if not db:
+        return jsonify({'error': 'Database not configured'}), 500
+    user_id = session.get('user_id')
+    try:
+        date_from = _parse_date_arg('from')
+        date_to = _parse_date_arg('to')
+    except ValueError:
+        return jsonify({'error': 'Invalid date range'}), 400
+    columns = ', '.join(TASK_FIELDS)
+    return _export_response(lambda: _task_query(user_id, columns, date_from, date_to), TASK_FIELDS,
+                            f'tasks-{user_id}-{date.today().isoformat()}')
+
+@app.route('/api/export/group/<int:group_id>/messages', methods=['GET'])
+@login_required
+def export_group_messages(group_id):
+    try:
+        if not db:
+            return jsonify({'error': 'Database not configured'}), 500
+        if not _is_group_member(group_id, session.get('user_id')):
+            return jsonify({'error': 'Not a member'}), 403
     except Exception as e:
+        print(f"Export messages error: {e}")
+        return jsonify({'error': str(e)}), 500
+    columns = ', '.join(MESSAGE_FIELDS)
+    return _export_response(lambda: db.table('group_messages').select(columns).eq('group_id', group_id),
+                            MESSAGE_FIELDS, f'group-{group_id}-messages-{date.today().isoformat()}')
+
+# ======== IMPORTS ========
+IMPORT_MAX_BYTES = int(os.getenv('IMPORT_MAX_BYTES', str(50 * 1024 * 1024)))
+IMPORT_MAX_CHUNK = 1000
+
+# Bulk task import from a CSV or iCalendar file, sent as a multipart "file"
+# field or as the raw body (Content-Type text/csv or text/calendar, or
+# ?format=csv|ics). Tasks the user already has are left unchanged.
+@app.route('/api/import/tasks', methods=['POST'])
+@login_required
+def import_tasks():
+    if not db:
+        return jsonify({'success': False, 'error': 'Database not configured'}), 500
+    user_id = session.get('user_id')
+    if (request.content_length or 0) > IMPORT_MAX_BYTES:
+        return jsonify({'success': False, 'message': f'Files are limited to {IMPORT_MAX_BYTES} bytes'}), 413
+    
+    upload = request.files.get('file')
+    if upload:
+        stream, fmt = upload.stream, imports.detect_format(upload.filename, upload.content_type)
+    else:
+        stream, fmt = request.stream, imports.detect_format(None, request.content_type)
+    fmt = request.args.get('format') or fmt
+    if fmt not in imports.FORMATS:
+        return jsonify({'success': False, 'message': 'Send a .csv or .ics file (or pass ?format=csv|ics)'}), 400
+    chunk_size = min(max(request.args.get('chunk_size', imports.CHUNK_SIZE, type=int), 1), IMPORT_MAX_CHUNK)
+    
+    # A file that breaks off halfway (an unreadable line, a lost connection)
+    # keeps the chunks already written: the error reports their counts and
+    # the caches are refreshed for them all the same
+    written = {}
+    try:
+        report = imports.import_tasks(db, user_id, imports.PARSERS[fmt](imports.text_lines(stream)), chunk_size,
+                                      written.update)
+    except (ValueError, csv.Error) as e:
+        return jsonify(dict(written, success=False, message=str(e))), 400
+    except Exception as e:
+        print(f"Import error: {e}")
+        return jsonify(dict(written, success=False, error=str(e))), 500
+    finally:
+        if upload:
+            upload.close()
+        if written.get('imported'):
+            _on_tasks_changed(user_id)
+    return jsonify(dict(report, success=True))
+
+# Totals, rolling windows, streaks, weekly/monthly trends and percentiles over
+# the last ?days= days (default 365), from one read of the daily rollups
+@app.route('/api/analytics', methods=['GET'])
+@login_required
+@conditional(lambda user_id: [('tasks', user_id), ('day', date.today().isoformat())])
+def get_analytics():
+    try:
+        if not db:
+            return jsonify({'error': 'Database not configured'}), 500
+        user_id = session.get('user_id')
+        days = request.args.get('days', analytics.DEFAULT_DAYS, type=int)
+        days = min(max(days, 1), analytics.MAX_DAYS)
+        today = date.today()
+        first = (today - timedelta(days=days - 1)).isoformat()
+        
+        rows = db.table(analytics.TABLE).select('date, tasks_total, tasks_completed, focus_time') \
+            .eq('user_id', user_id).gte('date', first).lte('date', today.isoformat()).execute()
+        pending_focus = focus_buffer.pending(user_id, first, today.isoformat())
+        return jsonify(analytics.summarize(rows.data or [], today, days, pending_focus))
+    except Exception as e:
+        print(f"Analytics error: {e}")
         return jsonify({'error': str(e)}), 500
 
 # ======== FRIENDS SYSTEM ========
@@ -400,87 +1087,107 @@ def add_friend():
         if not username:
             return jsonify({'success': False, 'message': 'Username required'}), 400
         
-        # Get friend user_id by username
-        friend_result = supabase.table('users').select('id').eq('username', username).execute()
-        
-        if not friend_result.data or len(friend_result.data) == 0:
-            return jsonify({'success': False, 'message': 'User not found'}), 404
-        
-        friend_id = friend_result.data[0]['id']
+        # Get friend user_id by username (the database only for users the index hasn't seen yet)
+        username_index.ensure_built(db)
+        friend_id = username_index.id_of(username)
+        if friend_id is None:
+            friend_result = db.table('users').select('id').eq('username', username).execute()
+            
+            if not friend_result.data or len(friend_result.data) == 0:
+                return jsonify({'success': False, 'message': 'User not found'}), 404
+            
+            friend_id = friend_result.data[0]['id']
+            username_index.add_user(friend_id, username)
         
         if friend_id == user_id:
             return jsonify({'success': False, 'message': 'Cannot add yourself'}), 400
         
         # Check if request already exists
-        existing = supabase.table('friends').select('*').eq('user_id', user_id).eq('friend_id', friend_id).execute()
-        if existing.data and len(existing.data) > 0:
+        friend_index.ensure_loaded(db)
+        if friend_index.has_edge(user_id, friend_id):
             return jsonify({'success': False, 'message': 'Friend request already sent'}), 400
         
         # Create friend request
-        supabase.table('friends').insert({
+        inserted = db.table('friends').insert({
             'user_id': user_id,
             'friend_id': friend_id,
             'status': 'pending'
         }).execute()
+        if inserted.data:
+            friend_index.add_edge(inserted.data[0]['id'], user_id, friend_id, 'pending')
+        versions.bump('friends', user_id, friend_id)
         
         return jsonify({'success': True, 'message': 'Friend request sent'})
     except Exception as e:
         print(f"Add friend error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _friends_payload(user_id):
+    # Accepted friends (both directions); usernames from the user directory
+    friend_index.ensure_loaded(db)
+    user_directory.ensure_fresh(db)
+    friend_ids = friend_index.friends_of(user_id)
+    users = user_directory.get_many(sorted(friend_ids), db)
+    return [{'id': u['id'], 'username': u['username']} for u in users.values()]
+
+@app.route('/api/users/search', methods=['GET'])
+@login_required
+def search_users():
+    try:
+        user_id = session.get('user_id')
+        query = request.args.get('q', '').strip()
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+        if not query:
+            return jsonify({'users': []})
+        
+        # Prefix matches from the in-memory index, annotated from the friend index
+        username_index.ensure_built(db)
+        matches = username_index.search(query, limit, exclude=user_id)
+        friend_index.ensure_loaded(db)
+        statuses = friend_index.statuses(user_id, [i for i, _ in matches])
+        
+        return jsonify({'users': [{'id': i, 'username': name, 'status': statuses[i]} for i, name in matches]})
+    except Exception as e:
+        print(f"User search error: {e}")
+        return jsonify({'users': []})
+
 @app.route('/api/friends', methods=['GET'])
 @login_required
+@conditional(lambda user_id: [('friends', user_id)])
 def get_friends():
     try:
-        user_id = session.get('user_id')
-        
-        # Get accepted friends (both directions)
-        result = supabase.table('friends').select('user_id, friend_id').eq('status', 'accepted').execute()
-        
-        friends_set = set()
-        for row in result.data or []:
-            if row['user_id'] == user_id:
-                friends_set.add(row['friend_id'])
-            elif row['friend_id'] == user_id:
-                friends_set.add(row['user_id'])
-        
-        friends_list = []
-        for friend_id in friends_set:
-            user_data = supabase.table('users').select('id, username').eq('id', friend_id).execute()
-            if user_data.data:
-                friends_list.append({
-                    'id': friend_id,
-                    'username': user_data.data[0]['username']
-                })
-        
-        return jsonify({'friends': friends_list})
+        return jsonify({'friends': _friends_payload(session.get('user_id'))})
     except Exception as e:
         print(f"Get friends error: {e}")
-        return jsonify({'friends': []}), 200
+        return jsonify({'friends': [], 'error': str(e)}), 500
+
+def _friend_requests_payload(user_id):
+    # Pending requests sent TO this user
+    friend_index.ensure_loaded(db)
+    pending = friend_index.pending_incoming(user_id)
+    
+    user_directory.ensure_fresh(db)
+    requesters = user_directory.get_many([r for _, r in pending], db)
+    
+    requests_list = []
+    for request_id, requester_id in pending:
+        if requester_id in requesters:
+            requests_list.append({
+                'request_id': request_id,
+                'from_user_id': requester_id,
+                'from_username': requesters[requester_id]['username']
+            })
+    return requests_list
 
 @app.route('/api/friend-requests', methods=['GET'])
 @login_required
+@conditional(lambda user_id: [('friends', user_id)])
 def get_friend_requests():
     try:
-        user_id = session.get('user_id')
-        
-        # Get pending requests sent TO this user
-        result = supabase.table('friends').select('id, user_id, status').eq('friend_id', user_id).eq('status', 'pending').execute()
-        
-        requests_list = []
-        for row in result.data or []:
-            requester = supabase.table('users').select('id, username').eq('id', row['user_id']).execute()
-            if requester.data:
-                requests_list.append({
-                    'request_id': row['id'],
-                    'from_user_id': row['user_id'],
-                    'from_username': requester.data[0]['username']
-                })
-        
-        return jsonify({'requests': requests_list})
+        return jsonify({'requests': _friend_requests_payload(session.get('user_id'))})
     except Exception as e:
         print(f"Get friend requests error: {e}")
-        return jsonify({'requests': []}), 200
+        return jsonify({'requests': [], 'error': str(e)}), 500
 
 @app.route('/api/accept-friend-request/<int:request_id>', methods=['POST'])
 @login_required
@@ -489,17 +1196,19 @@ def accept_friend_request(request_id):
         user_id = session.get('user_id')
         
         # Verify request is for this user
-        result = supabase.table('friends').select('*').eq('id', request_id).execute()
+        friend_index.ensure_loaded(db)
+        edge = friend_index.get_edge(request_id)
         
-        if not result.data or len(result.data) == 0:
+        if edge is None:
             return jsonify({'success': False, 'message': 'Request not found'}), 404
         
-        request_data = result.data[0]
-        if request_data['friend_id'] != user_id:
+        if edge[1] != user_id:
             return jsonify({'success': False, 'message': 'Not authorized'}), 403
         
         # Update status to accepted
-        supabase.table('friends').update({'status': 'accepted'}).eq('id', request_id).execute()
+        db.table('friends').update({'status': 'accepted'}).eq('id', request_id).execute()
+        friend_index.accept(request_id)
+        versions.bump('friends', edge[0], edge[1])
         
         return jsonify({'success': True})
     except Exception as e:
@@ -513,17 +1222,19 @@ def decline_friend_request(request_id):
         user_id = session.get('user_id')
         
         # Verify request is for this user
-        result = supabase.table('friends').select('*').eq('id', request_id).execute()
+        friend_index.ensure_loaded(db)
+        edge = friend_index.get_edge(request_id)
         
-        if not result.data or len(result.data) == 0:
+        if edge is None:
             return jsonify({'success': False, 'message': 'Request not found'}), 404
         
-        request_data = result.data[0]
-        if request_data['friend_id'] != user_id:
+        if edge[1] != user_id:
             return jsonify({'success': False, 'message': 'Not authorized'}), 403
         
         # Delete the request
-        supabase.table('friends').delete().eq('id', request_id).execute()
+        db.table('friends').delete().eq('id', request_id).execute()
+        friend_index.remove_edge(request_id)
+        versions.bump('friends', edge[0], edge[1])
         
         return jsonify({'success': True})
     except Exception as e:
@@ -538,10 +1249,12 @@ def remove_friend(friend_id):
         
         # Delete friendship in both directions
         # Delete where user_id is mine and friend_id is theirs
-        supabase.table('friends').delete().eq('user_id', user_id).eq('friend_id', friend_id).execute()
+        db.table('friends').delete().eq('user_id', user_id).eq('friend_id', friend_id).execute()
         
         # Delete where user_id is theirs and friend_id is mine
-        supabase.table('friends').delete().eq('user_id', friend_id).eq('friend_id', user_id).execute()
+        db.table('friends').delete().eq('user_id', friend_id).eq('friend_id', user_id).execute()
+        friend_index.remove_pair(user_id, friend_id)
+        versions.bump('friends', user_id, friend_id)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -550,39 +1263,36 @@ def remove_friend(friend_id):
 
 @app.route('/api/friend/<int:friend_id>/garden', methods=['GET'])
 @login_required
+@conditional(lambda user_id, friend_id: [('friends', user_id), ('garden', friend_id)])
 def get_friend_garden(friend_id):
     try:
         user_id = session.get('user_id')
         
         # Verify friendship exists
-        friendship = supabase.table('friends').select('*').eq('status', 'accepted').execute()
-        
-        is_friend = False
-        for row in friendship.data or []:
-            if (row['user_id'] == user_id and row['friend_id'] == friend_id) or \
-               (row['user_id'] == friend_id and row['friend_id'] == user_id):
-                is_friend = True
-                break
-        
-        if not is_friend:
+        friend_index.ensure_loaded(db)
+        if not friend_index.are_friends(user_id, friend_id):
             return jsonify({'success': False, 'message': 'Not friends'}), 403
         
-        # Get friend's username
-        friend = supabase.table('users').select('username').eq('id', friend_id).execute()
-        if not friend.data:
+        # Get friend's username and garden state (may not exist yet), concurrently
+        loader = request_loader(db, fanout).want('users', [friend_id]).want('garden_state', [friend_id])
+        loader.resolve_all()
+        friend = loader.get('users', friend_id)
+        if not friend:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
-        # Get friend's garden state (may not exist yet)
-        garden = supabase.table('garden_state').select('*').eq('user_id', friend_id).execute()
+        garden = loader.get('garden_state', friend_id)
         
         garden_data = {
-            'username': friend.data[0]['username'],
-            'block_count': garden.data[0]['block_count'] if garden.data else 0,
-            'is_dead': garden.data[0]['is_dead'] if garden.data else False,
-            'has_garden': len(garden.data) > 0
+            'username': friend['username'],
+            'block_count': garden['block_count'] if garden else 0,
+            'is_dead': garden['is_dead'] if garden else False,
+            'has_garden': garden is not None
         }
         
         return jsonify(garden_data)
+    except DeadlineExceeded as e:
+        print(f"Get friend garden timeout: {e}")
+        return jsonify({'success': False, 'error': 'Request timed out'}), 504
     except Exception as e:
         print(f"Get friend garden error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -600,51 +1310,56 @@ def create_group():
             return jsonify({'error': 'Group name required'}), 400
         
         # Create group
-        group_data = supabase.table('groups').insert({
+        group_data = db.table('groups').insert({
             'user_id': user_id,
             'group_name': group_name,
             'created_at': date.today().isoformat()
         }).execute()
+        versions.bump('groups', user_id)
         
         return jsonify({'success': True, 'group_id': group_data.data[0]['id']})
     except Exception as e:
         print(f"Create group error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/my-groups', methods=['GET'])
-@login_required
-def get_my_groups():
-    try:
-        user_id = session.get('user_id')
-        
-        # Get groups created by user
-        created_groups = supabase.table('groups').select('*').eq('user_id', user_id).execute()
-        
-        # Get groups user is a member of
-        member_groups = supabase.table('group_members').select('group_id').eq('user_id', user_id).execute()
-        member_group_ids = [m['group_id'] for m in (member_groups.data or [])]
-        
-        groups = []
-        for g in (created_groups.data or []):
+def _my_groups_payload(user_id):
+    # Groups created by user and groups user is a member of, concurrently
+    created_groups, member_groups = fanout.run(
+        lambda: db.table('groups').select('*').eq('user_id', user_id).execute(),
+        lambda: db.table('group_members').select('group_id').eq('user_id', user_id).execute()
+    )
+    member_group_ids = [m['group_id'] for m in (member_groups.data or [])]
+    
+    groups = []
+    for g in (created_groups.data or []):
+        groups.append({
+            'id': g['id'],
+            'name': g['group_name'],
+            'created_by_me': True
+        })
+    
+    if member_group_ids:
+        member_data = db.table('groups').select('*').in_('id', member_group_ids).execute()
+        for g in (member_data.data or []):
             groups.append({
                 'id': g['id'],
                 'name': g['group_name'],
-                'created_by_me': True
+                'created_by_me': False
             })
-        
-        if member_group_ids:
-            member_data = supabase.table('groups').select('*').in_('id', member_group_ids).execute()
-            for g in (member_data.data or []):
-                groups.append({
-                    'id': g['id'],
-                    'name': g['group_name'],
-                    'created_by_me': False
-                })
-        
-        return jsonify({'groups': groups})
+    return groups
+
+@app.route('/api/my-groups', methods=['GET'])
+@login_required
+@conditional(lambda user_id: [('groups', user_id)])
+def get_my_groups():
+    try:
+        return jsonify({'groups': _my_groups_payload(session.get('user_id'))})
+    except DeadlineExceeded as e:
+        print(f"Get my groups timeout: {e}")
+        return jsonify({'groups': [], 'error': 'Request timed out'}), 504
     except Exception as e:
         print(f"Get my groups error: {e}")
-        return jsonify({'groups': []})
+        return jsonify({'groups': [], 'error': str(e)}), 500
 
 @app.route('/api/group/<int:group_id>/members', methods=['GET'])
 @login_required
@@ -653,23 +1368,23 @@ def get_group_members(group_id):
         user_id = session.get('user_id')
         
         # Get group
-        group = supabase.table('groups').select('user_id').eq('id', group_id).execute()
-        if not group.data:
+        acl = group_acl.get(group_id, db)
+        if not acl:
             return jsonify({'error': 'Group not found'}), 404
         
         # Get all members (including creator)
-        members = supabase.table('group_members').select('user_id').eq('group_id', group_id).execute()
-        member_ids = [m['user_id'] for m in (members.data or [])]
-        creator_id = group.data[0]['user_id']
+        creator_id, members = acl
+        member_ids = sorted(members)
         
         # Add creator if not already in list
-        if creator_id not in member_ids:
+        if creator_id not in members:
             member_ids.insert(0, creator_id)
         
         # Get user details
-        user_details = supabase.table('users').select('id, username').in_('id', member_ids).execute()
+        user_directory.ensure_fresh(db)
+        user_details = user_directory.get_many(member_ids, db)
         
-        return jsonify({'members': user_details.data or []})
+        return jsonify({'members': [{'id': u['id'], 'username': u['username']} for u in user_details.values()]})
     except Exception as e:
         print(f"Get group members error: {e}")
         return jsonify({'members': []})
@@ -683,20 +1398,21 @@ def invite_to_group(group_id):
         friend_id = payload.get('friend_id')
         
         # Verify user owns group
-        group = supabase.table('groups').select('user_id').eq('id', group_id).execute()
-        if not group.data or group.data[0]['user_id'] != user_id:
+        acl = group_acl.get(group_id, db)
+        if not acl or acl[0] != user_id:
             return jsonify({'error': 'Not group owner'}), 403
         
         # Check if already a member
-        existing = supabase.table('group_members').select('id').eq('group_id', group_id).eq('user_id', friend_id).execute()
-        if existing.data:
+        if friend_id in acl[1]:
             return jsonify({'error': 'Already a member'}), 400
         
         # Add member
-        supabase.table('group_members').insert({
+        db.table('group_members').insert({
             'group_id': group_id,
             'user_id': friend_id
         }).execute()
+        group_acl.invalidate(group_id)
+        versions.bump('groups', friend_id)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -712,12 +1428,14 @@ def remove_member(group_id):
         member_id = payload.get('member_id')
         
         # Verify user owns group
-        group = supabase.table('groups').select('user_id').eq('id', group_id).execute()
-        if not group.data or group.data[0]['user_id'] != user_id:
+        acl = group_acl.get(group_id, db)
+        if not acl or acl[0] != user_id:
             return jsonify({'error': 'Not group owner'}), 403
         
         # Remove member
-        supabase.table('group_members').delete().eq('group_id', group_id).eq('user_id', member_id).execute()
+        db.table('group_members').delete().eq('group_id', group_id).eq('user_id', member_id).execute()
+        group_acl.invalidate(group_id)
+        versions.bump('groups', member_id)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -731,24 +1449,31 @@ def delete_group(group_id):
         user_id = session.get('user_id')
         
         # Verify user owns group
-        group = supabase.table('groups').select('user_id').eq('id', group_id).execute()
-        if not group.data or group.data[0]['user_id'] != user_id:
+        acl = group_acl.get(group_id, db)
+        if not acl or acl[0] != user_id:
             return jsonify({'error': 'Not group owner'}), 403
         
         # Delete messages
-        supabase.table('group_messages').delete().eq('group_id', group_id).execute()
+        db.table('group_messages').delete().eq('group_id', group_id).execute()
+        chat_hub.drop(group_id)
         
         # Delete members
-        supabase.table('group_members').delete().eq('group_id', group_id).execute()
+        db.table('group_members').delete().eq('group_id', group_id).execute()
         
         # Delete group
-        supabase.table('groups').delete().eq('id', group_id).execute()
+        db.table('groups').delete().eq('id', group_id).execute()
+        group_acl.invalidate(group_id)
+        versions.bump('groups', acl[0], *acl[1])
         
         return jsonify({'success': True})
     except Exception as e:
         print(f"Delete group error: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _is_group_member(group_id, user_id):
+    acl = group_acl.get(group_id, db)
+    return bool(acl) and (acl[0] == user_id or user_id in acl[1])
+
 @app.route('/api/group/<int:group_id>/send-message', methods=['POST'])
 @login_required
 def send_group_message(group_id):
@@ -761,26 +1486,23 @@ def send_group_message(group_id):
             return jsonify({'error': 'Message required'}), 400
         
         # Verify user is member of group
-        group = supabase.table('groups').select('user_id').eq('id', group_id).execute()
-        is_owner = group.data and group.data[0]['user_id'] == user_id
-        
-        if not is_owner:
-            member = supabase.table('group_members').select('id').eq('group_id', group_id).eq('user_id', user_id).execute()
-            if not member.data:
-                return jsonify({'error': 'Not a member'}), 403
+        if not _is_group_member(group_id, user_id):
+            return jsonify({'error': 'Not a member'}), 403
         
         # Get username
-        user = supabase.table('users').select('username').eq('id', user_id).execute()
-        username = user.data[0]['username'] if user.data else 'Unknown'
+        user_directory.ensure_fresh(db)
+        user = user_directory.get_many([user_id], db).get(user_id)
+        username = user['username'] if user else 'Unknown'
         
         # Save message
-        msg_data = supabase.table('group_messages').insert({
+        msg_data = db.table('group_messages').insert({
             'group_id': group_id,
             'user_id': user_id,
             'username': username,
             'message': message,
             'created_at': date.today().isoformat()
         }).execute()
+        chat_hub.publish(group_id, msg_data.data[0])
         
         return jsonify({'success': True, 'message_id': msg_data.data[0]['id']})
     except Exception as e:
@@ -792,58 +1514,126 @@ def send_group_message(group_id):
 def get_group_messages(group_id):
     try:
         user_id = session.get('user_id')
+        after_id = request.args.get('after_id', type=int)
         
         # Verify user is member of group
-        group = supabase.table('groups').select('user_id').eq('id', group_id).execute()
-        is_owner = group.data and group.data[0]['user_id'] == user_id
+        if not _is_group_member(group_id, user_id):
+            return jsonify({'error': 'Not a member'}), 403
         
-        if not is_owner:
-            member = supabase.table('group_members').select('id').eq('group_id', group_id).eq('user_id', user_id).execute()
-            if not member.data:
-                return jsonify({'error': 'Not a member'}), 403
+        # Serve from the group's ring buffer when it covers the cursor
+        chat_hub.ensure_primed(group_id, db)
+        messages = chat_hub.since(group_id, after_id)
         
-        # Get messages
-        messages = supabase.table('group_messages').select('*').eq('group_id', group_id).order('id', desc=False).execute()
+        if messages is None:
+            query = db.table('group_messages').select('*').eq('group_id', group_id)
+            if after_id is not None:
+                query = query.gt('id', after_id)
+            messages = query.order('id', desc=False).execute().data or []
         
-        return jsonify({'messages': messages.data or []})
+        last_id = messages[-1]['id'] if messages else after_id
+        return jsonify({'messages': messages, 'last_id': last_id})
     except Exception as e:
         print(f"Get messages error: {e}")
         return jsonify({'messages': []})
 
-@app.route('/api/leaderboard', methods=['GET'])
+@app.route('/api/group/<int:group_id>/stream', methods=['GET'])
 @login_required
-def get_leaderboard():
+def stream_group_messages(group_id):
     try:
-        # Get all users with their garden block counts
-        users = supabase.table('users').select('id, username').execute()
+        user_id = session.get('user_id')
         
-        leaderboard = []
-        for user in (users.data or []):
-            garden = supabase.table('garden_state').select('block_count').eq('user_id', user['id']).execute()
-            profile = supabase.table('user_profiles').select('pfp_url').eq('user_id', user['id']).execute()
-            
-            block_count = garden.data[0]['block_count'] if garden.data else 0
-            pfp_url = profile.data[0]['pfp_url'] if profile.data else ''
-            
-            leaderboard.append({
-                'id': user['id'],
-                'username': user['username'],
-                'block_count': block_count,
-                'pfp_url': pfp_url
-            })
+        # Resume from the browser's reconnect cursor if it sent one
+        after_id = request.headers.get('Last-Event-ID', type=int)
+        if after_id is None:
+            after_id = request.args.get('after_id', 0, type=int)
         
-        # Sort by block_count descending
-        leaderboard.sort(key=lambda x: x['block_count'], reverse=True)
+        if not _is_group_member(group_id, user_id):
+            return jsonify({'error': 'Not a member'}), 403
+        
+        chat_hub.ensure_primed(group_id, db)
+    except Exception as e:
+        print(f"Stream messages error: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    def events():
+        cursor = after_id
+        # Close after CHAT_STREAM_TIMEOUT so EventSource reconnects and
+        # re-checks membership
+        deadline = time.monotonic() + CHAT_STREAM_TIMEOUT
+        # Wake up in time to pick up other workers' messages
+        timeout = min(CHAT_KEEPALIVE, chat_hub.sync_interval or CHAT_KEEPALIVE)
+        sent_at = time.monotonic()
+        yield 'retry: 2000\n\n'
+        while time.monotonic() < deadline:
+            try:
+                chat_hub.ensure_primed(group_id, db)
+            except Exception as e:
+                print(f"Stream messages error: {e}")
+                return
+            messages = chat_hub.wait(group_id, cursor, timeout)
+            if messages is None:
+                # Cursor older than the buffer (or the channel was evicted):
+                # catch up from the database a page at a time until the
+                # buffer covers it again
+                try:
+                    chat_hub.ensure_primed(group_id, db)
+                    messages = db.table('group_messages').select('*').eq('group_id', group_id) \
+                        .gt('id', cursor).order('id', desc=False).limit(chat_hub.buffer_size).execute().data or []
+                except Exception as e:
+                    print(f"Stream messages error: {e}")
+                    return
+            if not messages:
+                if time.monotonic() - sent_at >= CHAT_KEEPALIVE:
+                    sent_at = time.monotonic()
+                    yield ': keepalive\n\n'
+                continue
+            for m in messages:
+                yield f"id: {m['id']}\ndata: {json.dumps(m, default=str)}\n\n"
+            cursor = messages[-1]['id']
+            sent_at = time.monotonic()
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/leaderboard', methods=['GET'])
+@login_required
+def get_leaderboard():
+    try:
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
         
-        # Add rank
-        for idx, user in enumerate(leaderboard, 1):
-            user['rank'] = idx
+        # Served from the in-memory ranking (built on first use)
+        leaderboard.ensure_built(db)
         
-        return jsonify({'leaderboard': leaderboard})
+        return jsonify({
+            'leaderboard': leaderboard.page(offset, limit),
+            'total': len(leaderboard),
+            'offset': offset,
+            'limit': limit
+        })
     except Exception as e:
         print(f"Leaderboard error: {e}")
         return jsonify({'leaderboard': []})
 
+@app.route('/api/leaderboard/me', methods=['GET'])
+@login_required
+def get_my_rank():
+    try:
+        user_id = session.get('user_id')
+        radius = min(max(request.args.get('radius', 5, type=int), 0), 50)
+        
+        leaderboard.ensure_built(db)
+        rank, neighbours = leaderboard.around(user_id, radius)
+        
+        if rank is None:
+            return jsonify({'rank': None, 'leaderboard': []}), 404
+        return jsonify({'rank': rank, 'total': len(leaderboard), 'leaderboard': neighbours})
+    except Exception as e:
+        print(f"Leaderboard rank error: {e}")
+        return jsonify({'rank': None, 'leaderboard': []})
+
 @app.route('/api/profile/update', methods=['POST'])
 @login_required
 def update_profile():
@@ -854,66 +1644,234 @@ def update_profile():
         pfp_url = payload.get('pfp_url', '')
         
         # Check if profile exists
-        existing = supabase.table('user_profiles').select('id').eq('user_id', user_id).execute()
+        existing = db.table('user_profiles').select('id').eq('user_id', user_id).execute()
         
         if existing.data:
             # Update profile
-            supabase.table('user_profiles').update({
+            db.table('user_profiles').update({
                 'bio': bio,
                 'pfp_url': pfp_url
             }).eq('user_id', user_id).execute()
         else:
             # Create profile
-            supabase.table('user_profiles').insert({
+            db.table('user_profiles').insert({
                 'user_id': user_id,
                 'bio': bio,
                 'pfp_url': pfp_url
             }).execute()
+        user_directory.set_pfp_url(user_id, pfp_url)
+        versions.bump('profile', user_id)
         
         return jsonify({'success': True})
     except Exception as e:
         print(f"Update profile error: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _profile_payload(user_id, garden):
+    loader = request_loader(db, fanout)
+    user = loader.get('users', user_id)
+    if not user:
+        return None
+    profile = loader.get('user_profiles', user_id)
+    return {
+        'id': user['id'],
+        'username': user['username'],
+        'bio': profile['bio'] if profile else '',
+        'pfp_url': profile['pfp_url'] if profile else '',
+        'block_count': garden['block_count'] if garden else 0
+    }
+
 @app.route('/api/profile/<int:user_id>', methods=['GET'])
 @login_required
+@conditional(lambda viewer_id, user_id: [('friends', viewer_id), ('profile', user_id), ('garden', user_id)])
 def get_profile(user_id):
     try:
         current_user_id = session.get('user_id')
         
         # Check if friends (if viewing someone else's profile)
         if user_id != current_user_id:
-            friendship = supabase.table('friends').select('status').eq('user_id', current_user_id).eq('friend_id', user_id).execute()
-            if not friendship.data or friendship.data[0]['status'] != 'accepted':
-                # Check reverse direction
-                friendship = supabase.table('friends').select('status').eq('user_id', user_id).eq('friend_id', current_user_id).execute()
-                if not friendship.data or friendship.data[0]['status'] != 'accepted':
-                    return jsonify({'success': False, 'error': 'Not friends'}), 403
-        
-        # Get user info
-        user = supabase.table('users').select('id, username').eq('id', user_id).execute()
-        if not user.data:
+            friend_index.ensure_loaded(db)
+            if not friend_index.are_friends(current_user_id, user_id):
+                return jsonify({'success': False, 'error': 'Not friends'}), 403
+        
+        # Get user info, profile and garden blocks (one query per table, concurrently)
+        loader = request_loader(db, fanout)
+        for table in ('users', 'user_profiles', 'garden_state'):
+            loader.want(table, [user_id])
+        loader.resolve_all()
+        profile = _profile_payload(user_id, loader.get('garden_state', user_id))
+        if not profile:
             return jsonify({'success': False, 'error': 'User not found'}), 404
         
-        # Get profile
-        profile = supabase.table('user_profiles').select('*').eq('user_id', user_id).execute()
+        return jsonify({'success': True, 'profile': profile})
+    except DeadlineExceeded as e:
+        print(f"Get profile timeout: {e}")
+        return jsonify({'success': False, 'error': 'Request timed out'}), 504
+    except Exception as e:
+        print(f"Get profile error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Everything the app shell needs after login in one round trip. Friends and
+# requests come from the friend index and the user directory; the garden
+# update, dashboard, groups and the profile lookup run in parallel.
+@app.route('/api/bootstrap', methods=['GET'])
+@login_required
+def bootstrap():
+    try:
+        if not db:
+            return jsonify({'success': False, 'error': 'Database not configured'}), 500
+        user_id = session.get('user_id')
+        
+        try:
+            dashboard_args = _dashboard_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        friend_index.ensure_loaded(db)
+        user_directory.ensure_fresh(db)
+        loader = request_loader(db, fanout).want('users', [user_id]).want('user_profiles', [user_id])
         
-        # Get garden blocks
-        garden = supabase.table('garden_state').select('block_count').eq('user_id', user_id).execute()
+        (garden_result, garden), dashboard, groups, _ = fanout.run(
+            lambda: _update_garden(user_id),
+            lambda: _dashboard_payload(user_id, *dashboard_args),
+            lambda: _my_groups_payload(user_id),
+            loader.resolve_all
+        )
         
         return jsonify({
             'success': True,
-            'profile': {
-                'id': user.data[0]['id'],
-                'username': user.data[0]['username'],
-                'bio': profile.data[0]['bio'] if profile.data else '',
-                'pfp_url': profile.data[0]['pfp_url'] if profile.data else '',
-                'block_count': garden.data[0]['block_count'] if garden.data else 0
-            }
+            'user': {'user_id': user_id, 'username': session.get('username')},
+            'dashboard': dashboard,
+            'garden': dict(_garden_state_payload(garden), days_inactive=garden_result.get('days_inactive', 0)),
+            'friend_requests': _friend_requests_payload(user_id),
+            'friends': _friends_payload(user_id),
+            'groups': groups,
+            'profile': _profile_payload(user_id, garden)
         })
+    except DeadlineExceeded as e:
+        print(f"Bootstrap timeout: {e}")
+        return jsonify({'success': False, 'error': 'Request timed out'}), 504
     except Exception as e:
-        print(f"Get profile error: {e}")
+        print(f"Bootstrap error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    return jsonify({
+        'group_acl': group_acl.stats(),
+        'focus_buffer': focus_buffer.stats(),
+        'username_index': {'users': len(username_index), 'bytes': username_index.memory_bytes()},
+        'user_directory': user_directory.stats(),
+        'single_flight': single_flight.stats()
+    })
+
+# Load balancer health check: 503 while the storage circuit is open
+@app.route('/api/health', methods=['GET'])
+def get_health():
+    stats = db.stats() if db is not None else {'state': 'unconfigured'}
+    return jsonify({'storage': stats}), 200 if stats.get('state') == 'closed' else 503
+
+# Prometheus scrape target; counters are per worker process
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# CLI: flask --app backend evaluate-gardens [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+@app.cli.command('evaluate-gardens', help='Award missed blocks and kill inactive gardens for every user.')
+@click.option('--start', help='First day to evaluate (default: 6 days before --end)')
+@click.option('--end', help='Last day to evaluate (default: today)')
+@click.option('--chunk-size', default=garden_jobs.CHUNK_SIZE, show_default=True, help='Rows per bulk upsert')
+def evaluate_gardens_command(start, end, chunk_size):
+    end_day = date.fromisoformat(end) if end else date.today()
+    start_day = date.fromisoformat(start) if start else garden_jobs.default_window(end_day)[0]
+    # The caches live in the web workers, which pick the changes up from
+    # garden_state.updated_at on their next directory refresh
+    result = garden_jobs.evaluate_gardens(db, start_day, end_day, chunk_size=chunk_size)
+    result.pop('changes')
+    click.echo(json.dumps(result))
+
+# CLI: flask --app backend rebuild-analytics [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+@app.cli.command('rebuild-analytics', help='Recompute the daily_stats rollups from the tasks table.')
+@click.option('--start', help='First day to rebuild (default: all history)')
+@click.option('--end', help='Last day to rebuild (default: all history)')
+@click.option('--chunk-size', default=analytics.CHUNK_SIZE, show_default=True, help='Rows per bulk upsert')
+def rebuild_analytics_command(start, end, chunk_size):
+    result = analytics.rebuild(db, date.fromisoformat(start) if start else None,
+                               date.fromisoformat(end) if end else None, chunk_size=chunk_size)
+    click.echo(json.dumps(result))
+
+# CLI: flask --app backend prune-tombstones [--days N]
+@app.cli.command('prune-tombstones', help='Drop old task delete records kept for /api/sync.')
+@click.option('--days', default=sync.TOMBSTONE_DAYS, show_default=True,
+              help='Keep deletes from this many days; clients not synced since then resync in full')
+def prune_tombstones_command(days):
+    click.echo(json.dumps(sync.prune(db, date.today() - timedelta(days=days))))
+
+# CLI: flask --app backend import-tasks FILE --user USERNAME [--format csv|ics] [--chunk-size N]
+@app.cli.command('import-tasks', help='Import tasks for one user from a CSV or iCalendar file.')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', required=True, help='Username to import the tasks for')
+@click.option('--format', 'fmt', type=click.Choice(imports.FORMATS), help='File format (default: from the extension)')
+@click.option('--chunk-size', default=imports.CHUNK_SIZE, show_default=True, help='Rows per bulk upsert')
+def import_tasks_command(path, username, fmt, chunk_size):
+    users = db.table('users').select('id').eq('username', username).execute().data
+    if not users:
+        raise click.ClickException(f'No user named {username}')
+    fmt = fmt or imports.detect_format(path)
+    if fmt is None:
+        raise click.ClickException('Unknown file type; pass --format')
+    
+    started = last_report = time.monotonic()
+    last = {}
+    def progress(report):
+        nonlocal last_report
+        last.update(report)
+        if time.monotonic() - last_report >= 1:
+            last_report = time.monotonic()
+            click.echo(f"{report['rows']} rows read, {report['imported']} imported, {report['errors']} errors", err=True)
+    
+    with open(path, encoding='utf-8-sig', errors='replace', newline='') as f:
+        try:
+            report = imports.import_tasks(db, users[0]['id'], imports.PARSERS[fmt](f), chunk_size, progress)
+        except (ValueError, csv.Error) as e:
+            raise click.ClickException(f"{e} ({last['imported']} tasks imported before it)" if last else str(e))
+    report['seconds'] = round(time.monotonic() - started, 2)
+    click.echo(json.dumps(report))
+
+# CLI: flask --app backend profiles [--route TEXT] [--top N] [--merge DIR]
+@app.cli.command('profiles', help='Summarize the request profiles in PROFILE_DIR per route.')
+@click.option('--dir', 'directory', default=None, help='Profile directory (default: PROFILE_DIR)')
+@click.option('--route', help='Only routes containing this text')
+@click.option('--top', default=10, show_default=True, help='Hottest frames to list per route')
+@click.option('--merge', help='Write one merged .collapsed file per route into this directory')
+def profiles_command(directory, route, top, merge):
+    directory = directory or request_profiler.directory
+    if not os.path.isdir(directory):
+        raise click.ClickException(f'No profiles in {directory}')
+    routes = profiler.aggregate(directory)
+    for name, (count, stacks) in sorted(routes.items(), key=lambda item: -sum(item[1][1].values())):
+        if route and route not in name:
+            continue
+        samples = sum(stacks.values())
+        click.echo(f'{name}: {count} profiles, {samples} samples')
+        for frame, hits in profiler.self_time(stacks, top):
+            click.echo(f'  {hits / samples:6.1%}  {frame}')
+        if merge:
+            os.makedirs(merge, exist_ok=True)
+            path = os.path.join(merge, profiler.quote(name, safe='') + profiler.SUFFIX)
+            with open(path, 'w') as f:
+                for stack, hits in stacks.most_common():
+                    f.write(f'{stack} {hits}\n')
+            click.echo(f'  -> {path}')
+
+# CLI: flask --app backend build-assets
+@app.cli.command('build-assets', help='Minify, fingerprint and precompress the static assets into ASSETS_DIR.')
+def build_assets_command():
+    for logical, filename, sizes in build_assets(app.static_folder, ASSETS_DIR):
+        encoded = ''.join(f', {suffix[1:]} {size}' for suffix, size in sizes.items() if suffix)
+        click.echo(f'{logical} -> {filename} ({sizes[""]} bytes{encoded})')
+    assets.load()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
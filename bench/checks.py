@@ -0,0 +1,588 @@
+import argparse
+import sys
+import threading
+import time
+import traceback
+from datetime import date, timedelta
+
+from bench import run  # noqa: F401  (sets the benchmark environment before backend loads)
+import analytics  # noqa: E402
+import backend  # noqa: E402
+import garden_jobs  # noqa: E402
+import sync  # noqa: E402
+from bench.fake_supabase import FakeSupabase  # noqa: E402
+from bench.seed import seed  # noqa: E402
+
+# Consistency checks for the stateful parts of backend.py that the latency
+# benchmark cannot see. The checks share one small seeded in-memory database
+# (each works on its own users and groups), drive the routes through Flask's
+# test client and assert on what comes back and what ends up stored. Exits
+# non-zero when a check fails.
+#
+#   python -m bench.checks
+#   python -m bench.checks --only chat
+
+CHECKS = {}
+
+
+def check(name):
+    def decorator(f):
+        CHECKS[name] = f
+        return f
+    return decorator
+
+
+def client_for(user_id):
+    client = backend.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['username'] = f'user{user_id}'
+    return client
+
+
+def read_events(response, count, limit=5.0):
+    # (ids of the first `count` events, comments seen before them)
+    ids, comments = [], []
+    deadline = time.monotonic() + limit
+    for chunk in response.response:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        for line in text.splitlines():
+            if line.startswith('id: '):
+                ids.append(int(line[4:]))
+            elif line.startswith(':'):
+                comments.append(line)
+        if len(ids) >= count or comments or time.monotonic() > deadline:
+            break
+    response.close()
+    return ids, comments
+
+
+# ---- group chat ----
+
+@check('chat stream catches up from a cursor older than the buffer')
+def _chat_resume(db, world):
+    group_id, owner, _ = world.groups[0]
+    backend.chat_hub.drop(group_id)
+    extra = backend.chat_hub.buffer_size + 50
+    db.load('group_messages', [{'group_id': group_id, 'user_id': owner, 'username': world.usernames[owner],
+                                'message': f'm{i}', 'created_at': '2024-01-01'} for i in range(extra)])
+    expected = [m['id'] for m in db.table('group_messages').select('id').eq('group_id', group_id)
+                .order('id').limit(10000).execute().data]
+    assert len(expected) > backend.chat_hub.buffer_size
+
+    client = client_for(owner)
+    for cursor in (0, expected[10]):
+        response = client.get(f'/api/group/{group_id}/stream', headers={'Last-Event-ID': str(cursor)},
+                              buffered=False)
+        want = [i for i in expected if i > cursor]
+        ids, comments = read_events(response, len(want))
+        assert not comments, f'keepalive before the backlog was sent (cursor {cursor})'
+        assert ids == want, f'cursor {cursor}: got {len(ids)} of {len(want)} messages'
+
+
+@check('chat reads and streams pick up messages sent through another worker')
+def _chat_other_worker(db, world):
+    group_id, owner, _ = world.groups[1]
+    hub = backend.chat_hub
+    client = client_for(owner)
+    last = client.get(f'/api/group/{group_id}/messages?after_id=0').get_json()['last_id'] or 0
+
+    def send_elsewhere(text):
+        # Written by another worker: stored, never published to this hub
+        return db.table('group_messages').insert({'group_id': group_id, 'user_id': owner, 'message': text,
+                                                  'username': world.usernames[owner],
+                                                  'created_at': '2024-01-01'}).execute().data[0]
+
+    interval, hub.sync_interval = hub.sync_interval, 0.05
+    try:
+        first = send_elsewhere('from another worker')
+        time.sleep(0.06)
+        messages = client.get(f'/api/group/{group_id}/messages?after_id={last}').get_json()['messages']
+        assert [m['id'] for m in messages] == [first['id']], f'poll got {messages}'
+
+        hub.publish(group_id, first)   # its own worker's publish, after the top-up read it
+        assert [m['id'] for m in hub.since(group_id, last)] == [first['id']], 'message buffered twice'
+
+        response = client.get(f'/api/group/{group_id}/stream', headers={'Last-Event-ID': str(first['id'])},
+                              buffered=False)
+        sender = threading.Timer(0.1, send_elsewhere, args=('streamed from another worker',))
+        sender.start()
+        ids, comments = read_events(response, 1)
+        sender.join()
+        assert len(ids) == 1 and ids[0] > first['id'] and not comments, f'stream got {ids} {comments}'
+    finally:
+        hub.sync_interval = interval
+
+
+# ---- conditional requests ----
+
+class _Broken:
+    def table(self, name):
+        raise ConnectionError('database down')
+
+    def rpc(self, name, params=None):
+        raise ConnectionError('database down')
+
+
+@check('failed reads are not tagged, and own writes invalidate tags from other workers')
+def _etags(db, world):
+    user_id = world.user_ids[1]
+    client = client_for(user_id)
+    healthy = backend.db
+    backend.db = _Broken()
+    try:
+        response = client.get('/api/dashboard')
+    finally:
+        backend.db = healthy
+    assert response.status_code >= 500 and not response.headers.get('ETag'), 'error fallback was tagged'
+
+    tag = client.get('/api/dashboard').headers['ETag']
+    assert client.get('/api/dashboard', headers={'If-None-Match': tag}).status_code == 304
+
+    # The write lands on another worker, whose counters this one never sees
+    this_worker = backend.versions
+    backend.versions = backend.VersionStore()
+    try:
+        response = client.post('/api/sync', json={'base_rev': 0, 'ops': [
+            {'op': 'add', 'date': '2024-02-01', 'task_name': 'elsewhere'}]})
+    finally:
+        backend.versions = this_worker
+    assert response.status_code == 200
+    response = client.get('/api/dashboard', headers={'If-None-Match': tag})
+    assert response.status_code == 200, 'stale 304 after the user\'s own write'
+
+
+# ---- analytics rollups ----
+
+class _Interleave:
+    # Client proxy that runs hook() once, just before the first write to one
+    # of `names` (tables or database functions): another request's write
+    # landing in the middle of a route
+    def __init__(self, client, names, hook):
+        self._client = client
+        self._names = names
+        self.hook = hook
+
+    def table(self, name):
+        return _InterleaveQuery(self._client.table(name), self, name in self._names, False)
+
+    def rpc(self, name, params=None):
+        return _InterleaveQuery(self._client.rpc(name, params or {}), self, name in self._names, True)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _InterleaveQuery:
+    def __init__(self, query, proxy, watched, write):
+        self._query = query
+        self._proxy = proxy
+        self._watched = watched
+        self._write = write
+
+    def execute(self):
+        if self._watched and self._write and self._proxy.hook:
+            hook, self._proxy.hook = self._proxy.hook, None
+            hook()
+        return self._query.execute()
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+
+        def call(*args, **kwargs):
+            write = self._write or name in ('insert', 'upsert', 'update', 'delete')
+            return _InterleaveQuery(attr(*args, **kwargs), self._proxy, self._watched, write)
+        return call
+
+
+def _rollups_match(db, user_id):
+    tasks = db.table('tasks').select('*').eq('user_id', user_id).limit(100000).execute().data
+    expected = {}
+    for row in tasks:
+        counts = expected.get(row['date'], (0, 0, 0))
+        expected[row['date']] = tuple(a + b for a, b in zip(counts, analytics.task_counts(row)))
+    stored = {r['date']: (r['tasks_total'], r['tasks_completed'], r['focus_time'])
+              for r in db.table('daily_stats').select('*').eq('user_id', user_id).limit(100000).execute().data}
+    stored = {day: counts for day, counts in stored.items() if any(counts)}
+    assert stored == expected, f'daily_stats {stored} != tasks {expected}'
+
+
+@check('rollups match the tasks when focus flushes interleave with task ops')
+def _rollups(db, world):
+    user_id = world.user_ids[2]
+    client = client_for(user_id)
+    day = date.today().isoformat()
+    healthy = backend.db
+    for names in (('tasks',), ('daily_stats', 'add_daily_stats')):
+        read, write, walk = (f'{name} {names[0]}' for name in ('read', 'write', 'walk'))
+        client.post('/api/tasks/batch', json={'ops': [{'op': 'add', 'date': day, 'task_name': name}
+                                                      for name in (read, write, walk)]})
+        steps = [
+            ('/api/tasks/batch', {'ops': [{'op': 'toggle', 'date': day, 'task_name': read, 'tasks_completed': 1},
+                                          {'op': 'add', 'date': day, 'task_name': f'cook {names[0]}'}]}),
+            ('/api/sync', {'base_rev': 10 ** 9, 'ops': [{'op': 'delete', 'date': day, 'task_name': write},
+                                                        {'op': 'add', 'date': day, 'task_name': f'swim {names[0]}',
+                                                         'tasks_completed': 1}]}),
+            ('/api/sync', {'base_rev': 10 ** 9, 'ops': [{'op': 'toggle', 'date': day, 'task_name': walk,
+                                                         'tasks_completed': 1}]})
+        ]
+        for path, body in steps:
+            assert client.post('/api/update-focus', json={'date': day, 'focus_time': 60}).status_code == 200
+            backend.db = proxy = _Interleave(healthy, names, backend.focus_buffer.flush)
+            try:
+                assert client.post(path, json=body).status_code == 200
+            finally:
+                backend.db = healthy
+            assert proxy.hook is None, f'{path} never wrote to {names}'
+            backend.focus_buffer.flush()
+            _rollups_match(db, user_id)
+
+
+# ---- todo sync ----
+
+def _synced_rev(client):
+    rev, more = 0, True
+    while more:
+        page = client.get(f'/api/sync?since={rev}').get_json()
+        rev, more = page['rev'], page['more']
+    return rev
+
+
+def _push(client, base_rev, *ops):
+    response = client.post('/api/sync', json={'base_rev': base_rev, 'ops': list(ops)})
+    assert response.status_code == 200, f'push answered {response.status_code}'
+    return response.get_json()
+
+
+@check('sync conflict rules')
+def _sync_rules(db, world):
+    old, new = {'rev': 3, 'tasks_completed': 0}, {'rev': 9, 'tasks_completed': 0}
+    a, b, c, d, e = (('2024-04-01', name) for name in 'abcde')
+    final = {a: ('upsert', 1), b: ('upsert', 1), c: ('upsert', 0), d: ('upsert', 1), e: ('delete', None)}
+    apply, conflicts = sync.check(final, {d}, {a: old, b: new, c: new}, {d, e}, 5)
+    # a: unchanged since base_rev; b: changed since; c: already as wanted;
+    # d: deleted elsewhere but re-added here; e: deleting what is gone
+    assert apply == {a: ('upsert', 1), d: ('upsert', 1)}, apply
+    assert conflicts == [{'date': b[0], 'task_name': b[1], 'reason': 'changed'}], conflicts
+    apply, conflicts = sync.check({d: ('upsert', 1)}, set(), {}, {d}, 5)
+    assert not apply and conflicts == [{'date': d[0], 'task_name': d[1], 'reason': 'deleted'}], conflicts
+
+
+@check('sync pages do not stop early when rows and tombstones share a page')
+def _sync_pages(db, world):
+    user_id = world.user_ids[11]
+    client = client_for(user_id)
+    day = '2024-04-03'
+    _push(client, 0, {'op': 'add', 'date': day, 'task_name': 'anchor'})
+    base = _synced_rev(client)   # > 0, so deletes come back as tombstones
+    names = [f'page {i}' for i in range(6)]
+    _push(client, base, *({'op': 'add', 'date': day, 'task_name': name} for name in names))
+    rev = _synced_rev(client)
+    _push(client, rev, *({'op': 'delete', 'date': day, 'task_name': name} for name in names[:3]))
+
+    # Three rows and three tombstones after `base`, read four at a time
+    seen, since, more = [], base, True
+    while more:
+        page = client.get(f'/api/sync?since={since}&limit=4').get_json()
+        seen += [(c['task_name'], bool(c.get('deleted'))) for c in page['changes']]
+        since, more = page['rev'], page['more']
+    expected = [(name, False) for name in names[3:]] + [(name, True) for name in names[:3]]
+    assert sorted(seen) == sorted(expected), f'paged {seen}'
+
+
+@check('sync pushes from two devices: conflicts only against the other device')
+def _sync_devices(db, world):
+    user_id = world.user_ids[10]
+    phone, laptop = client_for(user_id), client_for(user_id)
+    day = '2024-04-02'
+    base = _synced_rev(phone)
+    assert not _push(phone, base, {'op': 'add', 'date': day, 'task_name': 'shared'})['conflicts']
+    phone_rev = laptop_rev = _synced_rev(phone)
+
+    # Back-to-back pushes from one device, each on the rev the last returned
+    for completed in (1, 0, 1):
+        data = _push(phone, phone_rev, {'op': 'toggle', 'date': day, 'task_name': 'shared',
+                                        'tasks_completed': completed})
+        assert data['applied'] == 1 and not data['conflicts'], f'self-conflict: {data["conflicts"]}'
+        phone_rev = data['rev']
+
+    # The laptop has not seen those: the server's version wins
+    data = _push(laptop, laptop_rev, {'op': 'toggle', 'date': day, 'task_name': 'shared', 'tasks_completed': 0})
+    assert [c['reason'] for c in data['conflicts']] == ['changed'] and data['applied'] == 0, data['conflicts']
+    assert any(c['task_name'] == 'shared' and c['tasks_completed'] == 1 for c in data['changes'])
+
+    assert not _push(phone, phone_rev, {'op': 'delete', 'date': day, 'task_name': 'shared'})['conflicts']
+    data = _push(laptop, laptop_rev, {'op': 'toggle', 'date': day, 'task_name': 'shared', 'tasks_completed': 1})
+    assert [c['reason'] for c in data['conflicts']] == ['deleted'], data['conflicts']
+
+    # Pushes of different tasks racing from both devices all land
+    results = []
+
+    def push(client, name):
+        results.append(_push(client, laptop_rev, {'op': 'add', 'date': day, 'task_name': name}))
+    threads = [threading.Thread(target=push, args=(client, f'race {i}'))
+               for i, client in enumerate([phone, laptop] * 4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(results) == len(threads) and not any(r['conflicts'] for r in results)
+    names = {r['task_name'] for r in db.table('tasks').select('task_name').eq('user_id', user_id).eq('date', day)
+             .execute().data}
+    assert names == {f'race {i}' for i in range(len(threads))}, names
+    _rollups_match(db, user_id)
+
+
+# ---- dashboard ----
+
+@check('dashboard day totals match the analytics rollups')
+def _dashboard_totals(db, world):
+    user_id = world.user_ids[12]
+    client = client_for(user_id)
+    day = date.today().isoformat()
+    client.post('/api/tasks/batch', json={'ops': [
+        {'op': 'add', 'date': day, 'task_name': 'plan'},
+        {'op': 'add', 'date': day, 'task_name': 'review', 'tasks_completed': 1}]})
+    client.post('/api/update-focus', json={'date': day, 'focus_time': 120})
+    backend.focus_buffer.flush()
+    _rollups_match(db, user_id)
+
+    stored = db.table('daily_stats').select('*').eq('user_id', user_id).eq('date', day).execute().data[0]
+    expected = {'date': day, 'total': stored['tasks_total'], 'completed': stored['tasks_completed'],
+                'focus_time': stored['focus_time']}
+    for query in ('', f'?from={day}', f'?from={day}&limit=1', f'?from={day}&fields=task_name'):
+        summary = {d['date']: d for d in client.get(f'/api/dashboard{query}').get_json()['summary']}
+        assert summary.get(day) == expected, f'{query or "full"}: {summary.get(day)} != {expected}'
+
+
+# ---- imports ----
+
+@check('an import that breaks off halfway keeps and reports its written chunks')
+def _import_partial(db, world):
+    user_id = world.user_ids[8]
+    client = client_for(user_id)
+    tag = client.get('/api/dashboard').headers['ETag']
+    rows = [f'2024-03-0{day},import {day}' for day in range(1, 6)]
+    body = '\n'.join(['date,task_name'] + rows + ['2024-03-09,"' + 'x' * 200000 + '"', '2024-03-09,never']) + '\n'
+    response = client.post('/api/import/tasks?format=csv&chunk_size=2', data=body, content_type='text/csv')
+    assert response.status_code == 400, f'import answered {response.status_code}'
+    report = response.get_json()
+    stored = [r for r in db.table('tasks').select('task_name').eq('user_id', user_id).limit(100000).execute().data
+              if r['task_name'].startswith('import ')]
+    assert report.get('imported') == len(stored) == 4, f"reported {report.get('imported')}, stored {len(stored)}"
+    _rollups_match(db, user_id)
+    assert client.get('/api/dashboard', headers={'If-None-Match': tag}).status_code == 200, 'stale 304 after import'
+
+
+# ---- focus buffer ----
+
+class _LandsThenTimesOut:
+    # Client whose first increment_focus_time call commits and then reports
+    # a timeout, like a response lost on the way back
+    def __init__(self, client):
+        self._client = client
+        self.tripped = False
+
+    def rpc(self, name, params=None):
+        call = self._client.rpc(name, params)
+        if name != 'increment_focus_time' or self.tripped:
+            return call
+        self.tripped = True
+
+        class _Call:
+            def execute(self):
+                call.execute()
+                raise TimeoutError('response lost')
+        return _Call()
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+@check('a focus flush that times out after landing is counted once, and refreshes tags')
+def _focus_flush(db, world):
+    user_id = world.user_ids[3]
+    client = client_for(user_id)
+    day = date.today().isoformat()
+    buffer = backend.focus_buffer
+    before = sum(r['focus_time'] or 0 for r in db.table('tasks').select('focus_time').eq('user_id', user_id)
+                 .eq('task_name', analytics.FOCUS_TASK).eq('date', day).execute().data)
+    assert client.post('/api/update-focus', json={'date': day, 'focus_time': 90}).status_code == 200
+    tag = client.get('/api/dashboard').headers['ETag']
+
+    healthy, buffer._client = buffer._client, _LandsThenTimesOut(buffer._client)
+    try:
+        buffer.flush()
+        assert buffer._client.tripped, 'the flush did not fail'
+        buffer.flush()
+    finally:
+        buffer._client = healthy
+    after = sum(r['focus_time'] or 0 for r in db.table('tasks').select('focus_time').eq('user_id', user_id)
+                .eq('task_name', analytics.FOCUS_TASK).eq('date', day).execute().data)
+    assert after - before == 90, f'focus time grew by {after - before}, not 90'
+    _rollups_match(db, user_id)
+    assert client.get('/api/dashboard', headers={'If-None-Match': tag}).status_code == 200, 'stale 304 after a flush'
+
+
+# ---- storage outages ----
+
+@check('focus updates are buffered while the storage circuit is open')
+def _circuit_open(db, world):
+    user_id = world.user_ids[5]
+    client = client_for(user_id)
+    day = date.today().isoformat()
+    breaker = backend.breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    try:
+        assert breaker.is_open()
+        response = client.post('/api/update-focus', json={'date': day, 'focus_time': 30})
+        assert response.status_code == 200, f'focus update answered {response.status_code}'
+        response = client.post('/api/sync', json={'base_rev': 0, 'ops': []})
+        assert response.status_code == 503, f'write answered {response.status_code} with the circuit open'
+    finally:
+        breaker.record_success()
+    assert backend.focus_buffer.pending(user_id, day, day) == {day: 30}
+    backend.focus_buffer.flush()
+    _rollups_match(db, user_id)
+
+
+@check('cache stats are limited to admins')
+def _cache_stats(db, world):
+    admin, user_id = world.user_ids[6], world.user_ids[7]
+    backend.ADMIN_USER_IDS.add(admin)
+    try:
+        assert client_for(user_id).get('/api/cache-stats').status_code == 403
+        assert client_for(admin).get('/api/cache-stats').status_code == 200
+    finally:
+        backend.ADMIN_USER_IDS.discard(admin)
+
+
+# ---- user directory ----
+
+class _Slow:
+    # Client whose queries take `delay` seconds
+    def __init__(self, client, delay):
+        self._client = client
+        self.delay = delay
+
+    def table(self, name):
+        return _SlowQuery(self._client.table(name), self.delay)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _SlowQuery:
+    def __init__(self, query, delay):
+        self._query = query
+        self._delay = delay
+
+    def execute(self):
+        time.sleep(self._delay)
+        return self._query.execute()
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+
+        def call(*args, **kwargs):
+            return _SlowQuery(attr(*args, **kwargs), self._delay)
+        return call
+
+
+@check('user directory lookups do not wait for a refresh, and survive an outage')
+def _directory(db, world):
+    directory = backend.user_directory
+    user_id = world.user_ids[4]
+    directory.ensure_fresh(backend.db)
+    interval, directory.refresh_interval = directory.refresh_interval, 0
+    try:
+        loader = threading.Thread(target=directory.ensure_fresh, args=(_Slow(backend.db, 0.2),))
+        loader.start()
+        time.sleep(0.05)
+        started = time.perf_counter()
+        assert directory.get(user_id)['id'] == user_id
+        directory.ensure_fresh(backend.db)   # a second refresh does not queue up behind the first
+        waited = time.perf_counter() - started
+        loader.join()
+        assert waited < 0.1, f'lookup waited {waited * 1000:.0f} ms for the refresh'
+    finally:
+        directory.refresh_interval = interval
+
+    records = directory.get_many([user_id, 10 ** 9], _Broken())
+    assert list(records) == [user_id], 'get_many failed during an outage'
+
+
+@check('garden changes from another process reach the directory and the tags')
+def _garden_elsewhere(db, world):
+    directory = backend.user_directory
+    user_id = world.user_ids[9]
+    client = client_for(user_id)
+    directory.ensure_fresh(backend.db)
+    tag = client.get('/api/garden-state').headers['ETag']
+    blocks = directory.block_count(user_id) + 7
+
+    # What the evaluate-gardens job does from its own process
+    db.table('garden_state').update({'block_count': blocks, 'is_dead': True}).eq('user_id', user_id).execute()
+    interval, directory.refresh_interval = directory.refresh_interval, 0
+    try:
+        assert client.get('/api/friends').status_code == 200
+    finally:
+        directory.refresh_interval = interval
+    assert directory.block_count(user_id) == blocks, 'directory missed the change'
+    response = client.get('/api/garden-state', headers={'If-None-Match': tag})
+    assert response.status_code == 200, 'stale 304 after the garden changed elsewhere'
+    assert response.get_json()['block_count'] == blocks
+
+
+@check('the garden job does not overwrite a replant made while it runs')
+def _garden_job_race(db, world):
+    replanted, idle = world.user_ids[13], world.user_ids[14]
+    stale = (date.today() - timedelta(days=10)).isoformat()
+    for user_id in (replanted, idle):
+        db.table('garden_state').update({'block_count': 5, 'is_dead': False, 'last_activity': stale,
+                                         'last_block_award_date': stale}).eq('user_id', user_id).execute()
+
+    def replant():
+        assert client_for(replanted).post('/api/replant-garden').status_code == 200
+    proxy = _Interleave(backend.db, ('garden_state', 'update_gardens'), replant)
+    result = garden_jobs.evaluate_gardens(proxy, *garden_jobs.default_window())
+    assert proxy.hook is None, 'the job never wrote'
+
+    gardens = {g['user_id']: g for g in db.table('garden_state').select('*').in_('user_id', [replanted, idle])
+               .execute().data}
+    assert gardens[idle]['is_dead'], 'the idle garden did not die'
+    assert not gardens[replanted]['is_dead'] and gardens[replanted]['block_count'] == 0, 'replant was reverted'
+    assert result['skipped'] >= 1 and replanted not in {c['user_id'] for c in result['changes']}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run consistency checks against an in-memory database.')
+    parser.add_argument('--only', help='run only checks whose name contains this text')
+    args = parser.parse_args(argv)
+
+    db = FakeSupabase()
+    world = seed(db, users=200, seed=1)
+    backend.db = backend.connect(db)
+
+    failed = 0
+    for name, f in CHECKS.items():
+        if args.only and args.only not in name:
+            continue
+        started = time.perf_counter()
+        try:
+            f(db, world)
+        except Exception:
+            failed += 1
+            print(f"FAIL  {name}", file=sys.stderr)
+            traceback.print_exc()
+            continue
+        print(f"ok    {name} ({(time.perf_counter() - started) * 1000:.0f} ms)")
+    if failed:
+        print(f"{failed} check(s) failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
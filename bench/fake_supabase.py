@@ -0,0 +1,363 @@
+import itertools
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+
+# In-memory stand-in for the supabase-py client, for benchmarking backend.py
+# without a Supabase project. It implements the query builder chain the app
+# uses (table().select/insert/upsert/update/delete, eq/neq/gt/gte/lt/lte/in_,
+# order/limit/range, execute) plus rpc('increment_focus_time'),
+# rpc('add_daily_stats') and rpc('update_gardens'), and counts
+# every execute() as one database round trip. Task writes take the user's next
+# revision and deletes leave tombstones, as the sync triggers do.
+#
+# Like PostgREST it caps responses at max_rows, rejects duplicates on the
+# tables' unique keys (SUPABASE_SETUP.md) and returns copies of rows.
+
+UNIQUE_KEYS = {
+    'users': [('username',)],
+    'tasks': [('user_id', 'date', 'task_name')],
+    'garden_state': [('user_id',)],
+    'friends': [('user_id', 'friend_id')],
+    'user_profiles': [('user_id',)],
+    'group_members': [('group_id', 'user_id')],
+    'daily_stats': [('user_id', 'date')],
+    'sync_state': [('user_id',)],
+    'task_tombstones': [('task_id',)],
+    'focus_flushes': [('token',)]
+}
+
+# Tables with an updated_at column maintained by a trigger
+TIMESTAMPED = {'garden_state', 'user_profiles'}
+# Columns whose change gives a task a new revision
+REVISIONED = ('date', 'task_name', 'tasks_completed', 'focus_time')
+
+DEFAULTS = {
+    'tasks': {'task_name': 'Unnamed Task', 'tasks_completed': 0, 'focus_time': 0},
+    'garden_state': {'block_count': 0, 'is_dead': False, 'last_activity': None, 'last_block_award_date': None},
+    'friends': {'status': 'pending'},
+    'user_profiles': {'bio': '', 'pfp_url': ''},
+    'daily_stats': {'tasks_total': 0, 'tasks_completed': 0, 'focus_time': 0},
+    'sync_state': {'rev': 0, 'pruned_rev': 0}
+}
+
+
+class FakeAPIError(Exception):
+    pass
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+        self.count = len(data)
+
+
+class _Table:
+    def __init__(self, name, tables=None):
+        self.name = name
+        self.tables = tables
+        self.rows = {}     # id -> row, in id order
+        self.indexes = {}  # column -> value -> set of ids, built on first use
+        self.ids = itertools.count(1)
+
+    def index(self, column):
+        idx = self.indexes.get(column)
+        if idx is None:
+            idx = defaultdict(set)
+            for row_id, row in self.rows.items():
+                idx[row.get(column)].add(row_id)
+            self.indexes[column] = idx
+        return idx
+
+    def add(self, row):
+        row = dict(DEFAULTS.get(self.name, {}), **row)
+        if row.get('id') is None:
+            row['id'] = next(self.ids)
+        row.setdefault('created_at', datetime.now().isoformat(timespec='seconds'))
+        if self.name in TIMESTAMPED:
+            row.setdefault('updated_at', datetime.now().isoformat(timespec='microseconds'))
+        if self.name == 'tasks':
+            row['rev'] = self._next_rev(row['user_id'])
+        self.rows[row['id']] = row
+        for column, idx in self.indexes.items():
+            idx[row.get(column)].add(row['id'])
+        return row
+
+    def remove(self, row):
+        del self.rows[row['id']]
+        for column, idx in self.indexes.items():
+            idx[row.get(column)].discard(row['id'])
+        if self.name == 'tasks':
+            self.tables['task_tombstones'].add({
+                'id': row['id'], 'task_id': row['id'], 'user_id': row['user_id'], 'rev': self._next_rev(row['user_id']),
+                'date': row['date'], 'task_name': row.get('task_name'),
+                'deleted_at': datetime.now().isoformat(timespec='seconds')
+            })
+
+    def change(self, row, values):
+        if self.name in TIMESTAMPED:
+            values = dict(values, updated_at=datetime.now().isoformat(timespec='microseconds'))
+        if self.name == 'tasks' and any(c in values and values[c] != row.get(c) for c in REVISIONED):
+            values = dict(values, rev=self._next_rev(row['user_id']))
+        for column, idx in self.indexes.items():
+            if column in values:
+                idx[row.get(column)].discard(row['id'])
+                idx[values[column]].add(row['id'])
+        row.update(values)
+
+    def _next_rev(self, user_id):
+        state = self.tables['sync_state']
+        existing = state.find(('user_id',), {'user_id': user_id})
+        if existing is None:
+            return state.add({'user_id': user_id, 'rev': 1})['rev']
+        state.change(existing, {'rev': existing['rev'] + 1})
+        return existing['rev']
+
+    def find(self, key, row):
+        # Existing row with the same values for the key columns, if any
+        candidates = self.index(key[0]).get(row.get(key[0]), ())
+        for row_id in candidates:
+            existing = self.rows[row_id]
+            if all(existing.get(c) == row.get(c) for c in key):
+                return existing
+        return None
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._op = 'select'
+        self._columns = None
+        self._payload = None
+        self._on_conflict = None
+        self._ignore_duplicates = False
+        self._eq = []       # (column, value), served from indexes
+        self._in = []       # (column, values), served from indexes
+        self._filters = []  # predicates applied after the indexed lookup
+        self._order = []
+        self._limit = None
+        self._offset = 0
+
+    def select(self, columns='*', **kwargs):
+        self._op = 'select'
+        columns = columns.strip()
+        self._columns = None if columns == '*' else [c.strip() for c in columns.split(',')]
+        return self
+
+    def insert(self, payload, **kwargs):
+        self._op = 'insert'
+        self._payload = payload
+        return self
+
+    def upsert(self, payload, on_conflict='id', ignore_duplicates=False, **kwargs):
+        self._op = 'upsert'
+        self._payload = payload
+        self._on_conflict = tuple(c.strip() for c in on_conflict.split(','))
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload, **kwargs):
+        self._op = 'update'
+        self._payload = payload
+        return self
+
+    def delete(self, **kwargs):
+        self._op = 'delete'
+        return self
+
+    def eq(self, column, value):
+        self._eq.append((column, value))
+        return self
+
+    def neq(self, column, value):
+        self._filters.append(lambda r: r.get(column) != value)
+        return self
+
+    def gt(self, column, value):
+        self._filters.append(lambda r: r.get(column) is not None and r.get(column) > value)
+        return self
+
+    def gte(self, column, value):
+        self._filters.append(lambda r: r.get(column) is not None and r.get(column) >= value)
+        return self
+
+    def lt(self, column, value):
+        self._filters.append(lambda r: r.get(column) is not None and r.get(column) < value)
+        return self
+
+    def lte(self, column, value):
+        self._filters.append(lambda r: r.get(column) is not None and r.get(column) <= value)
+        return self
+
+    def in_(self, column, values):
+        self._in.append((column, set(values)))
+        return self
+
+    def order(self, column, desc=False, **kwargs):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, count, **kwargs):
+        self._limit = count
+        return self
+
+    def range(self, start, end, **kwargs):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def _matches(self, table):
+        if self._eq or self._in:
+            # Narrow by the most selective equality or IN filter
+            sets = [table.index(column).get(value, set()) for column, value in self._eq]
+            for column, values in self._in:
+                idx = table.index(column)
+                sets.append(set().union(*(idx.get(v, ()) for v in values)))
+            ids = sorted(min(sets, key=len))
+            rows = [table.rows[i] for i in ids]
+            rows = [r for r in rows if all(r.get(c) == v for c, v in self._eq)
+                    and all(r.get(c) in vs for c, vs in self._in)]
+        else:
+            rows = list(table.rows.values())
+        if not self._filters:
+            return rows
+        return [r for r in rows if all(f(r) for f in self._filters)]
+
+    def execute(self):
+        client = self._client
+        with client.lock:
+            client.count(self._table, self._op)
+            table = client.tables[self._table]
+            if self._op in ('insert', 'upsert'):
+                return FakeResult(self._write(table))
+            rows = self._matches(table)
+            if self._op == 'update':
+                for row in rows:
+                    table.change(row, self._payload)
+                return FakeResult([dict(r) for r in rows])
+            if self._op == 'delete':
+                for row in rows:
+                    table.remove(row)
+                return FakeResult([dict(r) for r in rows])
+
+            # Rows are stored in id order; only sort when asked for anything else
+            for column, desc in reversed(self._order):
+                if column == 'id' and not desc and len(self._order) == 1:
+                    continue
+                rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+            limit = client.max_rows if self._limit is None else min(self._limit, client.max_rows)
+            rows = rows[self._offset:self._offset + limit]
+            if self._columns:
+                rows = [{c: r.get(c) for c in self._columns} for r in rows]
+            return FakeResult([dict(r) for r in rows])
+
+    def _write(self, table):
+        payload = self._payload if isinstance(self._payload, list) else [self._payload]
+        keys = UNIQUE_KEYS.get(self._table, [])
+        out = []
+        for values in payload:
+            if self._op == 'upsert':
+                existing = table.find(self._on_conflict, values)
+                if existing is not None:
+                    if not self._ignore_duplicates:
+                        table.change(existing, {c: v for c, v in values.items() if c not in self._on_conflict})
+                        out.append(dict(existing))
+                    continue
+            for key in keys:
+                if table.find(key, values) is not None:
+                    raise FakeAPIError(f'duplicate key value violates unique constraint on {self._table}{key}')
+            out.append(dict(table.add(values)))
+        return out
+
+
+class FakeRPC:
+    def __init__(self, client, name, params):
+        self._client = client
+        self._name = name
+        self._params = params
+
+    def execute(self):
+        client = self._client
+        with client.lock:
+            client.count('rpc:' + self._name, 'rpc')
+            params = self._params
+            if self._name == 'increment_focus_time':
+                token = params.get('p_token')
+                if token is not None:
+                    flushes = client.tables['focus_flushes']
+                    if flushes.find(('token',), {'token': token}) is not None:
+                        return FakeResult([])   # applied by an earlier attempt
+                    flushes.add({'token': token})
+                tasks = client.tables['tasks']
+                for user_id, day, seconds in zip(params['p_user_ids'], params['p_dates'], params['p_seconds']):
+                    values = {'user_id': user_id, 'date': day, 'task_name': 'Focus Session'}
+                    existing = tasks.find(('user_id', 'date', 'task_name'), values)
+                    if existing is None:
+                        tasks.add(dict(values, tasks_completed=0, focus_time=seconds))
+                    else:
+                        tasks.change(existing, {'focus_time': (existing.get('focus_time') or 0) + seconds})
+                    self._add_daily_stats(user_id, day, 0, 0, seconds)
+            elif self._name == 'add_daily_stats':
+                for row in zip(params['p_user_ids'], params['p_dates'], params['p_total'],
+                               params['p_completed'], params['p_focus']):
+                    self._add_daily_stats(*row)
+            elif self._name == 'update_gardens':
+                gardens, written = client.tables['garden_state'], []
+                for user_id, seen, blocks, dead, activity, award in zip(
+                        params['p_user_ids'], params['p_seen'], params['p_block_counts'], params['p_is_dead'],
+                        params['p_last_activity'], params['p_award_dates']):
+                    existing = gardens.find(('user_id',), {'user_id': user_id})
+                    if existing is None or existing.get('updated_at') != seen:
+                        continue
+                    gardens.change(existing, {'block_count': blocks, 'is_dead': dead, 'last_activity': activity,
+                                              'last_block_award_date': award})
+                    written.append({'user_id': user_id})
+                return FakeResult(written)
+            else:
+                raise FakeAPIError(f'Unknown function: {self._name}')
+            return FakeResult([])
+
+    def _add_daily_stats(self, user_id, day, total, completed, focus):
+        table = self._client.tables['daily_stats']
+        existing = table.find(('user_id', 'date'), {'user_id': user_id, 'date': day})
+        if existing is None:
+            table.add({'user_id': user_id, 'date': day, 'tasks_total': total,
+                       'tasks_completed': completed, 'focus_time': focus})
+        else:
+            table.change(existing, {
+                'tasks_total': existing['tasks_total'] + total,
+                'tasks_completed': existing['tasks_completed'] + completed,
+                'focus_time': existing['focus_time'] + focus
+            })
+
+
+class FakeSupabase:
+    def __init__(self, max_rows=1000):
+        self.max_rows = max_rows
+        self.lock = threading.RLock()
+        self.tables = _Tables()
+        self.round_trips = 0
+        self.by_table = Counter()
+
+    def count(self, table, op):
+        self.round_trips += 1
+        self.by_table[(table, op)] += 1
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRPC(self, name, params or {})
+
+    def load(self, name, rows):
+        # Bulk seed without counting round trips; returns the stored rows
+        with self.lock:
+            table = self.tables[name]
+            return [table.add(row) for row in rows]
+
+
+class _Tables(dict):
+    def __missing__(self, name):
+        table = self[name] = _Table(name, self)
+        return table
@@ -0,0 +1,436 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+# Offline benchmark for backend.py: seeds an in-memory Supabase stand-in,
+# drives every /api/* route through Flask's test client and reports latency
+# percentiles and database round trips per request. Exits non-zero when an
+# endpoint needs more round trips than its budget in bench/budgets.json, so
+# N+1 queries show up as a failure at the larger scales.
+#
+#   python -m bench.run --scale 10k
+#   python -m bench.run --scale 1k --record    # rewrite the budgets
+
+# Keep the process-wide caches from expiring or flushing mid-run; the
+# storage backend is swapped for the fake below, before any request, so the
+# SQLite file is never opened.
+os.environ.setdefault('STORAGE_BACKEND', 'sqlite')
+os.environ.setdefault('SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'teammate-bench.db'))
+for name in ('USER_DIRECTORY_REFRESH', 'USER_DIRECTORY_MAX_AGE', 'FRIEND_INDEX_MAX_AGE', 'USERNAME_INDEX_MAX_AGE',
+             'FOCUS_FLUSH_INTERVAL', 'GROUP_ACL_TTL'):
+    os.environ.setdefault(name, '86400')
+os.environ.setdefault('SLOW_REQUEST_MS', '0')
+
+import backend  # noqa: E402
+from bench.fake_supabase import FakeSupabase  # noqa: E402
+from bench.seed import PASSWORD, parse_scale, seed  # noqa: E402
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), 'budgets.json')
+
+# user_id None sends the request without a session
+Call = namedtuple('Call', 'user_id method path json')
+
+SCENARIOS = {}
+
+
+def scenario(method, rule):
+    def decorator(f):
+        SCENARIOS[f'{method} {rule}'] = f
+        return f
+    return decorator
+
+
+def _viewers(world, rng, count=50):
+    # Users with friends and groups, so every read route has something to return
+    ids = [u for u in world.user_ids if world.friends[u] and world.groups_of[u]]
+    return rng.sample(ids, min(count, len(ids)))
+
+
+def _cycle(world, rng):
+    viewers = _viewers(world, rng)
+    i = 0
+    while True:
+        yield viewers[i % len(viewers)]
+        i += 1
+
+
+# ---- auth ----
+
+@scenario('POST', '/api/signup')
+def _signup(world, rng):
+    i = 0
+    while True:
+        i += 1
+        yield Call(None, 'POST', '/api/signup', {'username': f'bench{i:06d}', 'password': PASSWORD})
+
+
+@scenario('POST', '/api/login')
+def _login(world, rng):
+    for user_id in _cycle(world, rng):
+        yield Call(None, 'POST', '/api/login', {'username': world.usernames[user_id], 'password': PASSWORD})
+
+
+@scenario('POST', '/api/logout')
+def _logout(world, rng):
+    for user_id in _cycle(world, rng):
+        yield Call(user_id, 'POST', '/api/logout', None)
+
+
+def _get(path):
+    def calls(world, rng):
+        for user_id in _cycle(world, rng):
+            yield Call(user_id, 'GET', path, None)
+    return calls
+
+
+for _rule in ('/api/user', '/api/dashboard', '/api/garden', '/api/groups', '/api/garden-state', '/api/friends',
+              '/api/friend-requests', '/api/my-groups', '/api/leaderboard', '/api/leaderboard/me',
+              '/api/bootstrap', '/api/cache-stats', '/api/analytics', '/api/export/tasks', '/api/health'):
+    scenario('GET', _rule)(_get(_rule))
+
+
+# ---- tasks and garden ----
+
+@scenario('POST', '/api/save')
+def _save(world, rng):
+    today = str(date.today())
+    for user_id in _cycle(world, rng):
+        yield Call(user_id, 'POST', '/api/save', {'table': 'tasks', 'data': {
+            'date': today, 'task_name': rng.choice(['Read', 'Exercise', 'Bench']), 'tasks_completed': rng.randint(0, 1)
+        }})
+
+
+@scenario('DELETE', '/api/delete-task')
+def _delete_task(world, rng):
+    today = str(date.today())
+    for user_id in _cycle(world, rng):
+        yield Call(user_id, 'DELETE', '/api/delete-task', {'date': today, 'task_name': 'Bench'})
+
+
+@scenario('POST', '/api/tasks/batch')
+def _batch(world, rng):
+    days = [str(date.today() - timedelta(days=d)) for d in range(3)]
+    for user_id in _cycle(world, rng):
+        ops = [{'op': rng.choice(['add', 'toggle', 'delete']), 'date': rng.choice(days),
+                'task_name': f'Batch {rng.randint(0, 9)}', 'tasks_completed': rng.randint(0, 1)} for _ in range(20)]
+        yield Call(user_id, 'POST', '/api/tasks/batch', {'ops': ops})
+
+
+@scenario('GET', '/api/sync')
+def _sync_pull(world, rng):
+    for user_id in _cycle(world, rng):
+        yield Call(user_id, 'GET', f'/api/sync?since={rng.choice([0, 1, 5])}', None)
+
+
+@scenario('POST', '/api/sync')
+def _sync_push(world, rng):
+    days = [str(date.today() - timedelta(days=d)) for d in range(3)]
+    for user_id in _cycle(world, rng):
+        ops = [{'op': rng.choice(['add', 'toggle', 'delete']), 'date': rng.choice(days),
+                'task_name': f'Sync {rng.randint(0, 9)}', 'tasks_completed': rng.randint(0, 1)} for _ in range(20)]
+        yield Call(user_id, 'POST', '/api/sync', {'base_rev': rng.choice([0, 5, 10 ** 6]), 'ops': ops})
+
+
+@scenario('POST', '/api/import/tasks')
+def _import_tasks(world, rng):
+    for user_id in _cycle(world, rng):
+        rows = [f'{date.today() - timedelta(days=rng.randint(0, 365))},Imported {rng.randint(0, 9)},{rng.randint(0, 1)}'
+                for _ in range(50)]
+        yield Call(user_id, 'POST', '/api/import/tasks', 'date,task_name,tasks_completed\n' + '\n'.join(rows) + '\n')
+
+
+@scenario('POST', '/api/update-focus')
+def _update_focus(world, rng):
+    for user_id in _cycle(world, rng):
+        yield Call(user_id, 'POST', '/api/update-focus', {'date': str(date.today()), 'focus_time': 60})
+
+
+@scenario('POST', '/api/update-garden')
+def _update_garden(world, rng):
+    for user_id in _cycle(world, rng):
+        yield Call(user_id, 'POST', '/api/update-garden', None)
+
+
+@scenario('POST', '/api/replant-garden')
+def _replant_garden(world, rng):
+    for user_id in _cycle(world, rng):
+        yield Call(user_id, 'POST', '/api/replant-garden', None)
+
+
+@scenario('GET', '/api/user-garden/<int:user_id>')
+def _user_garden(world, rng):
+    for user_id in _cycle(world, rng):
+        yield Call(user_id, 'GET', f'/api/user-garden/{rng.choice(world.user_ids)}', None)
+
+
+# ---- friends ----
+
+@scenario('POST', '/api/add-friend')
+def _add_friend(world, rng):
+    for user_id in _cycle(world, rng):
+        other = rng.choice(world.user_ids)
+        if other == user_id or (user_id, other) in world.related or (other, user_id) in world.related:
+            continue
+        world.related.add((user_id, other))
+        yield Call(user_id, 'POST', '/api/add-friend', {'username': world.usernames[other]})
+
+
+@scenario('GET', '/api/users/search')
+def _search(world, rng):
+    for user_id in _cycle(world, rng):
+        prefix = world.usernames[rng.choice(world.user_ids)][:rng.randint(5, 8)]
+        yield Call(user_id, 'GET', f'/api/users/search?q={prefix}', None)
+
+
+@scenario('POST', '/api/accept-friend-request/<int:request_id>')
+def _accept(world, rng):
+    for request_id, _, to_user in world.pending[0::2]:
+        yield Call(to_user, 'POST', f'/api/accept-friend-request/{request_id}', None)
+
+
+@scenario('POST', '/api/decline-friend-request/<int:request_id>')
+def _decline(world, rng):
+    for request_id, _, to_user in world.pending[1::2]:
+        yield Call(to_user, 'POST', f'/api/decline-friend-request/{request_id}', None)
+
+
+@scenario('POST', '/api/remove-friend/<int:friend_id>')
+def _remove_friend(world, rng):
+    # From the end of the list, so the viewers' friendships used above survive longest
+    for user_id, friend_id in reversed(world.accepted):
+        yield Call(user_id, 'POST', f'/api/remove-friend/{friend_id}', None)
+
+
+def _friend_get(path):
+    def calls(world, rng):
+        for user_id in _cycle(world, rng):
+            if world.friends[user_id]:
+                yield Call(user_id, 'GET', path.format(rng.choice(sorted(world.friends[user_id]))), None)
+    return calls
+
+
+scenario('GET', '/api/friend/<int:friend_id>/garden')(_friend_get('/api/friend/{}/garden'))
+scenario('GET', '/api/profile/<int:user_id>')(_friend_get('/api/profile/{}'))
+
+
+@scenario('POST', '/api/profile/update')
+def _update_profile(world, rng):
+    for user_id in _cycle(world, rng):
+        yield Call(user_id, 'POST', '/api/profile/update', {'bio': 'Benchmarking', 'pfp_url': ''})
+
+
+# ---- groups ----
+
+@scenario('POST', '/api/create-group')
+def _create_group(world, rng):
+    for user_id in _cycle(world, rng):
+        yield Call(user_id, 'POST', '/api/create-group', {'group_name': 'Bench group'})
+
+
+def _group_of(world, rng, user_id):
+    return rng.choice(world.groups_of[user_id])
+
+
+def _member_get(path):
+    def calls(world, rng):
+        for user_id in _cycle(world, rng):
+            yield Call(user_id, 'GET', path.format(_group_of(world, rng, user_id)), None)
+    return calls
+
+
+scenario('GET', '/api/group/<int:group_id>/members')(_member_get('/api/group/{}/members'))
+scenario('GET', '/api/group/<int:group_id>/messages')(_member_get('/api/group/{}/messages'))
+scenario('GET', '/api/group/<int:group_id>/stream')(_member_get('/api/group/{}/stream'))
+scenario('GET', '/api/export/group/<int:group_id>/messages')(_member_get('/api/export/group/{}/messages'))
+
+
+@scenario('POST', '/api/group/<int:group_id>/send-message')
+def _send_message(world, rng):
+    for user_id in _cycle(world, rng):
+        yield Call(user_id, 'POST', f'/api/group/{_group_of(world, rng, user_id)}/send-message', {'message': 'bench'})
+
+
+# The destructive group routes work on disjoint thirds of the groups the
+# viewers are not in, so the read scenarios keep their memberships
+def _third(world, rng, n):
+    viewers = set(_viewers(world, rng))
+    groups = [g for g in world.groups if g[1] not in viewers and viewers.isdisjoint(g[2])]
+    size = len(groups) // 3
+    return groups[n * size:(n + 1) * size]
+
+
+@scenario('POST', '/api/group/<int:group_id>/invite')
+def _invite(world, rng):
+    for group_id, owner, members in _third(world, rng, 0):
+        for _ in range(3):
+            other = rng.choice(world.user_ids)
+            if other != owner and other not in members:
+                members.append(other)
+                yield Call(owner, 'POST', f'/api/group/{group_id}/invite', {'friend_id': other})
+
+
+@scenario('POST', '/api/group/<int:group_id>/remove-member')
+def _remove_member(world, rng):
+    for group_id, owner, members in _third(world, rng, 1):
+        for member_id in list(members):
+            yield Call(owner, 'POST', f'/api/group/{group_id}/remove-member', {'member_id': member_id})
+
+
+@scenario('POST', '/api/group/<int:group_id>/delete')
+def _delete_group(world, rng):
+    for group_id, owner, _ in _third(world, rng, 2):
+        yield Call(owner, 'POST', f'/api/group/{group_id}/delete', None)
+
+
+# ---- harness ----
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    idx = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(idx, len(sorted_values) - 1)]
+
+
+def api_endpoints(app):
+    endpoints = set()
+    for rule in app.url_map.iter_rules():
+        if rule.rule.startswith('/api/'):
+            for method in rule.methods - {'HEAD', 'OPTIONS'}:
+                endpoints.add(f'{method} {rule.rule}')
+    return endpoints
+
+
+def send(client, call):
+    with client.session_transaction() as sess:
+        sess.clear()
+        if call.user_id is not None:
+            sess['user_id'] = call.user_id
+            sess['username'] = f'user{call.user_id}'
+    start = time.perf_counter()
+    if call.path.endswith('/stream'):
+        # Open the event stream and read its first event only
+        response = client.open(call.path, method=call.method, buffered=False)
+        next(iter(response.response), None)
+        response.close()
+    elif isinstance(call.json, str):
+        # Raw file uploads (imports)
+        response = client.open(call.path, method=call.method, data=call.json, content_type='text/csv')
+        response.get_data()
+    else:
+        response = client.open(call.path, method=call.method, json=call.json)
+        # Streamed bodies (exports) only query the database while being read
+        response.get_data()
+    return response.status_code, time.perf_counter() - start
+
+
+def run_endpoint(client, db, calls, iterations):
+    latencies = []
+    trips = []
+    errors = 0
+    for call in calls:
+        if len(latencies) >= iterations:
+            break
+        before = db.round_trips
+        status, elapsed = send(client, call)
+        trips.append(db.round_trips - before)
+        latencies.append(elapsed * 1000)
+        if status >= 400:
+            errors += 1
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'trips_mean': sum(trips) / len(trips) if trips else 0.0,
+        'trips_max': max(trips) if trips else 0
+    }
+
+
+def load_budgets(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the /api routes against an in-memory database.')
+    parser.add_argument('--scale', default='1k', help='1k, 10k, 100k or a user count (default 1k)')
+    parser.add_argument('--iterations', type=int, default=100, help='requests per endpoint (default 100)')
+    parser.add_argument('--only', help='run only endpoints whose "METHOD /rule" contains this text')
+    parser.add_argument('--budgets', default=BUDGETS_PATH, help='round-trip budgets file')
+    parser.add_argument('--record', action='store_true', help='write the observed maxima as the new budgets')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    app = backend.app
+    missing = api_endpoints(app) - set(SCENARIOS)
+    if missing:
+        print(f"No benchmark scenario for: {', '.join(sorted(missing))}", file=sys.stderr)
+        return 2
+
+    users = parse_scale(args.scale)
+    db = FakeSupabase()
+    started = time.perf_counter()
+    world = seed(db, users=users, seed=args.seed)
+    print(f"Seeded {users} users in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    backend.db = backend.connect(db)
+    backend.ADMIN_USER_IDS.update(world.user_ids)   # every simulated user may read /api/cache-stats
+
+    client = app.test_client()
+    # Build the in-memory indexes once; their cost is not per request
+    viewer = world.user_ids[0]
+    for path in ('/api/leaderboard', '/api/friends', '/api/users/search?q=user'):
+        send(client, Call(viewer, 'GET', path, None))
+
+    budgets = load_budgets(args.budgets)
+    results = {}
+    for endpoint in sorted(SCENARIOS):
+        if args.only and args.only not in endpoint:
+            continue
+        rng = random.Random(args.seed)
+        results[endpoint] = run_endpoint(client, db, SCENARIOS[endpoint](world, rng), args.iterations)
+
+    failures = []
+    for endpoint, result in results.items():
+        budget = budgets.get(endpoint)
+        result['budget'] = budget
+        if budget is not None and result['trips_max'] > budget:
+            failures.append(endpoint)
+
+    if args.json:
+        print(json.dumps({'scale': users, 'results': results}, indent=2))
+    else:
+        print(f"{'endpoint':<55} {'n':>4} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'trips':>6} {'max':>4} {'budget':>6}")
+        for endpoint, r in results.items():
+            budget = '-' if r['budget'] is None else r['budget']
+            flag = '  OVER' if endpoint in failures else ''
+            print(f"{endpoint:<55} {r['requests']:>4} {r['errors']:>4} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                  f"{r['p99_ms']:>8.2f} {r['trips_mean']:>6.2f} {r['trips_max']:>4} {budget:>6}{flag}")
+
+    if args.record:
+        budgets.update({endpoint: r['trips_max'] for endpoint, r in results.items()})
+        with open(args.budgets, 'w') as f:
+            json.dump(dict(sorted(budgets.items())), f, indent=2)
+            f.write('\n')
+        print(f"Recorded budgets for {len(results)} endpoints in {args.budgets}", file=sys.stderr)
+        return 0
+
+    if failures:
+        print(f"Over query budget: {', '.join(failures)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
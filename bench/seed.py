@@ -0,0 +1,142 @@
+import random
+from datetime import date, timedelta
+
+import analytics
+
+# Synthetic TeamMate data for the benchmark. Every user has password
+# 'password'; the generator records who is friends with whom, who owns and
+# belongs to which group, and which friend requests are pending, so the
+# benchmark scenarios can pick valid targets without querying.
+
+SCALES = {
+    '1k': 1000,
+    '10k': 10000,
+    '100k': 100000
+}
+
+PASSWORD = 'password'
+TASK_NAMES = ['Read', 'Exercise', 'Code review', 'Write', 'Plan week', 'Study', 'Email']
+WORDS = ['on', 'it', 'done', 'nice', 'who', 'is', 'free', 'later', 'today', 'standup', 'ship', 'review']
+
+
+class World:
+    def __init__(self):
+        self.user_ids = []
+        self.usernames = {}        # user_id -> username
+        self.friends = {}          # user_id -> set of accepted friend ids
+        self.related = set()       # (a, b) for every friends row, either status
+        self.accepted = []         # (user_id, friend_id) rows with status accepted
+        self.pending = []          # (request_id, from_user_id, to_user_id)
+        self.groups = []           # (group_id, owner_id, [member ids])
+        self.groups_of = {}        # user_id -> [group_id] owned or joined
+
+
+def parse_scale(value):
+    if value in SCALES:
+        return SCALES[value]
+    return int(value)
+
+
+def seed(client, users=1000, friends=6, pending=1, group_size=8, groups_per_user=0.25,
+         messages=20, task_days=7, active=0.2, seed=0):
+    # Loads users, gardens, profiles, friendships, groups, messages and tasks
+    # into a FakeSupabase (without counting round trips) and returns a World.
+    # friends is the average accepted-friend degree; active is the share of
+    # users with task_days days of task history.
+    rng = random.Random(seed)
+    world = World()
+    today = date.today()
+    days = [str(today - timedelta(days=d)) for d in range(task_days)]
+
+    rows = client.load('users', [{'username': f'user{i:06d}', 'password_hash': PASSWORD} for i in range(users)])
+    for row in rows:
+        world.user_ids.append(row['id'])
+        world.usernames[row['id']] = row['username']
+        world.friends[row['id']] = set()
+        world.groups_of[row['id']] = []
+    ids = world.user_ids
+
+    gardens = []
+    profiles = []
+    for user_id in ids:
+        if rng.random() < 0.8:
+            gardens.append({
+                'user_id': user_id,
+                'block_count': rng.randint(0, 60),
+                'is_dead': rng.random() < 0.05,
+                'last_activity': rng.choice(days),
+                'last_block_award_date': rng.choice(days + [None])
+            })
+        if rng.random() < 0.5:
+            profiles.append({'user_id': user_id, 'bio': 'Getting things done', 'pfp_url': f'https://example.com/{user_id}.png'})
+    client.load('garden_state', gardens)
+    client.load('user_profiles', profiles)
+
+    def link(a, b):
+        return a != b and (a, b) not in world.related and (b, a) not in world.related
+
+    friend_rows = []
+    for _ in range(users * friends // 2):
+        a, b = rng.choice(ids), rng.choice(ids)
+        if link(a, b):
+            world.related.add((a, b))
+            world.friends[a].add(b)
+            world.friends[b].add(a)
+            world.accepted.append((a, b))
+            friend_rows.append({'user_id': a, 'friend_id': b, 'status': 'accepted'})
+    client.load('friends', friend_rows)
+
+    pending_rows = []
+    for _ in range(users * pending):
+        a, b = rng.choice(ids), rng.choice(ids)
+        if link(a, b):
+            world.related.add((a, b))
+            pending_rows.append({'user_id': a, 'friend_id': b, 'status': 'pending'})
+    for row in client.load('friends', pending_rows):
+        world.pending.append((row['id'], row['user_id'], row['friend_id']))
+
+    group_rows = client.load('groups', [
+        {'user_id': rng.choice(ids), 'group_name': f'Group {i}', 'created_at': str(today)}
+        for i in range(max(int(users * groups_per_user), 1))
+    ])
+    member_rows = []
+    message_rows = []
+    for group in group_rows:
+        owner = group['user_id']
+        members = [m for m in rng.sample(ids, min(group_size, len(ids))) if m != owner]
+        world.groups.append((group['id'], owner, members))
+        for user_id in [owner] + members:
+            world.groups_of[user_id].append(group['id'])
+        member_rows.extend({'group_id': group['id'], 'user_id': m} for m in members)
+        for _ in range(messages):
+            author = rng.choice([owner] + members)
+            message_rows.append({
+                'group_id': group['id'],
+                'user_id': author,
+                'username': world.usernames[author],
+                'message': ' '.join(rng.choices(WORDS, k=rng.randint(2, 8))),
+                'created_at': str(today)
+            })
+    client.load('group_members', member_rows)
+    client.load('group_messages', message_rows)
+
+    task_rows = []
+    for user_id in ids:
+        if rng.random() >= active:
+            continue
+        for day in days:
+            for name in rng.sample(TASK_NAMES, rng.randint(1, 4)):
+                task_rows.append({'user_id': user_id, 'date': day, 'task_name': name, 'tasks_completed': rng.randint(0, 1)})
+            if rng.random() < 0.3:
+                task_rows.append({'user_id': user_id, 'date': day, 'task_name': 'Focus Session', 'focus_time': rng.randint(300, 3600)})
+    client.load('tasks', task_rows)
+    rollups = {}
+    for row in task_rows:
+        counts = rollups.setdefault((row['user_id'], row['date']), [0, 0, 0])
+        for i, value in enumerate(analytics.task_counts(row)):
+            counts[i] += value
+    client.load('daily_stats', [
+        {'user_id': user_id, 'date': day, 'tasks_total': t, 'tasks_completed': c, 'focus_time': f}
+        for (user_id, day), (t, c, f) in rollups.items()
+    ])
+    return world
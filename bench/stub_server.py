@@ -0,0 +1,199 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from bench.fake_supabase import FakeAPIError, FakeSupabase
+from bench.seed import parse_scale, seed
+
+# Local PostgREST stand-in for exercising the storage client over real HTTP:
+# serves the seeded in-memory database under /rest/v1 with the filters the
+# app uses, and injects latency and errors. Point the app at it with
+#
+#   python -m bench.stub_server --scale 1k --latency-ms 20 --error-rate 0.05
+#   STORAGE_BACKEND=supabase SUPABASE_URL=http://127.0.0.1:54321 \
+#       SUPABASE_KEY=stub.stub.stub flask --app backend run
+#
+# and change the faults while it runs, e.g. to take the database down:
+#
+#   curl -X POST localhost:54321/__faults -d '{"down": true}'
+#
+# Faults: latency_ms (+ up to jitter_ms) before every answer, error_rate of
+# requests answered 503, down answers everything 503, and hang_ms holds
+# requests that long before answering (longer than STORAGE_TIMEOUT looks like
+# a dead server).
+
+OPERATORS = ('eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'in')
+
+
+def _value(text):
+    if text in ('true', 'false'):
+        return text == 'true'
+    if text == 'null':
+        return None
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text.strip('"')
+
+
+def _query(client, table, params, headers):
+    # A FakeQuery for PostgREST query parameters: select, order, limit,
+    # offset and column=op.value filters
+    query = client.table(table)
+    for name, raw in params:
+        if name == 'select':
+            query.select(raw)
+        elif name == 'order':
+            for term in raw.split(','):
+                column, _, rest = term.partition('.')
+                query.order(column, desc=rest.startswith('desc'))
+        elif name == 'limit':
+            query._limit = int(raw)
+        elif name == 'offset':
+            query._offset = int(raw)
+        elif name not in ('on_conflict', 'columns'):
+            op, _, text = raw.partition('.')
+            if op not in OPERATORS:
+                raise ValueError(f'unsupported filter {name}={raw}')
+            if op == 'in':
+                query.in_(name, [_value(v) for v in text.strip('()').split(',') if v])
+            else:
+                getattr(query, op)(name, _value(text))
+    span = headers.get('Range')
+    if span and '-' in span:
+        start, end = span.split('-', 1)
+        query.range(int(start), int(end))
+    return query
+
+
+class Faults:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, hang_ms=0.0, down=False):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.hang_ms = hang_ms
+        self.down = down
+
+    def update(self, values):
+        for name, value in values.items():
+            if name in vars(self):
+                setattr(self, name, type(getattr(self, name))(value))
+
+    def inject(self):
+        # Sleeps as configured; True when the request should fail
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms) + self.hang_ms
+        if delay:
+            time.sleep(delay / 1000)
+        return self.down or random.random() < self.error_rate
+
+
+def make_handler(client, faults):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'   # keep-alive, like PostgREST behind its gateway
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body):
+            data = json.dumps(body, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length) or b'null') if length else None
+
+        def _handle(self, method):
+            url = urlsplit(self.path)
+            body = self._body()
+            if url.path == '/__faults' and method == 'POST':
+                faults.update(body or {})
+                return self._send(200, vars(faults))
+            if not url.path.startswith('/rest/v1/'):
+                return self._send(404, {'message': 'not found'})
+            if faults.inject():
+                return self._send(503, {'message': 'injected failure', 'code': '503'})
+
+            params = parse_qsl(url.query, keep_blank_values=True)
+            name = url.path[len('/rest/v1/'):]
+            try:
+                if name.startswith('rpc/'):
+                    return self._send(200, client.rpc(name[4:], body or {}).execute().data)
+                query = _query(client, name, params, self.headers)
+                prefer = self.headers.get('Prefer', '')
+                if method == 'POST':
+                    conflict = dict(params).get('on_conflict')
+                    if conflict or 'resolution=' in prefer:
+                        query.upsert(body, on_conflict=conflict or 'id',
+                                     ignore_duplicates='ignore-duplicates' in prefer)
+                    else:
+                        query.insert(body)
+                elif method == 'PATCH':
+                    query.update(body)
+                elif method == 'DELETE':
+                    query.delete()
+                return self._send(200, query.execute().data)
+            except FakeAPIError as e:
+                return self._send(409, {'message': str(e), 'code': '23505'})
+            except (ValueError, KeyError) as e:
+                return self._send(400, {'message': str(e), 'code': 'PGRST100'})
+
+        def do_GET(self):
+            self._handle('GET')
+
+        def do_POST(self):
+            self._handle('POST')
+
+        def do_PATCH(self):
+            self._handle('PATCH')
+
+        def do_DELETE(self):
+            self._handle('DELETE')
+
+    return Handler
+
+
+def serve(client, faults, host='127.0.0.1', port=54321):
+    # Starts the server on a daemon thread and returns it
+    server = ThreadingHTTPServer((host, port), make_handler(client, faults))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a seeded in-memory database over PostgREST-style HTTP.')
+    parser.add_argument('--scale', default='1k', help='1k, 10k, 100k or a user count (default 1k)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered 503')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    client = FakeSupabase()
+    seed(client, users=parse_scale(args.scale), seed=args.seed)
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate)
+    server = serve(client, faults, args.host, args.port)
+    print(f"Serving on http://{args.host}:{server.server_port}/rest/v1 (faults at /__faults)", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+# Per-group chat fan-out. Each group keeps a bounded ring buffer of its most
+# recent messages; send_group_message publishes into it and wakes any stream
+# readers, and cursor reads (after_id) are answered from memory whenever the
+# buffer covers the cursor.
+#
+# Messages sent through another worker are never published here. With
+# sync_interval set, a buffer is only trusted for that many seconds;
+# ensure_primed then tops it up with one query for the ids after the newest
+# it holds, which also wakes this worker's stream readers.
+class _Channel:
+    def __init__(self, buffer_size):
+        self.messages = deque(maxlen=buffer_size)
+        self.cond = threading.Condition()
+        self.primed = False
+        self.full_history = False  # buffer holds every message of the group
+        self.synced_at = 0.0       # when the buffer last matched the database
+        self.waiters = 0
+
+
+class ChatHub:
+    def __init__(self, buffer_size=200, max_groups=1000, sync_interval=None):
+        self.buffer_size = buffer_size
+        self.max_groups = max_groups
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._channels = OrderedDict()  # group_id -> _Channel, in LRU order
+
+    def _channel(self, group_id):
+        with self._lock:
+            channel = self._channels.get(group_id)
+            if channel is None:
+                channel = _Channel(self.buffer_size)
+                self._channels[group_id] = channel
+                self._evict()
+            else:
+                self._channels.move_to_end(group_id)
+            return channel
+
+    def _evict(self):
+        # Drop the least recently used idle channels beyond max_groups
+        for group_id in list(self._channels):
+            if len(self._channels) <= self.max_groups:
+                return
+            if self._channels[group_id].waiters == 0:
+                del self._channels[group_id]
+
+    def ensure_primed(self, group_id, client):
+        channel = self._channel(group_id)
+        with channel.cond:
+            if channel.primed and (self.sync_interval is None
+                                   or time.monotonic() - channel.synced_at < self.sync_interval):
+                return
+            if channel.primed and channel.messages:
+                rows = client.table('group_messages').select('*').eq('group_id', group_id) \
+                    .gt('id', channel.messages[-1]['id']).order('id').limit(self.buffer_size).execute().data or []
+                if len(rows) < self.buffer_size:
+                    for row in rows:
+                        self._insert(channel, row)
+                    channel.synced_at = time.monotonic()
+                    if rows:
+                        channel.cond.notify_all()
+                    return
+            # First use, or too far behind to top up: load the newest page
+            result = client.table('group_messages').select('*').eq('group_id', group_id) \
+                .order('id', desc=True).limit(self.buffer_size).execute()
+            rows = list(reversed(result.data or []))
+            channel.messages.clear()
+            channel.messages.extend(rows)
+            channel.full_history = len(rows) < self.buffer_size
+            channel.synced_at = time.monotonic()
+            if channel.primed:
+                channel.cond.notify_all()
+            channel.primed = True
+
+    def _since(self, channel, after_id):
+        # None means the buffer cannot prove it holds everything after after_id
+        messages = channel.messages
+        if not channel.primed:
+            return None
+        if not channel.full_history:
+            if not messages or after_id is None or after_id < messages[0]['id'] - 1:
+                return None
+        if after_id is None:
+            return list(messages)
+        return [m for m in messages if m['id'] > after_id]
+
+    def since(self, group_id, after_id=None):
+        channel = self._channel(group_id)
+        with channel.cond:
+            return self._since(channel, after_id)
+
+    def wait(self, group_id, after_id, timeout):
+        # Block until messages newer than after_id arrive or timeout expires.
+        # None, right away, when after_id is older than the buffer: the caller
+        # reads that range from the database.
+        channel = self._channel(group_id)
+        with channel.cond:
+            channel.waiters += 1
+            try:
+                channel.cond.wait_for(
+                    lambda: bool(channel.messages) and channel.messages[-1]['id'] > after_id,
+                    timeout=timeout
+                )
+                return self._since(channel, after_id)
+            finally:
+                channel.waiters -= 1
+
+    def publish(self, group_id, message):
+        channel = self._channel(group_id)
+        with channel.cond:
+            if channel.primed:
+                self._insert(channel, message)
+            channel.cond.notify_all()
+
+    def _insert(self, channel, message):
+        # Called with channel.cond held
+        messages = channel.messages
+        if messages and message['id'] <= messages[-1]['id']:
+            # Concurrent sends can commit out of order, and a top-up can read
+            # a message before the worker that sent it publishes it
+            ordered = list(messages)
+            idx = len(ordered)
+            while idx > 0 and ordered[idx - 1]['id'] > message['id']:
+                idx -= 1
+            if idx and ordered[idx - 1]['id'] == message['id']:
+                return
+            ordered.insert(idx, message)
+            if len(ordered) > self.buffer_size:
+                channel.full_history = False
+            messages.clear()
+            messages.extend(ordered)
+        else:
+            if len(messages) == self.buffer_size:
+                channel.full_history = False
+            messages.append(message)
+
+    def drop(self, group_id):
+        with self._lock:
+            channel = self._channels.pop(group_id, None)
+        if channel is not None:
+            with channel.cond:
+                channel.messages.clear()
+                channel.primed = False
+                channel.cond.notify_all()
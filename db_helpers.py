@@ -0,0 +1,18 @@
+# Shared query helpers for the in-memory indexes built on top of Supabase
+
+# PostgREST caps every response (1000 rows by default), so full-table loads
+# have to walk the table in pages
+PAGE_SIZE = 1000
+
+
+def fetch_all(build_query, page_size=PAGE_SIZE):
+    # build_query() must return a fresh, ordered select for every page
+    rows = []
+    offset = 0
+    while True:
+        page = build_query().range(offset, offset + page_size - 1).execute()
+        data = page.data or []
+        rows.extend(data)
+        if len(data) < page_size:
+            return rows
+        offset += page_size
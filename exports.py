@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+import zlib
+
+from db_helpers import PAGE_SIZE
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+
+def keyset_pages(build_query, after_id=None, page_size=PAGE_SIZE):
+    # Pages of build_query() rows with id > after_id, in id order. Each page
+    # starts after the last id of the one before, so the database seeks on
+    # the primary key instead of skipping an offset, and rows written during
+    # the export neither shift nor repeat.
+    last_id = after_id
+    while True:
+        query = build_query()
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        rows = query.order('id').limit(page_size).execute().data or []
+        if rows:
+            yield rows
+            last_id = rows[-1]['id']
+        if len(rows) < page_size:
+            return
+
+
+def _ndjson(pages, columns):
+    for rows in pages:
+        yield ''.join(json.dumps({c: row.get(c) for c in columns}, default=str) + '\n' for row in rows)
+
+
+def _csv(pages, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in pages:
+        writer.writerows([row.get(c) for c in columns] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # The header alone when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _gzip(chunks):
+    # Each chunk is flushed as soon as it is compressed so the client gets
+    # bytes per page rather than when the export ends
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def _encode(chunks):
+    for chunk in chunks:
+        yield chunk.encode('utf-8')
+
+
+# Streams the rows of build_query() as NDJSON or CSV, one database page at a
+# time, so memory use does not grow with the export. Only the current page
+# and its encoded chunk are held. With gzip the stream is compressed on the
+# fly. Errors after the first byte cannot change the status any more; they
+# are logged and the stream ends early.
+def stream(build_query, columns, fmt='ndjson', gzip=False, after_id=None, page_size=PAGE_SIZE):
+    encoder = _csv if fmt == 'csv' else _ndjson
+
+    def chunks():
+        try:
+            yield from encoder(keyset_pages(build_query, after_id, page_size), columns)
+        except Exception as e:
+            print(f"Export error: {e}")
+
+    return _gzip(chunks()) if gzip else _encode(chunks())
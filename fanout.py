@@ -0,0 +1,53 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from flask import g, has_app_context
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+# Runs a handler's independent queries concurrently on a bounded thread pool,
+# so a route costs roughly its slowest query instead of the sum of all of
+# them. Every request gets one deadline (timeout seconds from its first fan-out)
+# shared by all of its fan-outs; calls still running when it passes are
+# abandoned and DeadlineExceeded is raised. With enabled=False the calls run
+# one after another on the request thread, as before. Fan-outs started from
+# inside a pool thread also run inline, so nested helpers can't deadlock the
+# bounded pool. Pool calls run in a copy of the caller's context, so they see
+# the request's g.
+class FanOut:
+    def __init__(self, max_workers=8, timeout=5.0, enabled=True):
+        self.timeout = timeout
+        self.enabled = enabled
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fanout') if enabled else None
+        self._local = threading.local()
+
+    def _deadline(self):
+        if has_app_context():
+            return g.setdefault('deadline', time.monotonic() + self.timeout)
+        return time.monotonic() + self.timeout
+
+    def run(self, *calls):
+        # Results in the order given; the first exception raised is re-raised
+        if not self.enabled or len(calls) < 2 or getattr(self._local, 'in_pool', False):
+            return [call() for call in calls]
+
+        deadline = self._deadline()
+        futures = [self._pool.submit(contextvars.copy_context().run, self._call, call) for call in calls]
+        done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            raise DeadlineExceeded(f"{len(not_done)} of {len(calls)} queries missed the request deadline")
+        return [future.result() for future in futures]
+
+    def _call(self, call):
+        self._local.in_pool = True
+        try:
+            return call()
+        finally:
+            self._local.in_pool = False
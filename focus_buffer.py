@@ -0,0 +1,129 @@
+import atexit
+import threading
+import uuid
+from collections import defaultdict
+
+# (user_id, date) rows per increment_focus_time call
+FLUSH_CHUNK = 500
+
+
+# Write-behind accumulator for focus time. update_focus adds deltas here
+# instead of reading and rewriting the "Focus Session" row; a background
+# thread flushes the summed deltas every flush_interval seconds (or as soon as
+# max_keys distinct (user, date) pairs are pending) through the
+# increment_focus_time database function, which adds them atomically. Each
+# call carries a token the function records, and a call that fails is resent
+# later as is, token included: a call that landed before a timeout is not
+# counted twice. on_flush(user_ids) runs after every flush that wrote something.
+# The buffer is drained at exit.
+class FocusBuffer:
+    def __init__(self, flush_interval=5, max_keys=1000, on_flush=None):
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self.on_flush = on_flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = defaultdict(int)   # (user_id, date) -> seconds
+        self._in_flight = defaultdict(int)  # taken by a flush, not yet committed
+        self._retry = []                    # (token, chunk) calls that failed, resent first
+        self._client = None
+        self._thread = None
+        self.flushes = 0
+        self.flushed_keys = 0
+        self.errors = 0
+
+    def start(self, client):
+        with self._lock:
+            self._client = client
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='focus-buffer', daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Focus flush error: {e}")
+
+    def add(self, user_id, day, seconds, client):
+        if self._thread is None:
+            self.start(client)
+        with self._lock:
+            self._pending[(user_id, day)] += seconds
+            if len(self._pending) >= self.max_keys:
+                self._wake.set()
+
+    def pending(self, user_id, date_from=None, date_to=None):
+        # {date: unflushed seconds} for one user, so reads include buffered time
+        with self._lock:
+            totals = defaultdict(int)
+            for source in (self._pending, self._in_flight):
+                for (uid, day), seconds in source.items():
+                    if uid != user_id or (date_from and day < date_from) or (date_to and day > date_to):
+                        continue
+                    totals[day] += seconds
+            return dict(totals)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if self._client is None or not (self._pending or self._retry):
+                    return 0
+                batch = list(self._pending.items())
+                self._pending.clear()
+                for key, seconds in batch:
+                    self._in_flight[key] += seconds
+                calls = self._retry + [(uuid.uuid4().hex, batch[start:start + FLUSH_CHUNK])
+                                       for start in range(0, len(batch), FLUSH_CHUNK)]
+                self._retry = []
+
+            flushed = 0
+            users = set()
+            for i, (token, chunk) in enumerate(calls):
+                try:
+                    self._client.rpc('increment_focus_time', {
+                        'p_user_ids': [user_id for (user_id, _), _ in chunk],
+                        'p_dates': [day for (_, day), _ in chunk],
+                        'p_seconds': [seconds for _, seconds in chunk],
+                        'p_token': token
+                    }).execute()
+                except Exception as e:
+                    print(f"Focus flush error: {e}")
+                    self.errors += 1
+                    # Still counted in flight, so reads keep including them
+                    with self._lock:
+                        self._retry = calls[i:]
+                    break
+                with self._lock:
+                    for key, seconds in chunk:
+                        self._drop_in_flight(key, seconds)
+                flushed += len(chunk)
+                users.update(user_id for (user_id, _), _ in chunk)
+
+            self.flushes += 1
+            self.flushed_keys += flushed
+            if users and self.on_flush:
+                self.on_flush(users)
+            return flushed
+
+    def _drop_in_flight(self, key, seconds):
+        self._in_flight[key] -= seconds
+        if self._in_flight[key] <= 0:
+            del self._in_flight[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending_keys': len(self._pending),
+                'pending_seconds': sum(self._pending.values()),
+                'retrying_keys': sum(len(chunk) for _, chunk in self._retry),
+                'flushes': self.flushes,
+                'flushed_keys': self.flushed_keys,
+                'errors': self.errors
+            }
@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import defaultdict
+
+from db_helpers import fetch_all
+
+
+# In-process adjacency index over the friends table. It is loaded lazily with
+# one paged scan and then kept current by the friend routes, so friendship
+# checks are set lookups instead of full-table selects.
+class FriendIndex:
+    def __init__(self, max_age=300):
+        # Reload after max_age seconds so writes from other workers show up
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._edges = {}                     # row id -> (user_id, friend_id, status)
+        self._edge_ids = {}                  # (user_id, friend_id) -> row id
+        self._accepted = defaultdict(set)    # user_id -> accepted friend ids
+        self._pending_out = defaultdict(set) # user_id -> ids they sent requests to
+        self._pending_in = defaultdict(set)  # user_id -> ids that sent them requests
+
+    def ensure_loaded(self, client):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.max_age:
+                return
+            rows = fetch_all(lambda: client.table('friends').select('id, user_id, friend_id, status').order('id'))
+            self._edges = {}
+            self._edge_ids = {}
+            self._accepted = defaultdict(set)
+            self._pending_out = defaultdict(set)
+            self._pending_in = defaultdict(set)
+            for row in rows:
+                self._add(row['id'], row['user_id'], row['friend_id'], row.get('status') or 'pending')
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _add(self, row_id, user_id, friend_id, status):
+        self._edges[row_id] = (user_id, friend_id, status)
+        self._edge_ids[(user_id, friend_id)] = row_id
+        if status == 'accepted':
+            self._accepted[user_id].add(friend_id)
+            self._accepted[friend_id].add(user_id)
+        elif status == 'pending':
+            self._pending_out[user_id].add(friend_id)
+            self._pending_in[friend_id].add(user_id)
+
+    def _discard(self, row_id):
+        edge = self._edges.pop(row_id, None)
+        if edge is None:
+            return
+        user_id, friend_id, status = edge
+        self._edge_ids.pop((user_id, friend_id), None)
+        if status == 'accepted':
+            # The pair may still be linked by a row in the other direction
+            if (friend_id, user_id) not in self._edge_ids or \
+               self._edges[self._edge_ids[(friend_id, user_id)]][2] != 'accepted':
+                self._accepted[user_id].discard(friend_id)
+                self._accepted[friend_id].discard(user_id)
+        elif status == 'pending':
+            self._pending_out[user_id].discard(friend_id)
+            self._pending_in[friend_id].discard(user_id)
+
+    # ---- lookups ----
+
+    def are_friends(self, user_id, other_id):
+        with self._lock:
+            return other_id in self._accepted.get(user_id, ())
+
+    def friends_of(self, user_id):
+        with self._lock:
+            return set(self._accepted.get(user_id, ()))
+
+    def pending_outgoing(self, user_id):
+        with self._lock:
+            return set(self._pending_out.get(user_id, ()))
+
+    def pending_incoming(self, user_id):
+        # [(request row id, requester id)] in request order
+        with self._lock:
+            return sorted((self._edge_ids[(requester, user_id)], requester)
+                          for requester in self._pending_in.get(user_id, ()))
+
+    def statuses(self, user_id, other_ids):
+        # {other id: 'friends' | 'pending_outgoing' | 'pending_incoming' | None}
+        # for many users under one lock acquisition
+        with self._lock:
+            accepted = self._accepted.get(user_id, ())
+            outgoing = self._pending_out.get(user_id, ())
+            incoming = self._pending_in.get(user_id, ())
+            result = {}
+            for other_id in other_ids:
+                if other_id in accepted:
+                    result[other_id] = 'friends'
+                elif other_id in outgoing:
+                    result[other_id] = 'pending_outgoing'
+                elif other_id in incoming:
+                    result[other_id] = 'pending_incoming'
+                else:
+                    result[other_id] = None
+            return result
+
+    def has_edge(self, user_id, friend_id):
+        with self._lock:
+            return (user_id, friend_id) in self._edge_ids
+
+    def get_edge(self, row_id):
+        with self._lock:
+            return self._edges.get(row_id)
+
+    # ---- updates from the friend routes ----
+
+    def add_edge(self, row_id, user_id, friend_id, status='pending'):
+        with self._lock:
+            self._discard(row_id)
+            self._add(row_id, user_id, friend_id, status)
+
+    def accept(self, row_id):
+        with self._lock:
+            edge = self._edges.get(row_id)
+            if edge is None:
+                return
+            self._discard(row_id)
+            self._add(row_id, edge[0], edge[1], 'accepted')
+
+    def remove_edge(self, row_id):
+        with self._lock:
+            self._discard(row_id)
+
+    def remove_pair(self, user_id, other_id):
+        with self._lock:
+            for key in ((user_id, other_id), (other_id, user_id)):
+                row_id = self._edge_ids.get(key)
+                if row_id is not None:
+                    self._discard(row_id)
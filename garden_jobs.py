@@ -0,0 +1,127 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from db_helpers import fetch_all
+
+# Same rules as update_garden in backend.py
+BLOCK_THRESHOLD = 0.6  # daily completion ratio that earns a block
+DEATH_DAYS = 3         # days without activity before a garden dies
+CHUNK_SIZE = 500       # garden_state rows per update_gardens call
+MISSING = -10 ** 9     # day offset standing in for a NULL date
+
+
+def _ordinals(values, missing):
+    return np.array([date.fromisoformat(v).toordinal() if v else missing for v in values], dtype=np.int64)
+
+
+# Batch garden evaluation for every user, meant to run nightly from the CLI
+# (flask evaluate-gardens) or a scheduler. Task completions for [start, end]
+# are loaded in bulk, per-user daily ratios and inactivity are computed as
+# array operations, and the changed gardens are written in chunks through the
+# update_gardens database function. It only updates a row whose updated_at is
+# still the one read here, so a garden the user replanted or updated while the
+# job ran keeps that change (and is evaluated again on the next run). Blocks
+# are only awarded for days after last_block_award_date, so overlapping
+# windows are safe to re-run.
+def evaluate_gardens(client, start, end, today=None, chunk_size=CHUNK_SIZE):
+    today = today or date.today()
+    ndays = (end - start).days + 1
+
+    gardens = fetch_all(lambda: client.table('garden_state')
+                        .select('user_id, block_count, is_dead, last_activity, last_block_award_date, updated_at')
+                        .order('user_id'))
+    if not gardens or ndays <= 0:
+        return {'gardens': len(gardens), 'tasks': 0, 'blocks_awarded': 0, 'died': 0, 'updated': 0, 'skipped': 0,
+                'changes': []}
+
+    tasks = fetch_all(lambda: client.table('tasks').select('user_id, date, tasks_completed')
+                      .gte('date', start.isoformat()).lte('date', end.isoformat()).order('id'))
+
+    user_ids = np.array([g['user_id'] for g in gardens], dtype=np.int64)
+    block_count = np.array([g.get('block_count') or 0 for g in gardens], dtype=np.int64)
+    is_dead = np.array([bool(g.get('is_dead')) for g in gardens])
+    # Dates as day offsets from start; NULL dates sort before everything
+    origin = start.toordinal()
+    last_activity = _ordinals([g.get('last_activity') for g in gardens], origin + MISSING) - origin
+    last_award = _ordinals([g.get('last_block_award_date') for g in gardens], origin + MISSING) - origin
+
+    # Per (user, day) totals and completions
+    total = np.zeros((len(gardens), ndays), dtype=np.int64)
+    done = np.zeros_like(total)
+    if tasks:
+        t_user = np.array([t['user_id'] for t in tasks], dtype=np.int64)
+        t_day = _ordinals([t['date'] for t in tasks], origin) - origin
+        t_done = np.array([(t.get('tasks_completed') or 0) > 0 for t in tasks])
+        row = np.searchsorted(user_ids, t_user)
+        row[row >= len(user_ids)] = 0
+        known = user_ids[row] == t_user
+        cell = row[known] * ndays + t_day[known]
+        total = np.bincount(cell, minlength=total.size).reshape(total.shape)
+        done = np.bincount(cell, weights=t_done[known], minlength=total.size).astype(np.int64).reshape(total.shape)
+
+    qualifies = (total > 0) & (done >= BLOCK_THRESHOLD * total)
+
+    # One block per qualifying day not yet awarded; dead gardens earn nothing
+    days = np.arange(ndays)
+    awards = qualifies & (days[None, :] > last_award[:, None]) & ~is_dead[:, None]
+    awarded = awards.sum(axis=1)
+    any_award = awards.any(axis=1)
+    last_award_day = np.where(any_award, ndays - 1 - np.argmax(awards[:, ::-1], axis=1), last_award)
+
+    # A qualifying day counts as activity; dead gardens stay dead until replanted
+    any_qualified = qualifies.any(axis=1) & ~is_dead
+    last_qualified_day = np.where(any_qualified, ndays - 1 - np.argmax(qualifies[:, ::-1], axis=1), MISSING)
+    new_activity = np.maximum(last_activity, last_qualified_day)
+    activity_moved = new_activity > last_activity
+
+    # Gardens that never recorded activity don't die (as in update_garden)
+    new_blocks = block_count + awarded
+    days_inactive = (today.toordinal() - origin) - new_activity
+    dies = ~is_dead & (new_activity > MISSING) & (days_inactive >= DEATH_DAYS) & (new_blocks > 0)
+
+    changed = (awarded > 0) | activity_moved | dies
+    rows = []
+    for i in np.flatnonzero(changed):
+        activity = date.fromordinal(int(origin + new_activity[i])).isoformat() \
+            if activity_moved[i] else gardens[i].get('last_activity')
+        award_date = date.fromordinal(int(origin + last_award_day[i])).isoformat() \
+            if any_award[i] else gardens[i].get('last_block_award_date')
+        rows.append({
+            'user_id': int(user_ids[i]),
+            'block_count': int(new_blocks[i]),
+            'is_dead': bool(is_dead[i] or dies[i]),
+            'last_activity': activity,
+            'last_block_award_date': award_date,
+            'seen': gardens[i].get('updated_at')
+        })
+
+    written = set()
+    for offset in range(0, len(rows), chunk_size):
+        chunk = rows[offset:offset + chunk_size]
+        result = client.rpc('update_gardens', {
+            'p_user_ids': [r['user_id'] for r in chunk],
+            'p_seen': [r['seen'] for r in chunk],
+            'p_block_counts': [r['block_count'] for r in chunk],
+            'p_is_dead': [r['is_dead'] for r in chunk],
+            'p_last_activity': [r['last_activity'] for r in chunk],
+            'p_award_dates': [r['last_block_award_date'] for r in chunk]
+        }).execute()
+        written.update(r['user_id'] for r in result.data or [])
+    changes = [r for r in rows if r['user_id'] in written]
+    mask = np.isin(user_ids, list(written))
+
+    return {
+        'gardens': len(gardens),
+        'tasks': len(tasks),
+        'blocks_awarded': int(awarded[mask].sum()),
+        'died': int(dies[mask].sum()),
+        'updated': len(changes),
+        'skipped': len(rows) - len(changes),
+        'changes': changes
+    }
+
+
+def default_window(today=None, days=7):
+    today = today or date.today()
+    return today - timedelta(days=days - 1), today
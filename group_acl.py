@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# group_id -> (owner id, member ids) cache for the group routes. Entries
+# expire after ttl seconds, the least recently used entry is evicted past
+# max_size, and invite / remove-member / delete-group invalidate explicitly.
+class GroupACLCache:
+    def __init__(self, ttl=60, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # group_id -> (expires_at, owner_id, members)
+        self._generation = 0           # bumped by invalidate()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, group_id, client):
+        # (owner_id, frozenset of member ids), or None if the group is gone
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(group_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(group_id)
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+            generation = self._generation
+
+        group = client.table('groups').select('user_id').eq('id', group_id).execute()
+        if not group.data:
+            return None
+        members = client.table('group_members').select('user_id').eq('group_id', group_id).execute()
+        owner_id = group.data[0]['user_id']
+        member_ids = frozenset(m['user_id'] for m in (members.data or []))
+
+        with self._lock:
+            # Don't cache a load that raced with an invalidation
+            if generation != self._generation:
+                return owner_id, member_ids
+            self._entries[group_id] = (time.monotonic() + self.ttl, owner_id, member_ids)
+            self._entries.move_to_end(group_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return owner_id, member_ids
+
+    def invalidate(self, group_id):
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(group_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,190 @@
+import csv
+import io
+import re
+from datetime import date
+
+import analytics
+
+CHUNK_SIZE = 500       # tasks rows per bulk upsert
+MAX_ERRORS = 20        # error messages kept for the report
+FORMATS = ('csv', 'ics')
+
+# CSV header aliases, lowercased
+CSV_COLUMNS = {
+    'date': ('date', 'day'),
+    'task_name': ('task_name', 'task', 'name', 'title', 'summary'),
+    'tasks_completed': ('tasks_completed', 'completed', 'done', 'status'),
+    'focus_time': ('focus_time', 'focus', 'focus_seconds')
+}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'x', 'done', 'completed', 'complete'}
+_ICS_DATE = re.compile(r'(\d{4})(\d{2})(\d{2})')
+
+
+def detect_format(filename, content_type=None):
+    # 'csv' or 'ics' from a file name or content type, or None
+    name = (filename or '').lower()
+    kind = (content_type or '').split(';')[0].strip().lower()
+    if name.endswith(('.ics', '.ical', '.ifb')) or kind == 'text/calendar':
+        return 'ics'
+    if name.endswith('.csv') or kind in ('text/csv', 'application/csv'):
+        return 'csv'
+    return None
+
+
+def text_lines(binary):
+    # Lines of an uploaded binary stream, decoded as it is read
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def _task(day, task_name, completed=False, focus_time=0):
+    # Validated task row fields; raises ValueError
+    day = (day or '').strip()[:10]
+    date.fromisoformat(day)
+    task_name = (task_name or '').strip()
+    if not task_name:
+        raise ValueError('task_name is empty')
+    if focus_time < 0:
+        raise ValueError('focus_time is negative')
+    return {'date': day, 'task_name': task_name, 'tasks_completed': 1 if completed else 0, 'focus_time': focus_time}
+
+
+# ---- parsers: yield (line number, task or None, error or None) ----
+
+def parse_csv(lines):
+    # Header row required; only date and task_name (or an alias) are mandatory
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    names = [h.strip().lower() for h in header]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    missing = [f for f in ('date', 'task_name') if f not in columns]
+    if missing:
+        raise ValueError(f"CSV header needs {' and '.join(missing)} columns")
+
+    def cell(values, field):
+        index = columns.get(field)
+        return values[index].strip() if index is not None and index < len(values) else ''
+
+    for values in reader:
+        line = reader.line_num
+        if not any(v.strip() for v in values):
+            continue
+        try:
+            focus = cell(values, 'focus_time')
+            yield line, _task(cell(values, 'date'), cell(values, 'task_name'),
+                              cell(values, 'tasks_completed').lower() in TRUE_VALUES,
+                              int(focus) if focus else 0), None
+        except ValueError as e:
+            yield line, None, str(e)
+
+
+def _unfold(lines):
+    # RFC 5545 content lines: a line starting with a space or tab continues
+    # the previous one. Yields (line number, content line).
+    pending, start = None, 0
+    for number, raw in enumerate(lines, 1):
+        raw = raw.rstrip('\r\n')
+        if raw[:1] in (' ', '\t') and pending is not None:
+            pending += raw[1:]
+            continue
+        if pending is not None:
+            yield start, pending
+        pending, start = raw, number
+    if pending is not None:
+        yield start, pending
+
+
+def _ics_text(value):
+    return re.sub(r'\\([\\;,nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def _ics_date(value):
+    match = _ICS_DATE.match(value or '')
+    if not match:
+        raise ValueError(f'bad date {value!r}')
+    return '-'.join(match.groups())
+
+
+def parse_ics(lines):
+    # VTODO and VEVENT components: SUMMARY is the task, DTSTART (else DUE,
+    # else COMPLETED) its day, and STATUS:COMPLETED, a COMPLETED time or
+    # PERCENT-COMPLETE:100 mark it done. Times are read as calendar days.
+    component, start = None, 0
+    for number, content in _unfold(lines):
+        name, _, value = content.partition(':')
+        name = name.split(';', 1)[0].upper()
+        if name == 'BEGIN' and value.upper() in ('VTODO', 'VEVENT'):
+            component, start = {}, number
+        elif component is None:
+            continue
+        elif name == 'END' and value.upper() in ('VTODO', 'VEVENT'):
+            try:
+                day = component.get('DTSTART') or component.get('DUE') or component.get('COMPLETED')
+                done = (component.get('STATUS', '').upper() == 'COMPLETED' or 'COMPLETED' in component
+                        or component.get('PERCENT-COMPLETE') == '100')
+                yield start, _task(_ics_date(day), _ics_text(component.get('SUMMARY', '')), done), None
+            except ValueError as e:
+                yield start, None, str(e)
+            component = None
+        elif name not in component:
+            component[name] = value.strip()
+
+
+PARSERS = {'csv': parse_csv, 'ics': parse_ics}
+
+
+# Bulk task import. Parsed tasks are deduplicated on (date, task_name) in
+# memory (the first occurrence wins) and written in chunks of chunk_size with
+# one upsert each that leaves rows the user already has untouched; the rows
+# it did insert feed the daily_stats rollups with one add_daily_stats call
+# per chunk. progress(report) is called after every chunk.
+def import_tasks(client, user_id, parsed, chunk_size=CHUNK_SIZE, progress=None):
+    report = {'rows': 0, 'imported': 0, 'existing': 0, 'duplicates': 0, 'errors': 0, 'error_samples': [],
+              'first_date': None, 'last_date': None}
+    seen = set()
+    chunk = []
+
+    def write():
+        inserted = client.table('tasks').upsert(
+            [dict(task, user_id=user_id) for task in chunk],
+            on_conflict='user_id,date,task_name', ignore_duplicates=True
+        ).execute().data or []
+        deltas = {}
+        for row in inserted:
+            counts = deltas.setdefault(row['date'], (0, 0, 0))
+            deltas[row['date']] = tuple(a + b for a, b in zip(counts, analytics.task_counts(row)))
+        analytics.add(client, user_id, deltas)
+        report['imported'] += len(inserted)
+        report['existing'] += len(chunk) - len(inserted)
+        chunk.clear()
+        if progress:
+            progress(report)
+
+    for line, task, error in parsed:
+        report['rows'] += 1
+        if error:
+            report['errors'] += 1
+            if len(report['error_samples']) < MAX_ERRORS:
+                report['error_samples'].append(f'line {line}: {error}')
+            continue
+        key = (task['date'], task['task_name'])
+        if key in seen:
+            report['duplicates'] += 1
+            continue
+        seen.add(key)
+        if report['first_date'] is None or task['date'] < report['first_date']:
+            report['first_date'] = task['date']
+        if report['last_date'] is None or task['date'] > report['last_date']:
+            report['last_date'] = task['date']
+        chunk.append(task)
+        if len(chunk) >= chunk_size:
+            write()
+    if chunk:
+        write()
+    return report
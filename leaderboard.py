@@ -0,0 +1,83 @@
+from array import array
+from bisect import bisect_left, insort
+
+# Block counts and ids are packed into one sortable int per user:
+# (MAX_BLOCKS - block_count) << ID_BITS | user_id
+ID_BITS = 32
+MAX_BLOCKS = 2 ** 31 - 1
+
+
+def _key(block_count, user_id):
+    return ((MAX_BLOCKS - block_count) << ID_BITS) | user_id
+
+
+# Ranked leaderboard so /api/leaderboard costs no round trips. The ranking is
+# a sorted array of packed (block_count, id) keys, 8 bytes per user; names,
+# block counts and avatars are read from the shared UserDirectory, which
+# keeps this order current through block_count_changed() and rebuilds it
+# through directory_rebuilt().
+# Ranking order is block_count descending, ties broken by user id.
+class Leaderboard:
+    def __init__(self, directory):
+        self.directory = directory
+        self._order = array('q')
+        directory.subscribe(self)
+
+    def ensure_built(self, client):
+        self.directory.ensure_fresh(client)
+
+    def invalidate(self):
+        self.directory.invalidate()
+
+    def __len__(self):
+        return len(self._order)
+
+    # ---- directory listener (called with the directory lock held) ----
+
+    def directory_rebuilt(self):
+        directory = self.directory
+        self._order = array('q', sorted(_key(directory.block_count(i), i) for i in directory.user_ids()))
+
+    def block_count_changed(self, user_id, old, new):
+        if old is not None:
+            idx = bisect_left(self._order, _key(old, user_id))
+            if idx < len(self._order) and self._order[idx] == _key(old, user_id):
+                del self._order[idx]
+        insort(self._order, _key(new, user_id))
+
+    # ---- reads ----
+
+    def _entry(self, idx):
+        user_id = self._order[idx] & ((1 << ID_BITS) - 1)
+        record = self.directory.get(user_id)
+        return {
+            'id': user_id,
+            'username': record['username'],
+            'block_count': record['block_count'],
+            'pfp_url': record['pfp_url'],
+            'rank': idx + 1
+        }
+
+    def page(self, offset=0, limit=100):
+        with self.directory.lock:
+            end = min(offset + limit, len(self._order))
+            return [self._entry(i) for i in range(offset, end)]
+
+    def rank_of(self, user_id):
+        with self.directory.lock:
+            return self._rank_of(user_id)
+
+    def _rank_of(self, user_id):
+        if user_id not in self.directory:
+            return None
+        return bisect_left(self._order, _key(self.directory.block_count(user_id), user_id)) + 1
+
+    def around(self, user_id, radius=5):
+        # The user's rank plus `radius` neighbours on each side
+        with self.directory.lock:
+            rank = self._rank_of(user_id)
+            if rank is None:
+                return None, []
+            start = max(rank - 1 - radius, 0)
+            end = min(rank + radius, len(self._order))
+            return rank, [self._entry(i) for i in range(start, end)]
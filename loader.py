@@ -0,0 +1,83 @@
+from collections import defaultdict
+
+from flask import g
+
+
+# table -> (key column, selected columns)
+TABLES = {
+    'users': ('id', 'id, username'),
+    'user_profiles': ('user_id', 'user_id, bio, pfp_url'),
+    'garden_state': ('user_id', '*')
+}
+
+
+# Per-request batching loader in the style of DataLoader. Handlers declare the
+# ids they need with want(); the first get() for a table resolves every pending
+# id of that table with a single in_ query and memoizes the rows (including
+# misses) for the rest of the request. resolve_all() fetches every pending
+# table at once, concurrently when given a FanOut.
+class Loader:
+    def __init__(self, client, fanout=None):
+        self._client = client
+        self._fanout = fanout
+        self._pending = defaultdict(set)
+        self._cache = defaultdict(dict)  # table -> id -> row or None
+        self.queries = 0
+
+    def want(self, table, ids):
+        cached = self._cache[table]
+        self._pending[table].update(i for i in ids if i not in cached)
+        return self
+
+    def prime(self, table, row):
+        key = TABLES[table][0]
+        self._cache[table][row[key]] = row
+        self._pending[table].discard(row[key])
+
+    def _fetch(self, table, ids):
+        key, columns = TABLES[table]
+        return self._client.table(table).select(columns).in_(key, sorted(ids)).execute().data or []
+
+    def _store(self, table, ids, rows):
+        self.queries += 1
+        key = TABLES[table][0]
+        cache = self._cache[table]
+        for i in ids:
+            cache[i] = None
+        for row in rows:
+            cache[row[key]] = row
+
+    def _resolve(self, table):
+        ids = self._pending.pop(table, None)
+        if ids:
+            self._store(table, ids, self._fetch(table, ids))
+
+    def resolve_all(self):
+        batches = [(table, ids) for table, ids in self._pending.items() if ids]
+        self._pending.clear()
+        if not batches:
+            return
+        calls = [lambda table=table, ids=ids: self._fetch(table, ids) for table, ids in batches]
+        results = self._fanout.run(*calls) if self._fanout else [call() for call in calls]
+        for (table, ids), rows in zip(batches, results):
+            self._store(table, ids, rows)
+
+    def get(self, table, id):
+        self.want(table, [id])
+        self._resolve(table)
+        return self._cache[table].get(id)
+
+    def get_many(self, table, ids):
+        # {id: row} for the ids that exist, in the order given
+        ids = list(ids)
+        self.want(table, ids)
+        self._resolve(table)
+        cache = self._cache[table]
+        return {i: cache[i] for i in ids if cache.get(i) is not None}
+
+
+def request_loader(client, fanout=None):
+    loader = g.get('loader')
+    if loader is None:
+        loader = g.loader = Loader(client, fanout)
+    return loader
@@ -0,0 +1,232 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_app_context, request
+
+# Prometheus' default latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Route label for queries made outside a request (focus flushes, CLI jobs)
+BACKGROUND = 'background'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Minimal Prometheus metric types; each keeps one series per label tuple and
+# renders itself in the text exposition format (version 0.0.4).
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(self._render_series(key, value) for key, value in series)
+        return '\n'.join(lines)
+
+    def _render_series(self, key, value):
+        return f'{self.name}{_label_text(self.labels, key)} {_number(value)}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _render_series(self, key, value):
+        counts, total, count = value
+        lines = []
+        running = 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            running += n
+            le = f'le="{_number(bound)}"'
+            lines.append(f'{self.name}_bucket{_label_text(self.labels, key, [le])} {running}')
+        lines.append(f'{self.name}_sum{_label_text(self.labels, key)} {_number(total)}')
+        lines.append(f'{self.name}_count{_label_text(self.labels, key)} {count}')
+        return '\n'.join(lines)
+
+
+# Request and database metrics for the Flask app. init_app() hooks request
+# start/end to track latency, status counts and in-flight requests; the
+# database client is wrapped with instrument() so every execute() is timed and
+# attributed to the current route and table. Requests slower than
+# slow_request_ms are printed with the queries they made, in order.
+class Metrics:
+    def __init__(self, slow_request_ms=0):
+        self.slow_request_ms = slow_request_ms
+        self.requests = Counter('teammate_http_requests_total', 'HTTP requests by route, method and status.',
+                                ('route', 'method', 'status'))
+        self.request_seconds = Histogram('teammate_http_request_duration_seconds', 'HTTP request latency.',
+                                         ('route', 'method'))
+        self.in_flight = Gauge('teammate_http_requests_in_flight', 'HTTP requests being handled.', ('route',))
+        self.query_seconds = Histogram('teammate_db_query_duration_seconds', 'Database round trip latency.',
+                                       ('route', 'table', 'op'))
+        self.query_errors = Counter('teammate_db_query_errors_total', 'Database round trips that raised.',
+                                    ('route', 'table', 'op'))
+        self.request_queries = Histogram('teammate_db_queries_per_request', 'Database round trips per request.',
+                                         ('route',), buckets=QUERY_COUNT_BUCKETS)
+        self.slow_requests = Counter('teammate_slow_requests_total', 'Requests over the slow request threshold.',
+                                     ('route',))
+        self._all = [self.requests, self.request_seconds, self.in_flight, self.query_seconds,
+                     self.query_errors, self.request_queries, self.slow_requests]
+
+    def instrument(self, client):
+        return InstrumentedClient(client, self) if client is not None else None
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def render(self):
+        return '\n'.join(m.render() for m in self._all) + '\n'
+
+    # ---- request hooks ----
+
+    def _route(self):
+        rule = request.url_rule
+        return rule.rule if rule is not None else 'unmatched'
+
+    def _before(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_route = self._route()
+        g.db_queries = []
+        self.in_flight.inc(g.metrics_route)
+
+    def _after(self, response):
+        start = g.get('metrics_start')
+        if start is None:
+            return response
+        route = g.metrics_route
+        elapsed = time.perf_counter() - start
+        queries = g.db_queries
+        self.requests.inc(route, request.method, str(response.status_code))
+        self.request_seconds.observe(route, request.method, value=elapsed)
+        self.request_queries.observe(route, value=len(queries))
+        if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+            self.slow_requests.inc(route)
+            steps = ', '.join(f'{table}.{op} {ms:.1f}ms' for table, op, ms in queries) or 'no queries'
+            print(f"Slow request: {request.method} {request.path} ({route}) {elapsed * 1000:.0f}ms, "
+                  f"{len(queries)} queries: {steps}")
+        return response
+
+    def _teardown(self, error=None):
+        route = g.pop('metrics_route', None)
+        if route is not None:
+            self.in_flight.dec(route)
+
+    # ---- database hooks ----
+
+    def record_query(self, table, op, seconds, failed=False):
+        route = BACKGROUND
+        if has_app_context():
+            route = g.get('metrics_route', BACKGROUND)
+            queries = g.get('db_queries')
+            if queries is not None:
+                queries.append((table, op, seconds * 1000))
+        self.query_seconds.observe(route, table, op, value=seconds)
+        if failed:
+            self.query_errors.inc(route, table, op)
+
+
+# Query builder methods that decide the operation of a table() chain
+OPERATIONS = ('select', 'insert', 'upsert', 'update', 'delete')
+
+
+# Wraps a storage client (supabase-py or SQLiteClient) so each execute() is
+# reported to Metrics. Builder calls pass through and are re-wrapped, since
+# supabase-py returns a new builder object from most of them.
+class InstrumentedClient:
+    def __init__(self, client, metrics):
+        self._client = client
+        self._metrics = metrics
+
+    def table(self, name):
+        return _InstrumentedQuery(self._client.table(name), self._metrics, name, 'select')
+
+    def rpc(self, name, params=None):
+        return _InstrumentedQuery(self._client.rpc(name, params or {}), self._metrics, f'rpc:{name}', 'rpc')
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _InstrumentedQuery:
+    def __init__(self, query, metrics, table, op):
+        self._query = query
+        self._metrics = metrics
+        self._table = table
+        self._op = op
+
+    def execute(self):
+        start = time.perf_counter()
+        try:
+            result = self._query.execute()
+        except Exception:
+            self._metrics.record_query(self._table, self._op, time.perf_counter() - start, failed=True)
+            raise
+        self._metrics.record_query(self._table, self._op, time.perf_counter() - start)
+        return result
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+        op = name if name in OPERATIONS else self._op
+
+        def call(*args, **kwargs):
+            return _InstrumentedQuery(attr(*args, **kwargs), self._metrics, self._table, op)
+        return call
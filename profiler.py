@@ -0,0 +1,159 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import quote, unquote
+
+from flask import g, request
+
+SUFFIX = '.collapsed'
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    # ';' separates frames in the collapsed format
+    name = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+    return name.replace(';', ':')
+
+
+# Samples one thread's Python stack every interval seconds from a helper
+# thread. Unlike cProfile this does not hook every call, so the profiled
+# request runs at close to full speed and the overhead is bounded by the
+# sampling interval.
+class StackSampler:
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()  # tuple of frame names, outermost first -> samples
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+
+# Opt-in per-request profiling. A request is profiled when it carries
+# X-Profile: <token> (only when a token is configured) or falls in the
+# sample_rate fraction; at most max_concurrent requests are profiled at once
+# and the rest run untouched. Each profile is written to directory as one
+# collapsed-stack file (flamegraph.pl / speedscope / inferno input) whose name
+# records the route, so aggregate() can merge them per route.
+class RequestProfiler:
+    def __init__(self, directory='profiles', sample_rate=0.0, token=None, interval=0.005, max_concurrent=2):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token
+        self.interval = interval
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self.profiled = 0
+        self.skipped = 0
+
+    @property
+    def enabled(self):
+        return bool(self.sample_rate or self.token)
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def _requested(self):
+        header = request.headers.get('X-Profile')
+        return bool(header and self.token and hmac.compare_digest(header, self.token))
+
+    def _before(self):
+        if not self.enabled:
+            return
+        requested = self._requested()
+        if not requested and random.random() >= self.sample_rate:
+            return
+        if not self._slots.acquire(blocking=False):
+            self.skipped += 1
+            return
+        g.profile_requested = requested
+        g.profile_sampler = StackSampler(threading.get_ident(), self.interval).start()
+
+    def _after(self, response):
+        sampler = g.pop('profile_sampler', None)
+        if sampler is None:
+            return response
+        try:
+            rule = request.url_rule
+            path = self._write(request.method, rule.rule if rule is not None else 'unmatched', sampler.stop())
+        finally:
+            self._slots.release()
+        if g.get('profile_requested'):
+            response.headers['X-Profile-File'] = os.path.basename(path)
+        return response
+
+    def _teardown(self, error=None):
+        # Requests that failed before after_request still free their slot
+        sampler = g.pop('profile_sampler', None)
+        if sampler is not None:
+            sampler.stop()
+            self._slots.release()
+
+    def _write(self, method, route, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.time_ns()}-{os.getpid()}-{quote(f'{method} {route}', safe='')}{SUFFIX}"
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            for stack, count in stacks.items():
+                f.write(f"{';'.join(stack)} {count}\n")
+        self.profiled += 1
+        return path
+
+
+def _route_of(filename):
+    # '<ns>-<pid>-<quoted "METHOD /rule">.collapsed' -> 'METHOD /rule'
+    return unquote(filename[:-len(SUFFIX)].split('-', 2)[2])
+
+
+def read_collapsed(path):
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+
+def aggregate(directory):
+    # {'METHOD /rule': (profile count, Counter of collapsed stack -> samples)}
+    profiles = defaultdict(int)
+    stacks = defaultdict(Counter)
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(SUFFIX) or filename.count('-') < 2:
+            continue
+        route = _route_of(filename)
+        profiles[route] += 1
+        stacks[route].update(read_collapsed(os.path.join(directory, filename)))
+    return {route: (profiles[route], stacks[route]) for route in profiles}
+
+
+def self_time(stacks, top=10):
+    # Frames with the most samples at the top of the stack
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(';', 1)[-1]] += count
+    return leaves.most_common(top)
@@ -0,0 +1,214 @@
+import contextvars
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import g, has_app_context
+
+from metrics import OPERATIONS
+
+try:
+    import httpx
+    TRANSPORT_ERRORS = (TimeoutError, ConnectionError, sqlite3.OperationalError, httpx.TransportError)
+except ImportError:
+    TRANSPORT_ERRORS = (TimeoutError, ConnectionError, sqlite3.OperationalError)
+
+# SQLSTATE classes that mean the database, not the query, is in trouble:
+# connection exceptions, insufficient resources, operator intervention
+# (includes statement timeouts) and system errors
+OUTAGE_SQLSTATES = ('08', '53', '57', '58')
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'Database unavailable, retry in {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+
+class StorageTimeout(TimeoutError):
+    pass
+
+
+def is_outage(error):
+    # True for errors that say nothing about the query itself: timeouts,
+    # dropped connections, gateway 5xx answers and the SQLSTATE classes above.
+    # Constraint violations and bad filters are the database answering.
+    if isinstance(error, TRANSPORT_ERRORS + (CircuitOpenError,)):
+        return True
+    code = str(getattr(error, 'code', '') or '')
+    return (len(code) == 3 and code.startswith('5')) or code[:2] in OUTAGE_SQLSTATES
+
+
+# Consecutive-failure circuit breaker. After failure_threshold outage errors
+# in a row the circuit opens and calls are refused without touching the
+# database for reset_timeout seconds; then one probe call is let through
+# (half-open) and its outcome closes or re-opens the circuit.
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0        # times the circuit opened
+        self.rejected = 0      # calls refused while open
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def is_open(self):
+        # Open and not yet due for a probe
+        with self._lock:
+            return self.state == 'open' and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def retry_after(self):
+        with self._lock:
+            if self.state == 'closed':
+                return 0.0
+            return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = 'closed'
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == 'half_open' or (self.state == 'closed' and self._failures >= self.failure_threshold):
+                if self.state == 'closed':
+                    self.opened += 1
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self._failures,
+                    'opened': self.opened, 'rejected': self.rejected}
+
+
+# Wraps a storage client so every execute() goes through the breaker. Reads
+# (selects) that fail with an outage error are retried up to `retries` times
+# after a full-jitter backoff, never past the request deadline (g.deadline,
+# shared with FanOut). Writes and rpc calls run once, since they may have
+# landed before the error. With hedge_after (seconds) a read still running
+# after that long is sent a second time and the first answer wins; hedged
+# calls run on a small pool and are abandoned after `timeout` seconds. The
+# transport's own timeout (see storage.create_client) bounds every call.
+class ResilientClient:
+    def __init__(self, client, breaker, retries=2, backoff=0.05, hedge_after=None, timeout=10.0, max_workers=16):
+        self._client = client
+        self.breaker = breaker
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge') if hedge_after else None
+        self._lock = threading.Lock()
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def table(self, name):
+        return _ResilientQuery(self._client.table(name), self, 'select')
+
+    def rpc(self, name, params=None):
+        return _ResilientQuery(self._client.rpc(name, params or {}), self, 'rpc')
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def execute(self, query, op):
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.retry_after())
+        attempts = 1 + (self.retries if op == 'select' else 0)
+        for attempt in range(attempts):
+            try:
+                result = self._hedged(query) if self._pool and op == 'select' else query.execute()
+            except Exception as e:
+                if not is_outage(e):
+                    self.breaker.record_success()
+                    raise
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                if attempt + 1 == attempts or not self._may_retry(delay):
+                    self.breaker.record_failure()
+                    raise
+                self._count('retried')
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _may_retry(self, delay):
+        if self.breaker.state != 'closed':
+            return False
+        deadline = g.get('deadline') if has_app_context() else None
+        return deadline is None or time.monotonic() + delay < deadline
+
+    def _hedged(self, query):
+        start = time.monotonic()
+        submit = lambda: self._pool.submit(contextvars.copy_context().run, query.execute)  # noqa: E731
+        futures = [submit()]
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            futures.append(submit())
+            self._count('hedged')
+        pending, error = set(futures), None
+        while pending:
+            remaining = max(start + self.timeout - time.monotonic(), 0)
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        if pending:
+            raise StorageTimeout(f'Read still running after {self.timeout:.1f}s')
+        raise error
+
+    def stats(self):
+        with self._lock:
+            counters = {'retried': self.retried, 'hedged': self.hedged, 'hedge_wins': self.hedge_wins}
+        return dict(self.breaker.stats(), **counters)
+
+
+class _ResilientQuery:
+    def __init__(self, query, client, op):
+        self._query = query
+        self._client = client
+        self._op = op
+
+    def execute(self):
+        return self._client.execute(self._query, self._op)
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+        op = name if name in OPERATIONS else self._op
+
+        def call(*args, **kwargs):
+            return _ResilientQuery(attr(*args, **kwargs), self._client, op)
+        return call
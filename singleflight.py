@@ -0,0 +1,194 @@
+import threading
+import time
+
+# Builder calls that narrow a select without depending on their order
+FILTERS = {'eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'in_', 'is_', 'like', 'ilike', 'contains', 'filter'}
+WRITES = {'insert', 'upsert', 'update', 'delete'}
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_freeze(v) for v in value]
+        try:
+            return tuple(sorted(items))
+        except TypeError:
+            return tuple(items)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class _Result:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = len(data) if count is None else count
+
+
+class _Call:
+    def __init__(self, table):
+        self.table = table
+        self.event = threading.Event()
+        self.waiters = 0
+        self.rows = None       # snapshot handed to waiters and TTL hits
+        self.count = None
+        self.error = None
+        self.expires_at = None # set once finished, while it may serve TTL hits
+
+
+# Single-flight layer in front of the read queries. Selects are keyed by the
+# normalized query: table, columns, the set of filters, and the order/limit
+# calls in sequence. While a query is in flight, identical queries from other
+# threads wait for it and get a copy of its rows instead of going to the
+# database. With ttl > 0 the finished result also answers identical queries
+# for that many seconds. Any write through the wrapped client (or an rpc)
+# drops the cached results of the tables involved, so a request always reads
+# its own writes.
+class SingleFlight:
+    def __init__(self, ttl=0.0, max_entries=10000, enabled=True):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls = {}       # key -> _Call, in flight or cached
+        self._generation = 0   # bumped by every write
+        self.executed = 0      # queries sent to the database
+        self.shared = 0        # answered by joining an in-flight query
+        self.cached = 0        # answered by a finished query within ttl
+
+    def wrap(self, client):
+        return SingleFlightClient(client, self) if self.enabled else client
+
+    def do(self, key, table, execute):
+        now = time.monotonic()
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.expires_at is not None:
+                if call.expires_at > now:
+                    self.cached += 1
+                    return _Result([dict(row) for row in call.rows], call.count)
+                del self._calls[key]
+                call = None
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(table)
+                generation = self._generation
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return _Result([dict(row) for row in call.rows], call.count)
+
+        try:
+            result = execute()
+        except Exception as e:
+            with self._lock:
+                call.error = e
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.event.set()
+            raise
+        with self._lock:
+            if call.waiters or self.ttl > 0:
+                # Waiters and TTL hits get copies, since handlers may edit rows
+                call.rows = [dict(row) for row in (result.data or [])]
+                call.count = getattr(result, 'count', None)
+            if self._calls.get(key) is not call:
+                pass   # detached by a write; later reads already went to the database
+            elif self.ttl > 0 and generation == self._generation and self._room():
+                call.expires_at = time.monotonic() + self.ttl
+            else:
+                del self._calls[key]
+        call.event.set()
+        return result
+
+    def _room(self):
+        # Called with the lock held; sweeps expired results once full
+        if len(self._calls) <= self.max_entries:
+            return True
+        now = time.monotonic()
+        for key, call in list(self._calls.items()):
+            if call.expires_at is not None and call.expires_at <= now:
+                del self._calls[key]
+        return len(self._calls) <= self.max_entries
+
+    def invalidate(self, table=None):
+        # Forget results for table (all tables when None). Queries in flight
+        # keep their current waiters, but reads from now on do not join them,
+        # since they may have started before the write.
+        with self._lock:
+            self._generation += 1
+            for key, call in list(self._calls.items()):
+                if table is None or call.table == table:
+                    del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            answered = self.executed + self.shared + self.cached
+            return {
+                'executed': self.executed,
+                'shared': self.shared,
+                'cached': self.cached,
+                'in_flight': sum(1 for call in self._calls.values() if call.expires_at is None),
+                'cached_results': sum(1 for call in self._calls.values() if call.expires_at is not None),
+                'coalescing_ratio': round((self.shared + self.cached) / answered, 4) if answered else 0.0
+            }
+
+
+class SingleFlightClient:
+    def __init__(self, client, flight):
+        self._client = client
+        self._flight = flight
+
+    def table(self, name):
+        return _SingleFlightQuery(self._client.table(name), self._flight, name, ())
+
+    def rpc(self, name, params=None):
+        # Database functions write; results are passed through
+        return _SingleFlightQuery(self._client.rpc(name, params or {}), self._flight, None, (('rpc', name),))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _SingleFlightQuery:
+    def __init__(self, query, flight, table, calls):
+        self._query = query
+        self._flight = flight
+        self._table = table
+        self._calls = calls    # ((method, args, kwargs), ...) so far
+
+    def _key(self):
+        filters = sorted((c for c in self._calls if c[0] in FILTERS), key=repr)
+        rest = tuple(c for c in self._calls if c[0] not in FILTERS)
+        return self._table, tuple(filters), rest
+
+    def execute(self):
+        methods = {c[0] for c in self._calls}
+        if self._table is None or methods & WRITES:
+            try:
+                return self._query.execute()
+            finally:
+                self._flight.invalidate(self._table)
+        try:
+            key = self._key()
+            hash(key)
+        except TypeError:
+            return self._query.execute()
+        return self._flight.do(key, self._table, self._query.execute)
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if name == 'select' and args:
+                args = (','.join(c.strip() for c in args[0].split(',')),) + args[1:]
+            # Write payloads never become part of a key
+            frozen = (name,) if name in WRITES else (name, _freeze(args), _freeze(kwargs))
+            return _SingleFlightQuery(attr(*args, **kwargs), self._flight, self._table, self._calls + (frozen,))
+        return call
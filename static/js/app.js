@@ -0,0 +1,1631 @@
+let currentUser = null;
+let productivityChart = null;
+let sessionActive = false;
+let sessionStartTime = null;
+let sessionTimer = null;
+let sessionDuration = 0;
+let sessionHeartbeat = null;
+let focusSent = 0; // seconds of the current session already sent
+const FOCUS_HEARTBEAT_MS = 60000;
+
+// Sprites are drawn by css/sprites.css from the data-sprite attribute
+function setSprite(el, name) {
+    el.dataset.sprite = name;
+}
+
+function setCloudyEyes(closed) {
+    const img = document.getElementById('cloudySprite');
+    if (!img) return;
+    
+    // Fade out
+    img.style.opacity = '0';
+    
+    // Change image after fade completes
+    setTimeout(() => {
+        setSprite(img, closed ? 'cloudy_eyes_closed' : 'cloudy');
+        // Fade back in
+        img.style.opacity = '1';
+    }, 150);
+}
+
+// Initialize password field listeners when DOM is ready
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('#loginForm input[type="password"], #signupForm input[type="password"]').forEach(inp => {
+        inp.addEventListener('focus', () => setCloudyEyes(true));
+        inp.addEventListener('blur', () => setCloudyEyes(false));
+    });
+});
+
+// Also set up listeners immediately for already-loaded elements
+document.querySelectorAll('#loginForm input[type="password"], #signupForm input[type="password"]').forEach(inp => {
+    inp.addEventListener('focus', () => setCloudyEyes(true));
+    inp.addEventListener('blur', () => setCloudyEyes(false));
+});
+
+// Auth Tab Switching
+document.getElementById('loginTab').addEventListener('click', () => {
+    document.getElementById('loginForm').classList.add('active');
+    document.getElementById('signupForm').classList.remove('active');
+    document.getElementById('loginTab').classList.add('active');
+    document.getElementById('signupTab').classList.remove('active');
+});
+
+document.getElementById('signupTab').addEventListener('click', () => {
+    document.getElementById('signupForm').classList.add('active');
+    document.getElementById('loginForm').classList.remove('active');
+    document.getElementById('signupTab').classList.add('active');
+    document.getElementById('loginTab').classList.remove('active');
+});
+
+// Login Form
+document.getElementById('loginForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const username = e.target[0].value;
+    const password = e.target[1].value;
+    
+    if (!username || !password) {
+        alert('Please enter username and password');
+        return;
+    }
+    
+    try {
+        const res = await fetch('/api/login', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({username, password})
+        });
+        const data = await res.json();
+        console.log('Login response:', data, 'Status:', res.status);
+        if (data.success) {
+            currentUser = data.user_id;
+            showApp();
+        } else {
+            alert(data.error || 'Login failed');
+        }
+    } catch (err) {
+        console.error('Login error:', err);
+        alert('Login failed: ' + err);
+    }
+});
+
+// Signup Form
+document.getElementById('signupForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const username = e.target[0].value;
+    const password = e.target[1].value;
+    const confirmPassword = e.target[2].value;
+    
+    if (!username || !password || !confirmPassword) {
+        alert('Please fill in all fields');
+        return;
+    }
+    
+    if (password !== confirmPassword) {
+        alert('Passwords do not match');
+        return;
+    }
+    
+    if (password.length < 6) {
+        alert('Password must be at least 6 characters');
+        return;
+    }
+    
+    try {
+        const res = await fetch('/api/signup', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({username, password})
+        });
+        const data = await res.json();
+        console.log('Signup response:', data, 'Status:', res.status);
+        if (data.success) {
+            currentUser = data.user_id;
+            showApp();
+        } else {
+            alert(data.error || 'Signup failed');
+        }
+    } catch (err) {
+        console.error('Signup error:', err);
+        alert('Signup failed: ' + err);
+    }
+});
+
+// Show app after login
+function showApp() {
+    document.getElementById('authModal').classList.remove('active');
+    document.getElementById('appContainer').classList.remove('hidden');
+    loadBootstrap();
+}
+
+// Initial state for every tab in one request (also updates the garden once per session)
+async function loadBootstrap() {
+    try {
+        const {from, to} = dashboardWindow();
+        const params = new URLSearchParams({from, to, fields: 'id,date,task_name,tasks_completed', limit: 500});
+        const res = await fetch(`/api/bootstrap?${params}`);
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const data = await res.json();
+        
+        if (data.dashboard.next_cursor) {
+            loadDashboard(); // more than one page in the window
+        } else {
+            renderDashboard(data.dashboard.tasks || [], data.dashboard.summary || []);
+            pullTodos();
+        }
+        renderFriends(data.friend_requests || [], data.friends || []);
+        renderGroups(data.groups || []);
+        if (data.profile) renderProfile(data.profile);
+    } catch (err) {
+        console.error('Bootstrap error:', err);
+        loadDashboard();
+        loadAllData();
+        updateGardenState();
+    }
+}
+
+// Logout
+document.getElementById('logoutBtn').addEventListener('click', async () => {
+    await fetch('/api/logout', {method: 'POST'});
+    location.reload();
+});
+
+// Tab Navigation
+document.querySelectorAll('.nav-tab').forEach(tab => {
+    tab.addEventListener('click', (e) => {
+        e.preventDefault();
+        const tabName = tab.getAttribute('data-tab');
+        
+        document.querySelectorAll('.tab-content').forEach(content => {
+            content.classList.remove('active');
+        });
+        document.querySelectorAll('.nav-tab').forEach(t => {
+            t.classList.remove('active');
+        });
+        
+        document.getElementById(tabName).classList.add('active');
+        tab.classList.add('active');
+        
+        if (tabName === 'dashboard') loadDashboard();
+        if (tabName === 'garden') loadGarden();
+        if (tabName === 'friends') loadFriends();
+        if (tabName === 'groups') loadGroups();
+        if (tabName === 'profile') loadProfile();
+        if (tabName === 'leaderboard') loadLeaderboard();
+    });
+});
+
+function isoDate(d) {
+    return `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, '0')}-${String(d.getDate()).padStart(2, '0')}`;
+}
+
+// Dashboard date window: the visible calendar month plus the last 7 days
+function dashboardWindow() {
+    const monthStart = isoDate(new Date(currentMonth.getFullYear(), currentMonth.getMonth(), 1));
+    const monthEnd = isoDate(new Date(currentMonth.getFullYear(), currentMonth.getMonth() + 1, 0));
+    const weekAgo = new Date();
+    weekAgo.setDate(weekAgo.getDate() - 6);
+    const weekStart = isoDate(weekAgo);
+    const today = isoDate(new Date());
+    return {
+        from: monthStart < weekStart ? monthStart : weekStart,
+        to: monthEnd > today ? monthEnd : today
+    };
+}
+
+// Fetch the window's tasks page by page, plus the per-day summary
+async function fetchDashboard() {
+    const {from, to} = dashboardWindow();
+    const params = new URLSearchParams({from, to, fields: 'id,date,task_name,tasks_completed', limit: 500});
+    let tasks = [];
+    let summary = [];
+    let cursor = null;
+    do {
+        if (cursor) params.set('cursor', cursor);
+        const res = await fetch(`/api/dashboard?${params}`);
+        const data = await res.json();
+        tasks = tasks.concat(data.tasks || []);
+        if (data.summary) summary = data.summary;
+        cursor = data.next_cursor;
+    } while (cursor);
+    return {tasks, summary};
+}
+
+// Load Dashboard with Chart (Line Chart)
+async function loadDashboard() {
+    try {
+        const {tasks, summary} = await fetchDashboard();
+        renderDashboard(tasks, summary);
+        pullTodos();
+    } catch (err) {
+        console.log('Dashboard load error:', err);
+    }
+}
+
+// Per-day chart data by date; sync responses patch the days they touch
+let dashboardSummary = {};
+
+function renderDashboard(tasks, summary) {
+    // The todo store itself is kept current by pullTodos()
+    dashboardSummary = {};
+    summary.forEach(d => dashboardSummary[d.date] = d);
+    renderCalendar();
+    renderChart();
+    
+    // Load calendar and todos
+    initializeCalendar();
+    displayTasksList(tasks);
+}
+
+function renderChart() {
+    // Completed tasks and focus time for the last 7 days, from the server summary
+    const summaryByDate = dashboardSummary;
+    
+    const sortedDates = [];
+    for (let i = 6; i >= 0; i--) {
+        const d = new Date();
+        d.setDate(d.getDate() - i);
+        sortedDates.push(isoDate(d));
+    }
+    const taskCounts = sortedDates.map(date => summaryByDate[date]?.completed || 0);
+    const focusTimes = sortedDates.map(date => {
+        // Focus time in minutes (stored in seconds)
+        const time = (summaryByDate[date]?.focus_time || 0) / 60;
+        return Math.round(time * 10) / 10; // Round to 1 decimal place
+    });
+    
+    const ctx = document.getElementById('productivityChart');
+    if (productivityChart) productivityChart.destroy();
+    
+    productivityChart = new Chart(ctx, {
+        type: 'line',
+        data: {
+            labels: sortedDates,
+            datasets: [
+                {
+                    label: 'Tasks Completed',
+                    data: taskCounts,
+                    borderColor: '#7f4ca5',
+                    backgroundColor: 'rgba(127, 76, 165, 0.1)',
+                    borderWidth: 2,
+                    borderDash: [5, 5],
+                    pointRadius: 6,
+                    pointBackgroundColor: '#4b1c71',
+                    pointBorderColor: '#7f4ca5',
+                    pointBorderWidth: 2,
+                    tension: 0.4,
+                    fill: true,
+                    yAxisID: 'y'
+                },
+                {
+                    label: 'Focus Time (minutes)',
+                    data: focusTimes,
+                    borderColor: '#ff69b4',
+                    backgroundColor: 'rgba(255, 105, 180, 0.1)',
+                    borderWidth: 2,
+                    borderDash: [5, 5],
+                    pointRadius: 6,
+                    pointBackgroundColor: '#ff1493',
+                    pointBorderColor: '#ff69b4',
+                    pointBorderWidth: 2,
+                    tension: 0.4,
+                    fill: true,
+                    yAxisID: 'y1'
+                }
+            ]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: true,
+            interaction: {
+                mode: 'index',
+                intersect: false
+            },
+            plugins: {
+                legend: {
+                    labels: {color: '#4b1c71'}
+                }
+            },
+            scales: {
+                x: {
+                    ticks: {color: '#4b1c71'},
+                    grid: {color: '#dbb6ee'}
+                },
+                y: {
+                    type: 'linear',
+                    display: true,
+                    position: 'left',
+                    beginAtZero: true,
+                    ticks: {
+                        color: '#4b1c71',
+                        stepSize: 1,
+                        callback: function(value) {
+                            return Math.floor(value);
+                        }
+                    },
+                    grid: {color: '#dbb6ee'},
+                    title: {
+                        display: true,
+                        text: 'Tasks'
+                    }
+                },
+                y1: {
+                    type: 'linear',
+                    display: true,
+                    position: 'right',
+                    beginAtZero: true,
+                    ticks: {
+                        color: '#ff69b4',
+                        stepSize: 0.5,
+                        callback: function(value) {
+                            return value.toFixed(1);
+                        }
+                    },
+                    grid: {drawOnChartArea: false},
+                    title: {
+                        display: true,
+                        text: 'Focus Time (min)'
+                    }
+                }
+            }
+        }
+    });
+}
+
+// Display tasks list (read-only log)
+function displayTasksList(tasks) {
+    const html = tasks.length ? tasks.map((t, idx) => `
+        <div class="task-item">
+            <div class="task-info">
+                <strong>${t.task_name || 'Task'}</strong>
+                <span class="task-date">${t.date}</span>
+            </div>
+        </div>
+    `).join('') : '<p>No task history yet</p>';
+    document.getElementById('tasksList').innerHTML = html;
+}
+
+// Load Garden
+async function loadGarden() {
+    try {
+        // First update garden state (check if should grow/die)
+        const updateRes = await updateGardenState();
+        
+        // Fetch garden state
+        const gardenRes = await fetch('/api/garden-state');
+        const gardenData = await gardenRes.json();
+        
+        // Calculate completion % from LOCAL todos
+        const today = new Date().toISOString().split('T')[0];
+        const todayTodos = todos[today] || [];
+        const completed = todayTodos.filter(t => t.completed).length;
+        const total = todayTodos.length;
+        const percentage = total > 0 ? Math.round((completed / total) * 100) : 0;
+        
+        // Update stats
+        document.getElementById('taskCompletionPercent').textContent = `${percentage}%`;
+        document.getElementById('blockCount').textContent = gardenData.block_count || 0;
+        
+        // Update cloudy reaction with inactivity info
+        updateCloudyReaction(percentage, gardenData, updateRes?.days_inactive || 0);
+        
+        // Render garden grid
+        renderGardenGrid(gardenData.block_count || 0, gardenData.is_dead || false);
+        
+    } catch (err) {
+        console.log('Garden load error:', err);
+    }
+}
+
+function updateCloudyReaction(percentage, gardenData, daysInactive = 0) {
+    const reactionImg = document.getElementById('cloudyReaction');
+    const messageEl = document.getElementById('cloudyMessage');
+    
+    if (gardenData.is_dead) {
+        setSprite(reactionImg, 'cloudy_sad');
+        messageEl.textContent = "Your garden died... Start fresh today!";
+    } else if (daysInactive >= 2) {
+        // Day 2+ of inactivity: Cloudy gets ANGRY
+        setSprite(reactionImg, 'cloudy_angry');
+        messageEl.textContent = "I'm getting angry! Do some tasks! 😠";
+    } else if (daysInactive >= 1) {
+        // Day 1 of inactivity: Cloudy gets SAD
+        setSprite(reactionImg, 'cloudy_sad');
+        messageEl.textContent = "I'm sad... You haven't done anything today. 😢";
+    } else if (percentage >= 60) {
+        setSprite(reactionImg, 'cloudy');
+        messageEl.textContent = "Great job! Your garden is thriving! 🌱";
+    } else if (percentage >= 40) {
+        setSprite(reactionImg, 'cloudy');
+        messageEl.textContent = "Good progress! Keep it up tomorrow!";
+    } else if (percentage > 0) {
+        setSprite(reactionImg, 'cloudy_disappointed');
+        messageEl.textContent = "You can do better! Complete more tasks.";
+    } else {
+        setSprite(reactionImg, 'cloudy_disappointed');
+        messageEl.textContent = "No tasks completed today. Let's try tomorrow!";
+    }
+}
+
+function renderGardenGrid(blockCount, isDead) {
+    const container = document.getElementById('gardenGrid');
+    container.innerHTML = '';
+    
+    // Get today's completion to show pending blocks
+    const today = new Date().toISOString().split('T')[0];
+    const todayTodos = todos[today] || [];
+    const completed = todayTodos.filter(t => t.completed).length;
+    const total = todayTodos.length;
+    const percentage = total > 0 ? Math.round((completed / total) * 100) : 0;
+    
+    // If 60%+ with 0 blocks, show 1 pending block
+    const shouldShowPendingBlock = percentage >= 60 && blockCount === 0 && total > 0;
+    const displayBlockCount = shouldShowPendingBlock ? 1 : blockCount;
+    
+    if (isDead || (blockCount === 0 && !shouldShowPendingBlock)) {
+        const emptyMsg = document.createElement('p');
+        emptyMsg.textContent = isDead ? 'Garden died from inactivity. Plant a new one!' : 'Complete tasks to grow your garden!';
+        emptyMsg.style.textAlign = 'center';
+        emptyMsg.style.color = 'var(--text)';
+        container.appendChild(emptyMsg);
+        
+        // Add replant button for dead gardens
+        if (isDead) {
+            const replantBtn = document.createElement('button');
+            replantBtn.textContent = '🌱 Plant New Garden';
+            replantBtn.style.marginTop = '20px';
+            replantBtn.style.padding = '10px 20px';
+            replantBtn.style.backgroundColor = 'var(--primary)';
+            replantBtn.style.color = 'white';
+            replantBtn.style.border = 'none';
+            replantBtn.style.borderRadius = '5px';
+            replantBtn.style.cursor = 'pointer';
+            replantBtn.style.fontSize = '1rem';
+            replantBtn.onclick = async () => {
+                try {
+                    const res = await fetch('/api/replant-garden', { method: 'POST' });
+                    if (res.ok) {
+                        loadGarden();
+                    }
+                } catch (err) {
+                    console.error('Replant error:', err);
+                }
+            };
+            container.appendChild(replantBtn);
+        }
+        return;
+    }
+    
+    // Show blocks (either saved or pending)
+    if (shouldShowPendingBlock) {
+        const pendingNote = document.createElement('div');
+        pendingNote.style.textAlign = 'center';
+        pendingNote.style.fontSize = '0.9rem';
+        pendingNote.style.color = 'var(--text-muted)';
+        pendingNote.style.marginBottom = '10px';
+        pendingNote.textContent = '✨ Earning garden block... (Sync to save)';
+        container.appendChild(pendingNote);
+    }
+    
+    // Arrange blocks in a pyramid pattern
+    // Pattern: 1, 2, 3, 2, 1 (or less depending on block count)
+    const patterns = [
+        [1],
+        [1, 1],
+        [1, 2, 1],
+        [2, 2, 1],
+        [2, 3, 2],
+        [2, 3, 2, 1],
+        [3, 3, 2, 1],
+        [3, 3, 3, 1]
+    ];
+    
+    const pattern = patterns[Math.min(displayBlockCount - 1, patterns.length - 1)];
+    let blockIndex = 0;
+    
+    pattern.forEach(rowCount => {
+        const row = document.createElement('div');
+        row.className = 'garden-row';
+        
+        for (let i = 0; i < rowCount && blockIndex < displayBlockCount; i++) {
+            const block = document.createElement('div');
+            block.className = 'garden-block sprite';
+            setSprite(block, 'garden_block');
+            row.appendChild(block);
+            blockIndex++;
+        }
+        
+        container.appendChild(row);
+    });
+    
+    // Add sync button
+    if (shouldShowPendingBlock) {
+        const syncBtn = document.createElement('button');
+        syncBtn.textContent = '💾 Sync Garden';
+        syncBtn.style.marginTop = '20px';
+        syncBtn.style.padding = '10px 20px';
+        syncBtn.style.backgroundColor = 'var(--primary)';
+        syncBtn.style.color = 'white';
+        syncBtn.style.border = 'none';
+        syncBtn.style.borderRadius = '5px';
+        syncBtn.style.cursor = 'pointer';
+        syncBtn.style.fontSize = '0.9rem';
+        syncBtn.onclick = async () => {
+            try {
+                syncBtn.disabled = true;
+                syncBtn.textContent = 'Syncing...';
+                const res = await fetch('/api/update-garden', { method: 'POST' });
+                const data = await res.json();
+                console.log('Garden sync response:', data);
+                loadGarden();
+            } catch (err) {
+                console.error('Sync error:', err);
+                syncBtn.disabled = false;
+                syncBtn.textContent = '💾 Sync Garden';
+            }
+        };
+        container.appendChild(syncBtn);
+    }
+}
+
+// Check and update garden state daily
+async function updateGardenState() {
+    try {
+        const res = await fetch('/api/update-garden', { method: 'POST' });
+        const data = await res.json();
+        return data;
+    } catch (err) {
+        console.error('Garden update error:', err);
+        return null;
+    }
+}
+
+// Load Friends
+async function loadFriends() {
+    try {
+        // Load friend requests and friends list
+        const [requestsData, friendsData] = await Promise.all([
+            fetch('/api/friend-requests').then(res => res.json()),
+            fetch('/api/friends').then(res => res.json())
+        ]);
+        renderFriends(requestsData.requests || [], friendsData.friends || []);
+    } catch (err) {
+        console.log('Friends load error:', err);
+    }
+}
+
+function renderFriends(requests, friends) {
+    // Render friend requests
+    document.getElementById('requestCount').textContent = `(${requests.length})`;
+    let requestsHtml = '';
+    if (requests.length === 0) {
+        requestsHtml = '<p style="color: var(--text-muted);">No pending requests</p>';
+    } else {
+        requestsHtml = requests.map(r => `
+            <div style="background: white; padding: 10px; margin: 8px 0; border-radius: 5px; display: flex; justify-content: space-between; align-items: center;">
+                <span><strong>${r.from_username}</strong> sent a friend request</span>
+                <div>
+                    <button style="padding: 5px 10px; background: var(--primary); color: white; border: none; border-radius: 4px; cursor: pointer; margin-right: 5px;" onclick="acceptFriendRequest(${r.request_id})">✓ Accept</button>
+                    <button style="padding: 5px 10px; background: #666; color: white; border: none; border-radius: 4px; cursor: pointer;" onclick="declineFriendRequest(${r.request_id})">✗ Decline</button>
+                </div>
+            </div>
+        `).join('');
+    }
+    document.getElementById('friendRequests').innerHTML = requestsHtml;
+    
+    // Render friends list
+    let friendsHtml = '';
+    if (friends.length === 0) {
+        friendsHtml = '<p style="color: var(--text-muted);">No friends yet. Add someone!</p>';
+    } else {
+        friendsHtml = friends.map(f => `
+            <div style="background: white; padding: 10px; margin: 8px 0; border-radius: 5px; display: flex; justify-content: space-between; align-items: center;">
+                <span><strong>${f.username}</strong></span>
+                <div>
+                    <button style="padding: 5px 10px; background: var(--primary); color: white; border: none; border-radius: 4px; cursor: pointer; margin-right: 5px;" onclick="viewFriendProfile(${f.id}, '${f.username}')">👤 View Profile</button>
+                    <button style="padding: 5px 10px; background: #999; color: white; border: none; border-radius: 4px; cursor: pointer;" onclick="removeFriend(${f.id})">✕ Remove</button>
+                </div>
+            </div>
+        `).join('');
+    }
+    document.getElementById('friendsList').innerHTML = friendsHtml;
+}
+
+// Add Friend by Username
+async function addFriendByUsername() {
+    const username = document.getElementById('friendUsername').value.trim();
+    
+    if (!username) {
+        alert('Please enter a username');
+        return;
+    }
+    
+    try {
+        const res = await fetch('/api/add-friend', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({username: username})
+        });
+        
+        const data = await res.json();
+        
+        if (data.success) {
+            alert('Friend request sent!');
+            document.getElementById('friendUsername').value = '';
+            loadFriends();
+        } else {
+            alert(data.message || 'Failed to send request');
+        }
+    } catch (err) {
+        console.error('Add friend error:', err);
+        alert('Error sending friend request');
+    }
+}
+
+// Accept Friend Request
+async function acceptFriendRequest(requestId) {
+    try {
+        const res = await fetch(`/api/accept-friend-request/${requestId}`, {method: 'POST'});
+        if (res.ok) {
+            loadFriends();
+        }
+    } catch (err) {
+        console.error('Accept request error:', err);
+    }
+}
+
+// Decline Friend Request
+async function declineFriendRequest(requestId) {
+    try {
+        const res = await fetch(`/api/decline-friend-request/${requestId}`, {method: 'POST'});
+        if (res.ok) {
+            loadFriends();
+        }
+    } catch (err) {
+        console.error('Decline request error:', err);
+    }
+}
+
+// Remove Friend
+async function removeFriend(friendId) {
+    if (!confirm('Remove this friend?')) return;
+    
+    try {
+        const res = await fetch(`/api/remove-friend/${friendId}`, {method: 'POST'});
+        if (res.ok) {
+            loadFriends();
+        }
+    } catch (err) {
+        console.error('Remove friend error:', err);
+    }
+}
+
+// View Friend Garden
+async function viewFriendGarden(friendId, friendUsername) {
+    try {
+        const res = await fetch(`/api/friend/${friendId}/garden`);
+        const data = await res.json();
+        
+        if (!data.username || res.status !== 200) {
+            alert(data.message || 'Could not load garden');
+            return;
+        }
+        
+        // Create and show modal
+        const modal = document.createElement('div');
+        modal.style.cssText = 'position: fixed; top: 0; left: 0; right: 0; bottom: 0; background: rgba(0,0,0,0.5); display: flex; justify-content: center; align-items: center; z-index: 1000;';
+        
+        const content = document.createElement('div');
+        content.style.cssText = 'background: white; padding: 30px; border-radius: 10px; max-width: 500px; width: 90%;';
+        
+        let statusText = '🌱 Garden is thriving!';
+        if (data.is_dead) {
+            statusText = '💀 Garden died from inactivity';
+        } else if (data.block_count === 0 && !data.has_garden) {
+            statusText = '🌱 Garden not started yet';
+        } else if (data.block_count === 0) {
+            statusText = '🌱 Garden starting to grow...';
+        }
+        
+        content.innerHTML = `
+            <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 20px;">
+                <h2>${data.username}'s Garden</h2>
+                <button style="background: none; border: none; font-size: 24px; cursor: pointer;" onclick="this.closest('div').parentElement.parentElement.remove()">×</button>
+            </div>
+            <div style="background: var(--bg-light); padding: 20px; border-radius: 8px; text-align: center;">
+                <p style="margin: 10px 0;"><strong>Blocks:</strong> ${data.block_count}</p>
+                <p style="margin: 10px 0; color: var(--text-muted);">${statusText}</p>
+            </div>
+        `;
+        
+        // Simple garden grid display
+        if (!data.is_dead && data.block_count > 0) {
+            const patterns = [[1], [1,1], [1,2,1], [2,2,1], [2,3,2], [2,3,2,1], [3,3,2,1], [3,3,3,1]];
+            const pattern = patterns[Math.min(data.block_count - 1, patterns.length - 1)];
+            let blockIndex = 0;
+            let gridHtml = '<div style="margin-top: 20px; display: flex; flex-direction: column; align-items: center; gap: 8px;">';
+            
+            pattern.forEach(rowCount => {
+                gridHtml += '<div style="display: flex; gap: 8px;">';
+                for (let i = 0; i < rowCount && blockIndex < data.block_count; i++) {
+                    gridHtml += '<div class="sprite" data-sprite="garden_block" style="height: 60px;"></div>';
+                    blockIndex++;
+                }
+                gridHtml += '</div>';
+            });
+            gridHtml += '</div>';
+            content.innerHTML += gridHtml;
+        }
+        
+        modal.appendChild(content);
+        document.body.appendChild(modal);
+        modal.addEventListener('click', (e) => {
+            if (e.target === modal) modal.remove();
+        });
+        
+    } catch (err) {
+        console.error('View garden error:', err);
+        alert('Error loading garden');
+    }
+}
+
+// Load Groups
+async function loadGroups() {
+    try {
+        const res = await fetch('/api/groups');
+        const data = await res.json();
+        const groups = data.groups || [];
+        const html = groups.map(g => `<div class="item"><strong>${g.group_name}</strong><br>${g.group_description}</div>`).join('');
+        document.getElementById('groupsList').innerHTML = html || '<p>No groups yet</p>';
+    } catch (err) {
+        console.log('Groups load error:', err);
+    }
+}
+
+// Add Group
+let currentGroupId = null;
+let currentGroupMembers = [];
+let currentGroupFriends = [];
+let groupMessageRefreshInterval = null;
+let groupMessageStream = null;
+let lastGroupMessageId = null;
+
+async function createNewGroup() {
+    const name = document.getElementById('groupName').value.trim();
+    
+    if (!name) {
+        alert('Group name required');
+        return;
+    }
+    
+    try {
+        const res = await fetch('/api/create-group', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({group_name: name})
+        });
+        const data = await res.json();
+        if (data.success) {
+            document.getElementById('groupName').value = '';
+            loadGroups();
+        } else {
+            alert(data.error || 'Failed to create group');
+        }
+    } catch (err) {
+        alert('Failed to create group');
+        console.error(err);
+    }
+}
+
+async function loadGroups() {
+    try {
+        const res = await fetch('/api/my-groups');
+        const data = await res.json();
+        renderGroups(data.groups || []);
+    } catch (err) {
+        console.error('Load groups error:', err);
+    }
+}
+
+function renderGroups(groups) {
+    const container = document.getElementById('groupsList');
+    if (groups.length === 0) {
+        container.innerHTML = '<p>No groups yet. Create one to get started!</p>';
+        return;
+    }
+    
+    container.innerHTML = groups.map(g => `
+        <div style="background: var(--bg-light); padding: 15px; border-radius: 8px; cursor: pointer; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" onclick="openGroupDetail(${g.id}, '${g.name}')">
+            <h4 style="margin: 0 0 5px 0;">${g.name}</h4>
+            <p style="margin: 0; color: var(--text-muted); font-size: 0.9rem;">${g.created_by_me ? 'Created by you' : 'Member'}</p>
+        </div>
+    `).join('');
+}
+
+async function openGroupDetail(groupId, groupName) {
+    currentGroupId = groupId;
+    document.getElementById('groupDetailName').textContent = groupName;
+    
+    // Stop listening to the previous group
+    stopGroupMessageUpdates();
+    
+    // Load messages
+    lastGroupMessageId = null;
+    document.getElementById('messagesList').innerHTML = '';
+    await loadGroupMessages();
+    
+    // Load members
+    await loadGroupMembers();
+    
+    // Load friends to invite
+    await loadFriendsForInvite();
+    
+    // Add Enter key listener to message input
+    const messageInput = document.getElementById('messageInput');
+    messageInput.addEventListener('keypress', (e) => {
+        if (e.key === 'Enter') {
+            e.preventDefault();
+            sendMessage();
+        }
+    });
+    
+    // Receive new messages as they are sent (falls back to polling)
+    startGroupMessageUpdates();
+    
+    document.getElementById('groupDetailModal').classList.add('active');
+}
+
+function closeGroupDetail() {
+    currentGroupId = null;
+    stopGroupMessageUpdates();
+    document.getElementById('groupDetailModal').classList.remove('active');
+}
+
+function startGroupMessageUpdates() {
+    if (window.EventSource) {
+        groupMessageStream = new EventSource(`/api/group/${currentGroupId}/stream?after_id=${lastGroupMessageId || 0}`);
+        groupMessageStream.onmessage = (e) => appendGroupMessages([JSON.parse(e.data)]);
+    } else {
+        // Poll every 2 seconds, asking only for messages after the cursor
+        groupMessageRefreshInterval = setInterval(loadGroupMessages, 2000);
+    }
+}
+
+function stopGroupMessageUpdates() {
+    if (groupMessageStream) {
+        groupMessageStream.close();
+        groupMessageStream = null;
+    }
+    if (groupMessageRefreshInterval) {
+        clearInterval(groupMessageRefreshInterval);
+        groupMessageRefreshInterval = null;
+    }
+}
+
+function appendGroupMessages(messages) {
+    // Skip anything already shown (stream and send can overlap)
+    const fresh = messages.filter(m => lastGroupMessageId === null || m.id > lastGroupMessageId);
+    if (fresh.length === 0) return;
+    lastGroupMessageId = fresh[fresh.length - 1].id;
+    
+    const container = document.getElementById('messagesList');
+    container.insertAdjacentHTML('beforeend', fresh.map(m => `
+        <div style="background: #f5f5f5; padding: 10px; border-radius: 5px; margin-bottom: 8px;">
+            <strong style="color: var(--primary);">${m.username}</strong>
+            <p style="margin: 5px 0 0 0;">${m.message}</p>
+            <small style="color: var(--text-muted);">${new Date(m.created_at).toLocaleString()}</small>
+        </div>
+    `).join(''));
+    
+    // Scroll to bottom
+    container.parentElement.scrollTop = container.parentElement.scrollHeight;
+}
+
+async function loadGroupMessages() {
+    try {
+        const cursor = lastGroupMessageId === null ? '' : `?after_id=${lastGroupMessageId}`;
+        const res = await fetch(`/api/group/${currentGroupId}/messages${cursor}`);
+        const data = await res.json();
+        appendGroupMessages(data.messages || []);
+    } catch (err) {
+        console.error('Load messages error:', err);
+    }
+}
+
+async function sendMessage() {
+    const messageInput = document.getElementById('messageInput');
+    const message = messageInput.value.trim();
+    
+    if (!message) return;
+    
+    try {
+        const res = await fetch(`/api/group/${currentGroupId}/send-message`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({message})
+        });
+        const data = await res.json();
+        if (data.success) {
+            messageInput.value = '';
+            await loadGroupMessages();
+        } else {
+            alert(data.error || 'Failed to send message');
+        }
+    } catch (err) {
+        alert('Failed to send message');
+        console.error(err);
+    }
+}
+
+async function loadGroupMembers() {
+    try {
+        const res = await fetch(`/api/group/${currentGroupId}/members`);
+        const data = await res.json();
+        currentGroupMembers = data.members || [];
+        
+        const container = document.getElementById('groupMembersList');
+        container.innerHTML = currentGroupMembers.map(m => `
+            <div style="display: flex; justify-content: space-between; align-items: center; padding: 8px 0; border-bottom: 1px solid #ddd;">
+                <span>${m.username}</span>
+                <button onclick="removeMember(${m.id})" style="padding: 5px 10px; background: #ff6b6b; color: white; border: none; border-radius: 3px; cursor: pointer; font-size: 0.9rem;">Remove</button>
+            </div>
+        `).join('');
+    } catch (err) {
+        console.error('Load members error:', err);
+    }
+}
+
+async function loadFriendsForInvite() {
+    try {
+        // Get all friends
+        const res = await fetch('/api/friends');
+        const data = await res.json();
+        const friends = data.friends || [];
+        
+        // Get current members
+        const membersRes = await fetch(`/api/group/${currentGroupId}/members`);
+        const membersData = await membersRes.json();
+        const memberIds = (membersData.members || []).map(m => m.id);
+        
+        // Filter friends not in group
+        const friendsToInvite = friends.filter(f => !memberIds.includes(f.id));
+        
+        const container = document.getElementById('friendsToInvite');
+        if (friendsToInvite.length === 0) {
+            container.innerHTML = '<p style="color: var(--text-muted);">All friends are already members!</p>';
+            return;
+        }
+        
+        container.innerHTML = friendsToInvite.map(f => `
+            <div style="display: flex; justify-content: space-between; align-items: center; padding: 8px 0; border-bottom: 1px solid #ddd;">
+                <span>${f.username}</span>
+                <button onclick="inviteFriend(${f.id}, '${f.username}')" style="padding: 5px 10px; background: var(--primary); color: white; border: none; border-radius: 3px; cursor: pointer; font-size: 0.9rem;">Invite</button>
+            </div>
+        `).join('');
+    } catch (err) {
+        console.error('Load friends error:', err);
+    }
+}
+
+async function inviteFriend(friendId, friendName) {
+    try {
+        const res = await fetch(`/api/group/${currentGroupId}/invite`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({friend_id: friendId})
+        });
+        const data = await res.json();
+        if (data.success) {
+            alert(`${friendName} invited to the group!`);
+            await loadGroupMembers();
+            await loadFriendsForInvite();
+        } else {
+            alert(data.error || 'Failed to invite');
+        }
+    } catch (err) {
+        alert('Failed to invite');
+        console.error(err);
+    }
+}
+
+async function removeMember(memberId) {
+    if (!confirm('Remove this member?')) return;
+    
+    try {
+        const res = await fetch(`/api/group/${currentGroupId}/remove-member`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({member_id: memberId})
+        });
+        const data = await res.json();
+        if (data.success) {
+            await loadGroupMembers();
+            await loadFriendsForInvite();
+        } else {
+            alert(data.error || 'Failed to remove member');
+        }
+    } catch (err) {
+        alert('Failed to remove member');
+        console.error(err);
+    }
+}
+
+async function deleteGroup() {
+    if (!confirm('Delete this group permanently?')) return;
+    
+    try {
+        const res = await fetch(`/api/group/${currentGroupId}/delete`, {
+            method: 'POST'
+        });
+        const data = await res.json();
+        if (data.success) {
+            closeGroupDetail();
+            loadGroups();
+            alert('Group deleted');
+        } else {
+            alert(data.error || 'Failed to delete group');
+        }
+    } catch (err) {
+        alert('Failed to delete group');
+        console.error(err);
+    }
+}
+
+// Load all data
+function loadAllData() {
+    loadFriends();
+    loadGroups();
+}
+
+// ======== CALENDAR & TODO FUNCTIONS ========
+let currentMonth = new Date();
+let selectedDate = new Date().toISOString().split('T')[0];
+let todos = JSON.parse(localStorage.getItem('todos')) || {};
+
+function initializeCalendar() {
+    renderCalendar();
+    renderTodos();
+}
+
+function renderCalendar() {
+    const year = currentMonth.getFullYear();
+    const month = currentMonth.getMonth();
+    const firstDay = new Date(year, month, 1);
+    const lastDay = new Date(year, month + 1, 0);
+    const daysInMonth = lastDay.getDate();
+    const startingDayOfWeek = firstDay.getDay();
+
+    document.getElementById('calendarMonth').textContent = 
+        currentMonth.toLocaleDateString('en-US', { month: 'long', year: 'numeric' });
+
+    let html = '<div class="calendar-weekdays">';
+    const weekDays = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat'];
+    weekDays.forEach(day => html += `<div class="weekday">${day}</div>`);
+    html += '</div><div class="calendar-days">';
+
+    // Empty cells before month starts
+    for (let i = 0; i < startingDayOfWeek; i++) {
+        html += '<div class="calendar-day empty"></div>';
+    }
+
+    // Days of month
+    for (let day = 1; day <= daysInMonth; day++) {
+        const dateStr = `${year}-${String(month + 1).padStart(2, '0')}-${String(day).padStart(2, '0')}`;
+        const isSelected = dateStr === selectedDate;
+        const hasTask = todos[dateStr] && todos[dateStr].length > 0;
+        html += `<div class="calendar-day ${isSelected ? 'selected' : ''} ${hasTask ? 'has-task' : ''}" onclick="selectDate('${dateStr}')">${day}</div>`;
+    }
+
+    html += '</div>';
+    document.getElementById('calendar').innerHTML = html;
+}
+
+async function selectDate(dateStr) {
+    selectedDate = dateStr;
+    document.getElementById('selectedDate').textContent = new Date(dateStr).toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
+    renderCalendar();
+    renderTodos();
+}
+
+function prevMonth() {
+    currentMonth.setMonth(currentMonth.getMonth() - 1);
+    renderCalendar();
+    loadDashboard();
+}
+
+function nextMonth() {
+    currentMonth.setMonth(currentMonth.getMonth() + 1);
+    renderCalendar();
+    loadDashboard();
+}
+
+// Todo changes are queued and sent to /api/sync in one request once clicks
+// settle, instead of one /api/save per click. syncRev is the last server
+// revision the local store has caught up to; the server answers each push
+// with everything changed since then (conflicting edits from other devices
+// included), so the store never re-downloads the whole history.
+// Only one sync request is in flight at a time: ops queued meanwhile go out
+// after it, based on the revision it returned, so a push never conflicts
+// with the same tab's previous one.
+const TASK_BATCH_DELAY = 400;
+const TASK_RETRY_DELAY = 5000;
+let pendingTaskOps = [];
+let taskBatchTimer = null;
+let taskBatchRefresh = false;
+let syncRev = parseInt(localStorage.getItem('todosRev')) || 0;
+let syncing = false;
+let pullQueued = false;
+
+function queueTaskOp(op, refreshChart) {
+    pendingTaskOps.push(op);
+    taskBatchRefresh = taskBatchRefresh || refreshChart;
+    clearTimeout(taskBatchTimer);
+    taskBatchTimer = setTimeout(flushTaskOps, TASK_BATCH_DELAY);
+}
+
+async function flushTaskOps() {
+    clearTimeout(taskBatchTimer);
+    taskBatchTimer = null;
+    if (!syncing && pendingTaskOps.length) await runSync();
+}
+
+// Catch up with changes made elsewhere
+async function pullTodos() {
+    pullQueued = true;
+    if (!syncing) await runSync();
+}
+
+// Sends queued ops and pulls until both are done. The rest of a partial
+// page (more) is read before the next push, since it may hold this tab's
+// own earlier writes.
+async function runSync() {
+    syncing = true;
+    let more = false;
+    try {
+        while (more || pendingTaskOps.length || pullQueued) {
+            if (!more && pendingTaskOps.length) {
+                clearTimeout(taskBatchTimer);
+                taskBatchTimer = null;
+                more = await pushTaskOps();
+            } else {
+                pullQueued = false;
+                const since = syncRev;
+                const res = await fetch(`/api/sync?since=${since}`);
+                if (!res.ok) throw new Error(`HTTP ${res.status}`);
+                more = applySync(await res.json(), since);
+            }
+        }
+    } catch (err) {
+        console.error('Todo sync error:', err);
+        if (pendingTaskOps.length && !taskBatchTimer) {
+            taskBatchTimer = setTimeout(flushTaskOps, TASK_RETRY_DELAY);
+        }
+    } finally {
+        syncing = false;
+    }
+}
+
+// Pushes the queued ops; returns whether more changes are waiting. Failed
+// batches go back to the front of the queue (resending is safe: ops that
+// already landed change nothing the second time).
+async function pushTaskOps() {
+    const ops = pendingTaskOps;
+    const refreshChart = taskBatchRefresh;
+    pendingTaskOps = [];
+    taskBatchRefresh = false;
+
+    const base = syncRev;
+    let data;
+    try {
+        const res = await fetch('/api/sync', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ base_rev: base, ops })
+        });
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        data = await res.json();
+    } catch (err) {
+        pendingTaskOps = ops.concat(pendingTaskOps);
+        taskBatchRefresh = taskBatchRefresh || refreshChart;
+        throw err;
+    }
+    const more = applySync(data, base);
+    // Patch the chart with the days this batch changed
+    data.summary.forEach(d => dashboardSummary[d.date] = d);
+    if (refreshChart && data.summary.length) renderChart();
+    if (data.conflicts.length) showSyncConflicts(data.conflicts);
+    return more;
+}
+
+function showSyncConflicts(conflicts) {
+    const lines = conflicts.map(c => `• ${c.task_name} (${c.date}) was ${c.reason === 'deleted' ? 'deleted' : 'changed'} on another device`);
+    alert(`Some changes were not saved:\n${lines.join('\n')}\n\nThe latest version is shown.`);
+}
+
+// Applies a page of changes made after revision `since` to the local store;
+// returns whether more pages follow. A full download (since 0, or a reset
+// after the server pruned its delete log) replaces everything synced before,
+// keeping only todos added here that the server hasn't confirmed yet.
+function applySync(data, since) {
+    if (since === 0 || data.reset) {
+        Object.keys(todos).forEach(date => {
+            todos[date] = todos[date].filter(t => t.serverId === undefined);
+        });
+    }
+    data.changes.forEach(applyTodoChange);
+    syncRev = data.reset ? data.rev : Math.max(syncRev, data.rev);
+    localStorage.setItem('todos', JSON.stringify(todos));
+    localStorage.setItem('todosRev', String(syncRev));
+    renderTodos();
+    renderCalendar();
+    return data.more;
+}
+
+// Entries are matched on the server's task id, or on the text for todos
+// added here that no change has confirmed yet
+function applyTodoChange(change) {
+    const list = todos[change.date] || (todos[change.date] = []);
+    const index = list.findIndex(t => t.serverId === change.id ||
+        (t.serverId === undefined && t.text === change.task_name));
+    if (change.deleted) {
+        if (index >= 0 && list[index].serverId === change.id) list.splice(index, 1);
+        return;
+    }
+    const completed = change.tasks_completed > 0;
+    if (index < 0) {
+        list.push({
+            id: change.id,
+            serverId: change.id,
+            text: change.task_name,
+            completed,
+            completedDate: completed ? change.date : null
+        });
+        return;
+    }
+    const todo = list[index];
+    todo.serverId = change.id;
+    if (todo.completed !== completed) {
+        todo.completed = completed;
+        todo.completedDate = completed ? change.date : null;
+    }
+}
+
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'visible' && !document.getElementById('appContainer').classList.contains('hidden')) {
+        pullTodos();
+    }
+});
+
+// Don't lose a pending batch when the tab is closed
+window.addEventListener('pagehide', () => {
+    if (pendingTaskOps.length === 0) return;
+    const body = new Blob([JSON.stringify({ base_rev: syncRev, ops: pendingTaskOps })], { type: 'application/json' });
+    if (navigator.sendBeacon('/api/sync', body)) {
+        pendingTaskOps = [];
+        clearTimeout(taskBatchTimer);
+    }
+});
+
+function addTodo() {
+    const input = document.getElementById('todoInput');
+    const task = input.value.trim();
+    if (!task) return;
+
+    const taskId = Date.now();
+    
+    if (!todos[selectedDate]) {
+        todos[selectedDate] = [];
+    }
+    todos[selectedDate].push({
+        id: taskId,
+        text: task,
+        completed: false,
+        completedDate: null
+    });
+    
+    localStorage.setItem('todos', JSON.stringify(todos));
+    input.value = '';
+    renderTodos();
+    renderCalendar();
+    
+    // Save to backend (as uncompleted task)
+    queueTaskOp({ op: 'add', date: selectedDate, task_name: task, tasks_completed: 0 }, false);
+}
+
+function toggleTodo(id) {
+    const task = todos[selectedDate].find(t => t.id === id);
+    if (task) {
+        task.completed = !task.completed;
+        task.completedDate = task.completed ? new Date().toISOString().split('T')[0] : null;
+        
+        queueTaskOp({
+            op: 'toggle',
+            date: selectedDate,
+            task_name: task.text,
+            tasks_completed: task.completed ? 1 : 0
+        }, true);
+        
+        localStorage.setItem('todos', JSON.stringify(todos));
+        renderTodos();
+    }
+}
+
+function deleteTodo(id) {
+    const task = todos[selectedDate].find(t => t.id === id);
+    const taskName = task?.text || '';
+    
+    todos[selectedDate] = todos[selectedDate].filter(t => t.id !== id);
+    localStorage.setItem('todos', JSON.stringify(todos));
+    renderTodos();
+    renderCalendar();
+    
+    // Delete from backend
+    if (taskName) {
+        queueTaskOp({ op: 'delete', date: selectedDate, task_name: taskName }, false);
+    }
+}
+
+function renderTodos() {
+    const todayTodos = todos[selectedDate] || [];
+    const today = new Date().toISOString().split('T')[0];
+    
+    let html = '';
+    todayTodos.forEach(todo => {
+        const isStale = todo.completed && todo.completedDate && todo.completedDate !== today;
+        html += `
+            <div class="todo-item ${todo.completed ? 'completed' : ''} ${isStale ? 'stale' : ''}">
+                <input type="checkbox" ${todo.completed ? 'checked' : ''} onchange="toggleTodo(${todo.id})">
+                <span class="todo-text">${todo.text}</span>
+                <button class="todo-delete" onclick="deleteTodo(${todo.id})">×</button>
+            </div>
+        `;
+    });
+    document.getElementById('todoList').innerHTML = html || '<p class="no-todos">No tasks for this day</p>';
+}
+
+// Clean up stale todos (remove completed tasks from yesterday)
+setInterval(() => {
+    const today = new Date().toISOString().split('T')[0];
+    Object.keys(todos).forEach(date => {
+        todos[date] = todos[date].filter(todo => {
+            if (todo.completed && todo.completedDate && todo.completedDate !== today) {
+                return false; // Remove stale task
+            }
+            return true;
+        });
+    });
+    localStorage.setItem('todos', JSON.stringify(todos));
+}, 60000); // Check every minute
+
+// ======== FOCUS SESSION TIMER ========
+// Focus time is sent as deltas: a heartbeat every minute while the
+// session runs, and the remainder when it stops. The server buffers
+// and sums them, so frequent heartbeats are cheap.
+async function sendFocusDelta(date) {
+    const delta = sessionDuration - focusSent;
+    if (delta <= 0) return;
+    focusSent += delta;
+    try {
+        const res = await fetch('/api/update-focus', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                date: date,
+                focus_time: delta
+            })
+        });
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    } catch (err) {
+        focusSent -= delta; // retried with the next heartbeat
+        throw err;
+    }
+}
+
+function startSession() {
+    sessionActive = true;
+    sessionStartTime = Date.now();
+    sessionDuration = 0;
+    focusSent = 0;
+    
+    document.getElementById('startSessionBtn').classList.add('hidden');
+    document.getElementById('stopSessionBtn').classList.remove('hidden');
+    
+    sessionTimer = setInterval(() => {
+        sessionDuration = Math.floor((Date.now() - sessionStartTime) / 1000);
+        const hours = Math.floor(sessionDuration / 3600);
+        const minutes = Math.floor((sessionDuration % 3600) / 60);
+        const seconds = sessionDuration % 60;
+        
+        document.getElementById('timerDisplay').textContent = 
+            `${String(hours).padStart(2, '0')}:${String(minutes).padStart(2, '0')}:${String(seconds).padStart(2, '0')}`;
+    }, 1000);
+    
+    sessionHeartbeat = setInterval(() => {
+        const today = new Date().toISOString().split('T')[0];
+        sendFocusDelta(today).catch(err => console.error('Focus heartbeat failed:', err));
+    }, FOCUS_HEARTBEAT_MS);
+}
+
+async function stopSession() {
+    sessionActive = false;
+    clearInterval(sessionTimer);
+    clearInterval(sessionHeartbeat);
+    sessionDuration = Math.floor((Date.now() - sessionStartTime) / 1000);
+    
+    const focusTime = sessionDuration; // in seconds
+    const today = new Date().toISOString().split('T')[0];
+    
+    // Only save if session is at least 30 seconds (heartbeats start after a minute)
+    if (focusTime < 30) {
+        alert(`Session too short. Minimum 30 seconds required. You had ${focusTime} seconds.`);
+        
+        // Reset timer display and buttons
+        document.getElementById('timerDisplay').textContent = '00:00:00';
+        document.getElementById('startSessionBtn').classList.remove('hidden');
+        document.getElementById('stopSessionBtn').classList.add('hidden');
+        return;
+    }
+    
+    try {
+        await sendFocusDelta(today);
+        
+        // Reset timer display and buttons
+        document.getElementById('timerDisplay').textContent = '00:00:00';
+        document.getElementById('startSessionBtn').classList.remove('hidden');
+        document.getElementById('stopSessionBtn').classList.add('hidden');
+        
+        // Refresh chart to show new focus time
+        loadDashboard();
+        
+        alert(`Focus session ended! Duration: ${Math.floor(focusTime / 60)} minutes ${focusTime % 60} seconds`);
+    } catch (err) {
+        console.error('Failed to save focus time:', err);
+        alert('Failed to save focus time');
+    }
+}
+
+// Profile Functions
+async function loadProfile() {
+    try {
+        const res = await fetch(`/api/profile/${currentUser}`);
+        const data = await res.json();
+        renderProfile(data.profile || {});
+    } catch (err) {
+        console.error('Load profile error:', err);
+    }
+}
+
+function renderProfile(profile) {
+    document.getElementById('profilePic').src = profile.pfp_url || 'https://via.placeholder.com/100';
+    document.getElementById('profilePicUrl').value = profile.pfp_url || '';
+    document.getElementById('profileBio').value = profile.bio || '';
+}
+
+async function updateProfilePic() {
+    const url = document.getElementById('profilePicUrl').value.trim();
+    if (!url) {
+        alert('Please enter an image URL');
+        return;
+    }
+    
+    document.getElementById('profilePic').src = url;
+    // Save will be called when user clicks Save Profile
+}
+
+async function saveProfile() {
+    const bio = document.getElementById('profileBio').value;
+    const pfp_url = document.getElementById('profilePicUrl').value;
+    
+    try {
+        const res = await fetch('/api/profile/update', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({bio, pfp_url})
+        });
+        const data = await res.json();
+        if (data.success) {
+            alert('Profile saved!');
+        } else {
+            alert(data.error || 'Failed to save profile');
+        }
+    } catch (err) {
+        alert('Failed to save profile');
+        console.error(err);
+    }
+}
+
+// Leaderboard Functions
+async function loadLeaderboard() {
+    try {
+        const res = await fetch('/api/leaderboard');
+        const data = await res.json();
+        const leaderboard = data.leaderboard || [];
+        
+        const tbody = document.getElementById('leaderboardList');
+        if (leaderboard.length === 0) {
+            tbody.innerHTML = '<tr><td colspan="4" style="padding: 20px; text-align: center; color: var(--text-muted);">No users yet</td></tr>';
+            return;
+        }
+        
+        tbody.innerHTML = leaderboard.map((user, idx) => `
+            <tr style="border-bottom: 1px solid #ddd; background: ${idx === 0 ? 'rgba(127, 76, 165, 0.1)' : 'transparent'};">
+                <td style="padding: 15px;">
+                    ${idx === 0 ? '🥇' : idx === 1 ? '🥈' : idx === 2 ? '🥉' : user.rank}
+                </td>
+                <td style="padding: 15px;">
+                    <img src="${user.pfp_url || 'https://via.placeholder.com/40'}" alt="pfp" style="width: 40px; height: 40px; border-radius: 50%; object-fit: cover; margin-right: 10px; vertical-align: middle;">
+                    <span style="vertical-align: middle;">${user.username}</span>
+                </td>
+                <td style="padding: 15px; text-align: center; font-weight: bold; color: var(--primary);">${user.block_count}</td>
+                <td style="padding: 15px; text-align: center;">
+                    <button onclick="viewFriendProfile(${user.id}, '${user.username}')" style="padding: 5px 10px; background: var(--primary); color: white; border: none; border-radius: 3px; cursor: pointer; font-size: 0.9rem;">Profile</button>
+                </td>
+            </tr>
+        `).join('');
+    } catch (err) {
+        console.error('Load leaderboard error:', err);
+        document.getElementById('leaderboardList').innerHTML = '<tr><td colspan="4" style="padding: 20px; text-align: center; color: #ff6b6b;">Failed to load leaderboard</td></tr>';
+    }
+}
+
+// Friend Profile Functions
+async function viewFriendProfile(userId, username) {
+    try {
+        // Fetch friend's profile
+        const profileRes = await fetch(`/api/profile/${userId}`);
+        const profileData = await profileRes.json();
+        
+        if (!profileData.success) {
+            alert('Unable to view this profile');
+            return;
+        }
+        
+        // Display profile info
+        document.getElementById('friendProfileName').textContent = username;
+        document.getElementById('friendProfilePic').src = profileData.profile.pfp_url || 'https://via.placeholder.com/80';
+        document.getElementById('friendProfileBio').textContent = profileData.profile.bio || '(No bio)';
+        
+        // Fetch friend's garden state
+        const gardenRes = await fetch(`/api/user-garden/${userId}`);
+        const gardenData = await gardenRes.json();
+        
+        if (gardenData.success && gardenData.garden_state) {
+            const blocks = gardenData.garden_state.blocks || 0;
+            let gardenHtml = `<p style="text-align: center; margin: 0; margin-bottom: 10px; font-weight: bold;">🌸 ${blocks} blocks grown</p>`;
+            
+            // Display small garden preview (first 12 blocks max)
+            if (blocks > 0) {
+                gardenHtml += '<div style="display: grid; grid-template-columns: repeat(4, 1fr); gap: 8px; justify-content: center;">';
+                for (let i = 0; i < Math.min(blocks, 12); i++) {
+                    gardenHtml += '<div style="width: 50px; height: 50px; background: #7f4ca5; border-radius: 8px; border: 2px solid #5a2e7a;"></div>';
+                }
+                if (blocks > 12) {
+                    gardenHtml += `<div style="width: 50px; height: 50px; display: flex; align-items: center; justify-content: center; background: rgba(127, 76, 165, 0.5); border-radius: 8px; border: 2px solid #5a2e7a; font-weight: bold; color: #5a2e7a;">+${blocks - 12}</div>`;
+                }
+                gardenHtml += '</div>';
+            } else {
+                gardenHtml += '<p style="text-align: center; color: var(--text-muted); margin: 0;">Garden not yet started</p>';
+            }
+            document.getElementById('friendGardenPreview').innerHTML = gardenHtml;
+        } else {
+            document.getElementById('friendGardenPreview').innerHTML = '<p style="color: var(--text-muted); text-align: center;">Garden data not available</p>';
+        }
+        
+        // Show modal
+        document.getElementById('friendProfileModal').classList.add('active');
+    } catch (err) {
+        alert('Error loading profile');
+        console.error('Profile load error:', err);
+    }
+}
+
+function closeFriendProfile() {
+    document.getElementById('friendProfileModal').classList.remove('active');
+}
+
+// Close modal when clicking outside it
+window.addEventListener('click', function(event) {
+    const modal = document.getElementById('friendProfileModal');
+    if (event.target === modal) {
+        modal.classList.remove('active');
+    }
+});
@@ -0,0 +1,567 @@
+import os
+import re
+import sqlite3
+import threading
+
+
+# Storage layer. backend.py talks to a client with the supabase-py query
+# builder interface (table().select().eq()...execute()); STORAGE_BACKEND picks
+# which implementation sits behind it:
+#   supabase - the hosted Supabase project (SUPABASE_URL / SUPABASE_KEY)
+#   sqlite   - a local database file at SQLITE_PATH, for single-node
+#              deployments and offline load testing
+# STORAGE_TIMEOUT (seconds) bounds every call: the HTTP timeout for Supabase,
+# the lock wait for SQLite.
+def create_client():
+    backend = os.getenv('STORAGE_BACKEND', 'supabase').lower()
+    timeout = float(os.getenv('STORAGE_TIMEOUT', '10'))
+    if backend == 'sqlite':
+        return SQLiteClient(os.getenv('SQLITE_PATH', 'teammate.db'), timeout=timeout)
+    if backend == 'supabase':
+        from supabase import create_client as create_supabase_client
+        from supabase.lib.client_options import ClientOptions
+        client = create_supabase_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'),
+                                        options=ClientOptions(postgrest_client_timeout=timeout))
+        _tune_pool(client, timeout, int(os.getenv('STORAGE_POOL_SIZE', '20')),
+                   float(os.getenv('STORAGE_KEEPALIVE', '30')))
+        return client
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def _tune_pool(client, timeout, pool_size, keepalive):
+    # supabase-py keeps one httpx session for PostgREST with httpx's default
+    # pool (5s keep-alive). Replace it with one that keeps pool_size
+    # connections (about one per worker thread) open for keepalive seconds,
+    # so requests reuse warm TLS connections instead of reconnecting.
+    try:
+        import httpx
+        postgrest = client.postgrest
+        old = postgrest.session
+        postgrest.session = type(old)(
+            base_url=old.base_url, headers=old.headers, timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                                keepalive_expiry=keepalive)
+        )
+        old.close()
+    except Exception as e:
+        print(f"Connection pool not tuned: {e}")
+
+
+# Mirrors the 12 tables in SUPABASE_SETUP.md. Dates are kept as ISO text so
+# rows serialize exactly like PostgREST responses; users.password_hash matches
+# the column backend.py reads and writes.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  username TEXT UNIQUE NOT NULL,
+  password_hash TEXT NOT NULL,
+  created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  date TEXT NOT NULL,
+  task_name TEXT DEFAULT 'Unnamed Task',
+  tasks_completed INTEGER DEFAULT 0,
+  focus_time INTEGER DEFAULT 0,
+  timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+  rev INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS garden_state (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL UNIQUE REFERENCES users(id) ON DELETE CASCADE,
+  block_count INTEGER DEFAULT 0,
+  is_dead BOOLEAN DEFAULT 0,
+  last_activity TEXT,
+  last_block_award_date TEXT,
+  created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS friends (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  friend_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  status TEXT DEFAULT 'pending',
+  created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE(user_id, friend_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_profiles (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL UNIQUE REFERENCES users(id) ON DELETE CASCADE,
+  bio TEXT DEFAULT '',
+  pfp_url TEXT DEFAULT '',
+  created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS "groups" (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  group_name TEXT NOT NULL,
+  created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS group_members (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  group_id INTEGER NOT NULL REFERENCES "groups"(id) ON DELETE CASCADE,
+  user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE(group_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS group_messages (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  group_id INTEGER NOT NULL REFERENCES "groups"(id) ON DELETE CASCADE,
+  user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  username TEXT NOT NULL,
+  message TEXT NOT NULL,
+  created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Per-user daily task and focus totals behind /api/analytics, kept current
+-- by the task routes and the focus functions
+CREATE TABLE IF NOT EXISTS daily_stats (
+  user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  date TEXT NOT NULL,
+  tasks_total INTEGER DEFAULT 0,
+  tasks_completed INTEGER DEFAULT 0,
+  focus_time INTEGER DEFAULT 0,
+  PRIMARY KEY (user_id, date)
+);
+
+-- Per-user task revision counter and delete log behind /api/sync, kept by
+-- the SYNC_TRIGGERS below
+CREATE TABLE IF NOT EXISTS sync_state (
+  user_id INTEGER PRIMARY KEY,
+  rev INTEGER NOT NULL DEFAULT 0,
+  pruned_rev INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS task_tombstones (
+  task_id INTEGER PRIMARY KEY,
+  user_id INTEGER NOT NULL,
+  rev INTEGER NOT NULL,
+  date TEXT NOT NULL,
+  task_name TEXT,
+  deleted_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_task_tombstones_user_rev ON task_tombstones(user_id, rev);
+CREATE INDEX IF NOT EXISTS idx_task_tombstones_deleted_at ON task_tombstones(deleted_at);
+
+-- Tokens of applied focus flushes, so a resent flush is not counted twice
+CREATE TABLE IF NOT EXISTS focus_flushes (
+  token TEXT PRIMARY KEY,
+  flushed_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_focus_flushes_flushed_at ON focus_flushes(flushed_at);
+
+-- Unique key for task upserts; also serves (user_id, date) lookups
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_user_date_name ON tasks(user_id, date, task_name);
+CREATE INDEX IF NOT EXISTS idx_group_messages_group_id ON group_messages(group_id, id);
+CREATE INDEX IF NOT EXISTS idx_friends_friend_status ON friends(friend_id, status);
+CREATE INDEX IF NOT EXISTS idx_groups_user ON "groups"(user_id);
+CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members(user_id);
+"""
+
+# Tables whose updated_at the user directory refreshes from. Databases created
+# before the column existed get it added (without a default, which SQLite only
+# allows to be constant) and the triggers keep it current on every update.
+TIMESTAMPED_TABLES = ('garden_state', 'user_profiles')
+
+TIMESTAMP_TRIGGERS = """
+CREATE INDEX IF NOT EXISTS idx_{table}_updated_at ON {table}(updated_at);
+CREATE TRIGGER IF NOT EXISTS {table}_updated_at AFTER UPDATE ON {table}
+FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+  UPDATE {table} SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now') WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_inserted_at AFTER INSERT ON {table}
+FOR EACH ROW WHEN NEW.updated_at IS NULL
+BEGIN
+  UPDATE {table} SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now') WHERE id = NEW.id;
+END;
+"""
+
+# Every insert, change and delete of a task takes the user's next revision.
+# The counter row is written first, so concurrent writers of one user queue
+# on it and revisions become visible in order. Databases created before
+# tasks.rev existed get it added and numbered (SYNC_BACKFILL) first.
+_NEXT_REV = """
+  INSERT INTO sync_state (user_id, rev) VALUES ({row}.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET rev = rev + 1;"""
+
+SYNC_TRIGGERS = f"""
+CREATE INDEX IF NOT EXISTS idx_tasks_user_rev ON tasks(user_id, rev);
+CREATE TRIGGER IF NOT EXISTS tasks_rev_insert AFTER INSERT ON tasks
+FOR EACH ROW
+BEGIN{_NEXT_REV.format(row='NEW')}
+  UPDATE tasks SET rev = (SELECT rev FROM sync_state WHERE user_id = NEW.user_id) WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_rev_update AFTER UPDATE ON tasks
+FOR EACH ROW WHEN NEW.date IS NOT OLD.date OR NEW.task_name IS NOT OLD.task_name
+  OR NEW.tasks_completed IS NOT OLD.tasks_completed OR NEW.focus_time IS NOT OLD.focus_time
+BEGIN{_NEXT_REV.format(row='NEW')}
+  UPDATE tasks SET rev = (SELECT rev FROM sync_state WHERE user_id = NEW.user_id) WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_tombstone AFTER DELETE ON tasks
+FOR EACH ROW
+BEGIN{_NEXT_REV.format(row='OLD')}
+  INSERT OR REPLACE INTO task_tombstones (task_id, user_id, rev, date, task_name)
+  VALUES (OLD.id, OLD.user_id, (SELECT rev FROM sync_state WHERE user_id = OLD.user_id), OLD.date, OLD.task_name);
+END;
+"""
+
+SYNC_BACKFILL = """
+UPDATE tasks SET rev = numbered.n
+FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id) AS n FROM tasks) AS numbered
+WHERE tasks.id = numbered.id;
+INSERT INTO sync_state (user_id, rev) SELECT user_id, MAX(rev) FROM tasks GROUP BY user_id
+  ON CONFLICT (user_id) DO UPDATE SET rev = MAX(rev, excluded.rev);
+"""
+
+# Fills daily_stats from the tasks a database already has when the table is
+# first created; counts skip the Focus Session row like analytics.task_counts
+DAILY_STATS_BACKFILL = """
+INSERT INTO daily_stats (user_id, date, tasks_total, tasks_completed, focus_time)
+SELECT user_id, date,
+       SUM(task_name IS NOT 'Focus Session'),
+       SUM(task_name IS NOT 'Focus Session' AND COALESCE(tasks_completed, 0) > 0),
+       SUM(COALESCE(focus_time, 0))
+FROM tasks GROUP BY user_id, date
+"""
+
+sqlite3.register_converter('BOOLEAN', lambda value: value not in (b'0', b''))
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Rows per multi-VALUES statement, well under SQLite's bound-parameter limit
+INSERT_CHUNK = 500
+
+
+def _quote(name):
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return f'"{name}"'
+
+
+class QueryResult:
+    def __init__(self, data):
+        self.data = data
+        self.count = len(data)
+
+
+class SQLiteClient:
+    def __init__(self, path, timeout=5.0):
+        # Every thread opens its own connection and the schema is created
+        # once, so each thread would get a separate, empty in-memory database
+        if path in ('', ':memory:') or path.startswith('file::memory:') or 'mode=memory' in path:
+            raise ValueError('SQLITE_PATH must be a file; in-memory databases are per connection')
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connection(self):
+        # One connection per thread; sqlite3 keeps each connection's
+        # prepared statements in its statement cache
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=256
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            conn.execute(f'PRAGMA busy_timeout={int(self.timeout * 1000)}')
+            self._ensure_schema(conn)
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self, conn):
+        with self._schema_lock:
+            if not self._schema_ready:
+                new_rollups = not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'daily_stats'").fetchone()
+                conn.executescript(SCHEMA)
+                if new_rollups:
+                    conn.execute(DAILY_STATS_BACKFILL)
+                for table in TIMESTAMPED_TABLES:
+                    columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+                    if 'updated_at' not in columns:
+                        conn.execute(f'ALTER TABLE {table} ADD COLUMN updated_at TEXT')
+                        conn.execute(f"UPDATE {table} SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now')")
+                    conn.executescript(TIMESTAMP_TRIGGERS.format(table=table))
+                if 'rev' not in {row[1] for row in conn.execute('PRAGMA table_info(tasks)')}:
+                    conn.execute('ALTER TABLE tasks ADD COLUMN rev INTEGER DEFAULT 0')
+                    conn.executescript(SYNC_BACKFILL)
+                conn.executescript(SYNC_TRIGGERS)
+                self._schema_ready = True
+
+    def table(self, name):
+        return SQLiteQuery(self, name)
+
+    def rpc(self, name, params=None):
+        if name not in RPC_FUNCTIONS:
+            raise ValueError(f"Unknown function: {name}")
+        return SQLiteRPC(self, name, params or {})
+
+    def run(self, sql, params=()):
+        return [dict(row) for row in self.connection().execute(sql, params).fetchall()]
+
+    def run_many(self, statements):
+        # [(sql, params)] executed in one transaction
+        conn = self.connection()
+        rows = []
+        conn.execute('BEGIN')
+        try:
+            for sql, params in statements:
+                rows.extend(dict(row) for row in conn.execute(sql, params).fetchall())
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return rows
+
+
+# Local versions of the database functions defined in SUPABASE_SETUP.md,
+# called through client.rpc(name, params)
+_ADD_DAILY_STATS = (
+    "INSERT INTO daily_stats (user_id, date, tasks_total, tasks_completed, focus_time) "
+    "VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (user_id, date) DO UPDATE SET "
+    "tasks_total = tasks_total + excluded.tasks_total, "
+    "tasks_completed = tasks_completed + excluded.tasks_completed, "
+    "focus_time = focus_time + excluded.focus_time"
+)
+
+
+def _increment_focus_time(client, params):
+    rows = list(zip(params['p_user_ids'], params['p_dates'], params['p_seconds']))
+    token = params.get('p_token')
+    if not rows:
+        return []
+    sql = (
+        "INSERT INTO tasks (user_id, date, task_name, tasks_completed, focus_time) "
+        "VALUES (?, ?, 'Focus Session', 0, ?) "
+        "ON CONFLICT (user_id, date, task_name) "
+        "DO UPDATE SET focus_time = COALESCE(focus_time, 0) + excluded.focus_time"
+    )
+    conn = client.connection()
+    conn.execute('BEGIN')
+    try:
+        # A token already recorded means an earlier attempt of this flush landed
+        if token is None or conn.execute('INSERT INTO focus_flushes (token) VALUES (?) ON CONFLICT DO NOTHING',
+                                         (token,)).rowcount:
+            conn.executemany(sql, rows)
+            conn.executemany(_ADD_DAILY_STATS, [(user_id, day, 0, 0, seconds) for user_id, day, seconds in rows])
+            conn.execute("DELETE FROM focus_flushes WHERE flushed_at < datetime('now', '-1 day')")
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return []
+
+
+def _add_daily_stats(client, params):
+    rows = list(zip(params['p_user_ids'], params['p_dates'], params['p_total'],
+                    params['p_completed'], params['p_focus']))
+    if not rows:
+        return []
+    return client.run_many([(_ADD_DAILY_STATS, row) for row in rows])
+
+
+def _update_gardens(client, params):
+    rows = list(zip(params['p_block_counts'], params['p_is_dead'], params['p_last_activity'],
+                    params['p_award_dates'], params['p_user_ids'], params['p_seen']))
+    if not rows:
+        return []
+    sql = (
+        "UPDATE garden_state SET block_count = ?, is_dead = ?, last_activity = ?, last_block_award_date = ? "
+        "WHERE user_id = ? AND updated_at IS ? RETURNING user_id"
+    )
+    return client.run_many([(sql, row) for row in rows])
+
+
+RPC_FUNCTIONS = {
+    'increment_focus_time': _increment_focus_time,
+    'add_daily_stats': _add_daily_stats,
+    'update_gardens': _update_gardens
+}
+
+
+class SQLiteRPC:
+    def __init__(self, client, name, params):
+        self._client = client
+        self._name = name
+        self._params = params
+
+    def execute(self):
+        return QueryResult(RPC_FUNCTIONS[self._name](self._client, self._params))
+
+
+class SQLiteQuery:
+    def __init__(self, client, table):
+        self._client = client
+        self._table = _quote(table)
+        self._op = 'select'
+        self._columns = '*'
+        self._payload = None
+        self._on_conflict = None
+        self._ignore_duplicates = False
+        self._where = []
+        self._params = []
+        self._order = []
+        self._limit = None
+        self._offset = None
+
+    # ---- operations ----
+
+    def select(self, columns='*', **kwargs):
+        self._op = 'select'
+        columns = columns.strip()
+        if columns != '*':
+            columns = ', '.join(_quote(c.strip()) for c in columns.split(','))
+        self._columns = columns
+        return self
+
+    def insert(self, payload, **kwargs):
+        self._op = 'insert'
+        self._payload = payload
+        return self
+
+    def upsert(self, payload, on_conflict='id', ignore_duplicates=False, **kwargs):
+        self._op = 'upsert'
+        self._payload = payload
+        self._on_conflict = [c.strip() for c in on_conflict.split(',')]
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload, **kwargs):
+        self._op = 'update'
+        self._payload = payload
+        return self
+
+    def delete(self, **kwargs):
+        self._op = 'delete'
+        return self
+
+    # ---- filters ----
+
+    def _filter(self, column, op, value):
+        self._where.append(f'{_quote(column)} {op} ?')
+        self._params.append(value)
+        return self
+
+    def eq(self, column, value):
+        if value is None:
+            self._where.append(f'{_quote(column)} IS NULL')
+            return self
+        return self._filter(column, '=', value)
+
+    def neq(self, column, value):
+        return self._filter(column, '!=', value)
+
+    def gt(self, column, value):
+        return self._filter(column, '>', value)
+
+    def gte(self, column, value):
+        return self._filter(column, '>=', value)
+
+    def lt(self, column, value):
+        return self._filter(column, '<', value)
+
+    def lte(self, column, value):
+        return self._filter(column, '<=', value)
+
+    def in_(self, column, values):
+        values = list(values)
+        if not values:
+            self._where.append('0')
+            return self
+        self._where.append(f"{_quote(column)} IN ({', '.join('?' for _ in values)})")
+        self._params.extend(values)
+        return self
+
+    # ---- modifiers ----
+
+    def order(self, column, desc=False, **kwargs):
+        self._order.append(f"{_quote(column)} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, count, **kwargs):
+        self._limit = count
+        return self
+
+    def range(self, start, end, **kwargs):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    # ---- SQL generation ----
+
+    def _where_sql(self):
+        return f" WHERE {' AND '.join(self._where)}" if self._where else ''
+
+    def _insert_statements(self):
+        rows = self._payload if isinstance(self._payload, list) else [self._payload]
+        if not rows:
+            return []
+        columns = list(rows[0].keys())
+        column_sql = ', '.join(_quote(c) for c in columns)
+        conflict_sql = ''
+        if self._op == 'upsert':
+            target = ', '.join(_quote(c) for c in self._on_conflict)
+            updates = [c for c in columns if c not in self._on_conflict]
+            if self._ignore_duplicates or not updates:
+                conflict_sql = f' ON CONFLICT ({target}) DO NOTHING'
+            else:
+                assignments = ', '.join(f'{_quote(c)} = excluded.{_quote(c)}' for c in updates)
+                conflict_sql = f' ON CONFLICT ({target}) DO UPDATE SET {assignments}'
+        statements = []
+        placeholders = f"({', '.join('?' for _ in columns)})"
+        for start in range(0, len(rows), INSERT_CHUNK):
+            chunk = rows[start:start + INSERT_CHUNK]
+            values_sql = ', '.join(placeholders for _ in chunk)
+            params = [row.get(c) for row in chunk for c in columns]
+            statements.append((
+                f'INSERT INTO {self._table} ({column_sql}) VALUES {values_sql}{conflict_sql} RETURNING *',
+                params
+            ))
+        return statements
+
+    def execute(self):
+        if self._op == 'select':
+            sql = f'SELECT {self._columns} FROM {self._table}{self._where_sql()}'
+            if self._order:
+                sql += f" ORDER BY {', '.join(self._order)}"
+            if self._limit is not None:
+                sql += f' LIMIT {int(self._limit)}'
+                if self._offset:
+                    sql += f' OFFSET {int(self._offset)}'
+            return QueryResult(self._client.run(sql, self._params))
+
+        if self._op in ('insert', 'upsert'):
+            statements = self._insert_statements()
+            if len(statements) == 1:
+                return QueryResult(self._client.run(*statements[0]))
+            return QueryResult(self._client.run_many(statements))
+
+        if self._op == 'update':
+            columns = list(self._payload.keys())
+            assignments = ', '.join(f'{_quote(c)} = ?' for c in columns)
+            sql = f'UPDATE {self._table} SET {assignments}{self._where_sql()} RETURNING *'
+            params = [self._payload[c] for c in columns] + self._params
+            return QueryResult(self._client.run(sql, params))
+
+        sql = f'DELETE FROM {self._table}{self._where_sql()} RETURNING *'
+        return QueryResult(self._client.run(sql, self._params))
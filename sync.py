@@ -0,0 +1,107 @@
+from collections import defaultdict
+
+from analytics import FOCUS_TASK
+from db_helpers import fetch_all
+
+# Delta sync for the client-side todo store. Every task write bumps a
+# per-user revision (sync_state.rev, via triggers) and stamps it on the row
+# (tasks.rev); deleted tasks leave a tombstone with the revision of the delete.
+# A client that has seen everything up to rev N asks for rev > N and gets only
+# what changed since, in revision order. See SUPABASE_SETUP.md for the schema.
+
+STATE = 'sync_state'
+TOMBSTONES = 'task_tombstones'
+COLUMNS = 'id, date, task_name, tasks_completed, focus_time, rev'
+PAGE_SIZE = 500
+MAX_PAGE = 1000
+TOMBSTONE_DAYS = 90        # prune-tombstones default; older clients resync
+
+
+def changed(client, user_id, since, limit):
+    # Task rows written after `since`; the Focus Session row is not a todo
+    return client.table('tasks').select(COLUMNS).eq('user_id', user_id).gt('rev', since) \
+        .neq('task_name', FOCUS_TASK).order('rev').limit(limit).execute().data or []
+
+
+def deleted(client, user_id, since, limit):
+    if since <= 0:
+        return []
+    return client.table(TOMBSTONES).select('task_id, date, task_name, rev').eq('user_id', user_id) \
+        .gt('rev', since).order('rev').limit(limit).execute().data or []
+
+
+def horizon(client, user_id):
+    # Newest revision whose tombstones were pruned; 0 when none were
+    rows = client.table(STATE).select('pruned_rev').eq('user_id', user_id).execute().data
+    return (rows[0].get('pruned_rev') or 0) if rows else 0
+
+
+def merge(rows, tombstones, since, limit):
+    # (changes, rev, more): rows and tombstones in revision order, cut at
+    # limit. Both inputs are the first `limit` entries after `since`, so
+    # everything up to the last change returned is complete, and that change's
+    # revision is where the next page starts.
+    changes = [dict(r) for r in rows]
+    changes += [{'id': t['task_id'], 'date': t['date'], 'task_name': t['task_name'], 'rev': t['rev'], 'deleted': True}
+                for t in tombstones]
+    changes.sort(key=lambda c: c['rev'])
+    more = len(rows) >= limit or len(tombstones) >= limit or len(changes) > limit
+    changes = changes[:limit]
+    rev = changes[-1]['rev'] if changes else since
+    return changes, max(rev, since), more
+
+
+def first_added(ops):
+    # (date, task_name) keys whose first op in the batch creates the task
+    added, seen = set(), set()
+    for op in ops:
+        key = (op.get('date'), op.get('task_name'))
+        if key not in seen:
+            seen.add(key)
+            if op.get('op') == 'add':
+                added.add(key)
+    return added
+
+
+# Conflict check for a pushed batch. final is the collapsed batch
+# ({(date, task_name): ('upsert', completed) | ('delete', None)}), current the
+# server's rows for those keys and removed the keys deleted after base_rev.
+# The server wins: an op is dropped when its task changed after base_rev
+# (and the change differs from what the client wants), or when it toggles a
+# task another client deleted. Returns (ops to apply, conflicts); ops that
+# would change nothing are dropped too.
+def check(final, added, current, removed, base_rev):
+    apply, conflicts = {}, []
+    for key, (action, completed) in final.items():
+        row = current.get(key)
+        if row is None:
+            if action == 'delete':
+                continue
+            if key in removed and key not in added:
+                conflicts.append({'date': key[0], 'task_name': key[1], 'reason': 'deleted'})
+                continue
+        elif action == 'upsert' and (row.get('tasks_completed') or 0) == completed:
+            continue
+        elif (row.get('rev') or 0) > base_rev:
+            conflicts.append({'date': key[0], 'task_name': key[1], 'reason': 'changed'})
+            continue
+        apply[key] = (action, completed)
+    return apply, conflicts
+
+
+# Drops tombstones of deletes before `before` (a date) and records, per user,
+# the newest revision dropped. Clients syncing from an older revision are
+# told to reset, since deletes they have not seen are gone.
+def prune(client, before, chunk_size=500):
+    cutoff = before.isoformat()
+    tombstones = fetch_all(lambda: client.table(TOMBSTONES).select('task_id, user_id, rev')
+                           .lt('deleted_at', cutoff).order('task_id'))
+    horizons = defaultdict(int)
+    for t in tombstones:
+        horizons[t['user_id']] = max(horizons[t['user_id']], t['rev'])
+    rows = [{'user_id': user_id, 'pruned_rev': rev} for user_id, rev in sorted(horizons.items())]
+    for i in range(0, len(rows), chunk_size):
+        client.table(STATE).upsert(rows[i:i + chunk_size], on_conflict='user_id').execute()
+    if tombstones:
+        client.table(TOMBSTONES).delete().lt('deleted_at', cutoff).execute()
+    return {'tombstones': len(tombstones), 'users': len(rows)}
@@ -0,0 +1,331 @@
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from db_helpers import fetch_all
+from resilience import is_outage
+
+# Rows changed this long before the newest updated_at already seen are read
+# again on the next refresh, so commits that land out of timestamp order
+# (NOW() is the transaction start) are not missed
+CURSOR_OVERLAP = timedelta(seconds=5)
+
+
+def _cursor(latest):
+    try:
+        return (datetime.fromisoformat(latest) - CURSOR_OVERLAP).isoformat()
+    except ValueError:
+        return latest
+
+
+# Process-wide directory of the small per-user facts most routes need:
+# username, block_count, is_dead and pfp_url. Values live in columns
+# addressed directly by user id (ids are identity-generated, so dense): two
+# lists of string references, an int32 array and two bytearrays, about 22
+# bytes per user plus the strings, instead of a dict per user.
+#
+# It is built with one paged scan of users, garden_state and user_profiles,
+# then refreshed every refresh_interval seconds from what changed since:
+# users with a larger id and garden/profile rows by updated_at. Routes that
+# write these facts patch it directly, and a full rebuild every max_age
+# seconds picks up anything else. Listeners (the leaderboard) are told about
+# every block count change and every rebuild; on_gardens_changed(user_ids)
+# hears about the garden changes a refresh found that this process did not
+# make itself (the nightly job, other workers).
+#
+# Loads run their queries without holding the directory lock, one thread at a
+# time: the others keep reading the current snapshot (only the first build is
+# waited for). A build fills new columns and swaps them in; patches the routes
+# make meanwhile are replayed on top.
+class UserDirectory:
+    STATE = ('_present', '_names', '_blocks', '_dead', '_pfps', '_count', '_max_id',
+             '_garden_cursor', '_profile_cursor', '_timestamped')
+
+    def __init__(self, refresh_interval=5, max_age=3600, on_gardens_changed=None):
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.on_gardens_changed = on_gardens_changed
+        self.lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._listeners = []
+        self._reset()
+        self._built_at = None
+        self._refreshed_at = None
+        self._patches = None          # route updates made during a load, replayed after it
+
+    def _reset(self):
+        self._present = bytearray()   # 1 where a user with this id exists
+        self._names = []              # username or None
+        self._blocks = array('i')     # garden block count
+        self._dead = bytearray()      # garden is_dead
+        self._pfps = []               # pfp_url ('' when unset)
+        self._count = 0
+        self._max_id = 0
+        self._garden_cursor = None    # newest garden_state.updated_at seen
+        self._profile_cursor = None   # newest user_profiles.updated_at seen
+        self._timestamped = True      # False once a row without updated_at shows up
+
+    def subscribe(self, listener):
+        # listener.directory_rebuilt() and listener.block_count_changed(user_id, old, new),
+        # both called with the directory lock held
+        self._listeners.append(listener)
+
+    # ---- loading ----
+
+    def _due(self):
+        # 'build', 'refresh' or None; called with the lock held
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at >= self.max_age:
+            return 'build'
+        if now - self._refreshed_at >= self.refresh_interval:
+            return 'refresh'
+        return None
+
+    def ensure_fresh(self, client):
+        with self.lock:
+            due = self._due()
+        if due:
+            self._load(client, self._due)
+
+    def invalidate(self):
+        with self.lock:
+            self._built_at = None
+
+    def _load(self, client, due):
+        # due() says what to load and is checked again once this thread holds
+        # the load lock. Once built, the directory keeps serving its last
+        # snapshot while the database is unreachable and tries again after
+        # refresh_interval.
+        with self.lock:
+            built = self._built_at is not None
+        if not self._load_lock.acquire(blocking=not built):
+            return
+        try:
+            with self.lock:
+                kind = due()
+                if kind is None:
+                    return
+                self._patches = []
+                cursors = (self._max_id, self._garden_cursor, self._profile_cursor, self._timestamped)
+            try:
+                loaded = self._fetch_all(client) if kind == 'build' else self._fetch_changes(client, *cursors)
+            except Exception as e:
+                with self.lock:
+                    self._patches = None
+                    if self._built_at is None or not is_outage(e):
+                        raise
+                    print(f"User directory refresh error: {e}")
+                    self._refreshed_at = time.monotonic()
+                return
+            changed = []
+            with self.lock:
+                if kind == 'build':
+                    self._swap(loaded)
+                else:
+                    changed = self._apply_changes(*loaded)
+                patches, self._patches = self._patches, None
+                for update, args in patches:
+                    update(*args)
+        finally:
+            self._load_lock.release()
+        if changed and self.on_gardens_changed:
+            self.on_gardens_changed(changed)
+
+    def _fetch_all(self, client):
+        # A new directory from one scan of each table, built without the lock
+        users = fetch_all(lambda: client.table('users').select('id, username').order('id'))
+        gardens = fetch_all(lambda: client.table('garden_state')
+                            .select('user_id, block_count, is_dead, updated_at').order('user_id'))
+        profiles = fetch_all(lambda: client.table('user_profiles').select('user_id, pfp_url, updated_at').order('user_id'))
+        fresh = UserDirectory(self.refresh_interval, self.max_age)
+        for u in users:
+            fresh._add(u['id'], u['username'])
+        fresh._apply(gardens, profiles, notify=False)
+        return fresh
+
+    def _swap(self, fresh):
+        for name in self.STATE:
+            setattr(self, name, getattr(fresh, name))
+        self._built_at = self._refreshed_at = time.monotonic()
+        for listener in self._listeners:
+            listener.directory_rebuilt()
+
+    def _fetch_changes(self, client, max_id, garden_cursor, profile_cursor, timestamped):
+        users = fetch_all(lambda: client.table('users').select('id, username').gt('id', max_id).order('id'))
+        gardens = profiles = []
+        if timestamped:
+            # Tables that were empty at the last build have no cursor yet and are read whole
+            gardens = fetch_all(lambda: self._changed(client, 'garden_state', 'user_id, block_count, is_dead, updated_at',
+                                                      garden_cursor))
+            profiles = fetch_all(lambda: self._changed(client, 'user_profiles', 'user_id, pfp_url, updated_at',
+                                                       profile_cursor))
+        return users, gardens, profiles
+
+    def _apply_changes(self, users, gardens, profiles):
+        for u in users:
+            if self._add(u['id'], u['username']):
+                self._notify(u['id'], None, 0)
+        changed = self._apply(gardens, profiles)
+        self._refreshed_at = time.monotonic()
+        return changed
+
+    @staticmethod
+    def _changed(client, table, columns, latest):
+        query = client.table(table).select(columns)
+        if latest is not None:
+            query = query.gte('updated_at', _cursor(latest))
+        return query.order('updated_at').order('user_id')
+
+    def _apply(self, gardens, profiles, notify=True):
+        # Ids of the users whose garden differed from the directory's
+        changed = []
+        for row in gardens:
+            if self._set_garden(row['user_id'], row.get('block_count') or 0, bool(row.get('is_dead')), notify):
+                changed.append(row['user_id'])
+            self._garden_cursor = self._advance(self._garden_cursor, row.get('updated_at'))
+        for row in profiles:
+            self._set_pfp(row['user_id'], row.get('pfp_url') or '')
+            self._profile_cursor = self._advance(self._profile_cursor, row.get('updated_at'))
+        return changed
+
+    def _advance(self, cursor, updated_at):
+        if not updated_at:
+            # Not migrated yet; only full rebuilds pick up other workers' changes
+            self._timestamped = False
+            return cursor
+        return updated_at if cursor is None or updated_at > cursor else cursor
+
+    def _grow(self, user_id):
+        missing = user_id + 1 - len(self._present)
+        if missing > 0:
+            self._present.extend(bytes(missing))
+            self._names.extend([None] * missing)
+            self._blocks.extend([0] * missing)
+            self._dead.extend(bytes(missing))
+            self._pfps.extend([''] * missing)
+
+    def _has(self, user_id):
+        return 0 <= user_id < len(self._present) and self._present[user_id]
+
+    def _add(self, user_id, username):
+        # True if the user is new
+        self._grow(user_id)
+        self._names[user_id] = username
+        self._max_id = max(self._max_id, user_id)
+        if self._present[user_id]:
+            return False
+        self._present[user_id] = 1
+        self._count += 1
+        return True
+
+    def _notify(self, user_id, old, new):
+        for listener in self._listeners:
+            listener.block_count_changed(user_id, old, new)
+
+    def _set_garden(self, user_id, block_count, is_dead, notify=True):
+        # True when the garden changed
+        if not self._has(user_id):
+            return False
+        old, was_dead = self._blocks[user_id], self._dead[user_id]
+        self._blocks[user_id] = block_count
+        self._dead[user_id] = 1 if is_dead else 0
+        if notify and old != block_count:
+            self._notify(user_id, old, block_count)
+        return old != block_count or was_dead != self._dead[user_id]
+
+    def _set_pfp(self, user_id, pfp_url):
+        if self._has(user_id):
+            self._pfps[user_id] = pfp_url
+
+    # ---- lookups ----
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, user_id):
+        with self.lock:
+            return self._has(user_id)
+
+    def _record(self, user_id):
+        return {
+            'id': user_id,
+            'username': self._names[user_id],
+            'block_count': self._blocks[user_id],
+            'is_dead': bool(self._dead[user_id]),
+            'pfp_url': self._pfps[user_id]
+        }
+
+    def get(self, user_id):
+        with self.lock:
+            return self._record(user_id) if self._has(user_id) else None
+
+    def get_many(self, ids, client=None):
+        # {id: record} for the ids that exist, in the order given. With a
+        # client, ids newer than the directory trigger one refresh first.
+        ids = list(ids)
+        if client is not None:
+            def due():
+                behind = self._built_at is not None and any(i > self._max_id for i in ids)
+                return 'refresh' if behind else None
+            with self.lock:
+                behind = due()
+            if behind:
+                self._load(client, due)
+        with self.lock:
+            return {i: self._record(i) for i in ids if self._has(i)}
+
+    def username(self, user_id):
+        with self.lock:
+            return self._names[user_id] if self._has(user_id) else None
+
+    def user_ids(self):
+        with self.lock:
+            return [i for i, present in enumerate(self._present) if present]
+
+    def block_count(self, user_id):
+        return self._blocks[user_id]
+
+    # ---- updates from the routes; ignored until the first build ----
+
+    def _log(self, update, *args):
+        # Called with the lock held
+        if self._patches is not None:
+            self._patches.append((update, args))
+
+    def add_user(self, user_id, username):
+        with self.lock:
+            self._log(self.add_user, user_id, username)
+            if self._built_at is None or self._has(user_id):
+                return
+            self._add(user_id, username)
+            self._notify(user_id, None, 0)
+
+    def set_garden(self, user_id, block_count=None, is_dead=None):
+        with self.lock:
+            self._log(self.set_garden, user_id, block_count, is_dead)
+            if self._built_at is None or not self._has(user_id):
+                return
+            self._set_garden(
+                user_id,
+                self._blocks[user_id] if block_count is None else block_count,
+                self._dead[user_id] if is_dead is None else is_dead
+            )
+
+    def set_pfp_url(self, user_id, pfp_url):
+        with self.lock:
+            self._log(self.set_pfp_url, user_id, pfp_url)
+            self._set_pfp(user_id, pfp_url or '')
+
+    def stats(self):
+        with self.lock:
+            slots = len(self._present)
+            columns = (sys.getsizeof(self._present) + sys.getsizeof(self._names) + sys.getsizeof(self._dead) +
+                       sys.getsizeof(self._pfps) + self._blocks.itemsize * len(self._blocks))
+            return {
+                'users': self._count,
+                'id_slots': slots,
+                'column_bytes': columns,
+                'bytes_per_user': round(columns / self._count, 1) if self._count else 0.0
+            }
@@ -0,0 +1,88 @@
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from db_helpers import fetch_all
+
+
+# Sorted, case-insensitive username index for prefix search. Usernames are
+# kept in two parallel sorted lists (lowercased keys, original names) plus an
+# array of ids, so a million users cost the strings and about 24 bytes of
+# pointers and ids each; a key equal to its name shares the same string.
+# A prefix query is two bisects and a slice. Built with one paged scan of the
+# users table, patched by signup and rebuilt every max_age seconds so users
+# created by other workers show up.
+class UsernameIndex:
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._keys = []          # username.lower(), sorted
+        self._names = []         # original usernames, same order
+        self._ids = array('q')   # user ids, same order
+        self._built_at = None
+
+    def ensure_built(self, client):
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < self.max_age:
+                return
+            users = fetch_all(lambda: client.table('users').select('id, username').order('id'))
+            entries = sorted((self._key(u['username']), u['username'], u['id']) for u in users)
+            self._keys = [e[0] for e in entries]
+            self._names = [e[1] for e in entries]
+            self._ids = array('q', (e[2] for e in entries))
+            self._built_at = time.monotonic()
+
+    @staticmethod
+    def _key(username):
+        key = username.lower()
+        return username if key == username else key
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def search(self, prefix, limit=10, exclude=None):
+        # [(user_id, username)] whose username starts with prefix, ignoring
+        # case, in alphabetical order
+        prefix = prefix.lower()
+        with self._lock:
+            start = bisect_left(self._keys, prefix)
+            end = bisect_left(self._keys, prefix + '\U0010ffff', start)
+            # One spare row in case the excluded user is among the first matches
+            stop = min(end, start + limit + 1)
+            pairs = zip(self._ids[start:stop], self._names[start:stop])
+            return [(i, name) for i, name in pairs if i != exclude][:limit]
+
+    def id_of(self, username):
+        # Exact (case-sensitive) match, or None
+        with self._lock:
+            key = self._key(username)
+            i = bisect_left(self._keys, key)
+            while i < len(self._keys) and self._keys[i] == key:
+                if self._names[i] == username:
+                    return self._ids[i]
+                i += 1
+            return None
+
+    def add_user(self, user_id, username):
+        # Ignored until the first build
+        with self._lock:
+            if self._built_at is None:
+                return
+            key = self._key(username)
+            i = bisect_left(self._keys, key)
+            while i < len(self._keys) and self._keys[i] == key and (self._names[i], self._ids[i]) < (username, user_id):
+                i += 1
+            self._keys.insert(i, key)
+            self._names.insert(i, username)
+            self._ids.insert(i, user_id)
+
+    def memory_bytes(self):
+        # Footprint of the index structures, strings excluded
+        with self._lock:
+            return sys.getsizeof(self._keys) + sys.getsizeof(self._names) + self._ids.itemsize * len(self._ids)
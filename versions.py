@@ -0,0 +1,39 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+
+# Per-entity version counters behind the ETags of the read endpoints. Mutating
+# routes bump (entity, id) after they write; a response's ETag hashes the
+# versions it was built from, so an unchanged tag means an unchanged body and
+# If-None-Match can be answered without touching the database.
+#
+# Counters live in this process only. The nonce keeps tags from another
+# process (or a restart) from ever matching, and tags also roll over every
+# max_age seconds so writes made elsewhere (the nightly job, another worker)
+# show up within that window. Callers mix in per-session state (see
+# backend.count_session_writes) for read-your-writes across processes.
+class VersionStore:
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self.nonce = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._versions = defaultdict(int)  # (entity, id) -> version
+
+    def bump(self, entity, *ids):
+        with self._lock:
+            for i in ids:
+                self._versions[(entity, i)] += 1
+
+    def get(self, entity, id):
+        with self._lock:
+            return self._versions.get((entity, id), 0)
+
+    def etag(self, keys, *extra):
+        with self._lock:
+            parts = [f'{entity}:{i}:{self._versions.get((entity, i), 0)}' for entity, i in keys]
+        epoch = int(time.time() // self.max_age) if self.max_age else 0
+        raw = '|'.join([self.nonce, str(epoch)] + [str(e) for e in extra] + parts)
+        return hashlib.sha1(raw.encode()).hexdigest()